@@ -12,7 +12,7 @@ from io import StringIO
 
 # 導入遊戲模組
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from horse_racing_poker import HorseRacingGame, GameConfig, Suit, Rank, Card
+from horse_racing_poker import HorseRacingGame, GameConfig, Suit, Rank, Card, BetLedger, VirtualClock
 
 def demo_complete_game():
     """演示完整遊戲流程"""
@@ -22,6 +22,7 @@ def demo_complete_game():
     config = GameConfig()
     config.ANIMATION_DELAY = 0.5  # 加快演示速度
     config.CLEAR_SCREEN = False   # 演示時不清屏
+    config.CLOCK = VirtualClock()  # 等待不耗費實際時間
     
     # 創建遊戲實例
     game = HorseRacingGame(config)
@@ -105,6 +106,7 @@ def test_error_handling():
     
     config = GameConfig()
     config.CLEAR_SCREEN = False
+    config.CLOCK = VirtualClock()
     game = HorseRacingGame(config)
     
     print("1. 測試餘額不足下注")
@@ -134,6 +136,7 @@ def performance_test():
     start_time = time.time()
     config = GameConfig()
     config.CLEAR_SCREEN = False
+    config.CLOCK = VirtualClock()
     game = HorseRacingGame(config)
     init_time = time.time() - start_time
     print(f"1. 遊戲初始化時間: {init_time:.4f}秒")
@@ -158,6 +161,45 @@ def performance_test():
     
     print("\n=== 性能測試完成 ===")
 
+def concurrency_test(threads=16, bets_per_thread=5000):
+    """並發下注壓力測試"""
+    print("\n=== 並發下注壓力測試 ===\n")
+    
+    import time
+    import threading
+    
+    def run(thread_count, shared):
+        ledger = BetLedger()
+        ids = ["shared"] * thread_count if shared else [f"bot-{i}" for i in range(thread_count)]
+        for player_id in ids:
+            ledger.open_account(player_id, initial_balance=10 ** 9)
+        
+        def worker(player_id):
+            for _ in range(bets_per_thread):
+                ledger.place_bets(player_id, {Suit.HEARTS: 1, Suit.CLUBS: 2})
+        
+        workers = [threading.Thread(target=worker, args=(player_id,)) for player_id in ids]
+        start_time = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start_time
+        
+        # 驗證總金額守恆
+        expected = len(set(ids)) * 10 ** 9
+        assert ledger.total_balance() == expected, "餘額不一致"
+        return thread_count * bets_per_thread / elapsed
+    
+    single = run(1, shared=False)
+    print(f"1. 單線程: {single:,.0f} 筆/秒")
+    separate = run(threads, shared=False)
+    print(f"2. {threads} 線程各自玩家: {separate:,.0f} 筆/秒")
+    contended = run(threads, shared=True)
+    print(f"3. {threads} 線程同一玩家: {contended:,.0f} 筆/秒")
+    
+    print("\n=== 並發下注壓力測試完成 ===")
+
 def main():
     """主函數"""
     print("撲克牌賽馬遊戲 - 完整演示與測試")
@@ -172,6 +214,9 @@ def main():
     # 性能測試
     performance_test()
     
+    # 並發下注壓力測試
+    concurrency_test()
+    
     print("\n所有測試完成！遊戲已準備好供用戶使用。")
 
 if __name__ == "__main__":
@@ -7,17 +7,46 @@ English/Chinese bilingual version with English as default
 """
 
 import os
+import re
 import sys
+import csv
+import math
 import time
+import json
+import heapq
 import random
+import socket
+import hashlib
+import selectors
+import argparse
+import bisect
+import weakref
+import functools
+import threading
+import socketserver
+from array import array
+from collections import OrderedDict, deque
 from enum import Enum
-from typing import List, Dict, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from typing import Callable, List, Dict, Optional, Tuple
+
+try:
+    import sqlite3
+except ImportError:  # Python builds without SQLite
+    sqlite3 = None
+
+try:
+    import numpy as np
+except ImportError:  # optional, speeds up batch settlement
+    np = None
 
 # =============================================================================
 # Constants
 # =============================================================================
 
 VERSION = "1.0.1"
+ENGINE_VERSION = 1  # bump whenever the same inputs would simulate differently
 AUTHOR = "AI Assistant"
 
 # =============================================================================
@@ -59,17 +88,31 @@ class Language:
             'diamonds_option': '3. ♦ Diamonds Horse',
             'clubs_option': '4. ♣ Clubs Horse',
             'finish_betting': '5. Finish Betting',
+            'suggest_option': '6. Suggest Bets',
             'return_menu': '0. Return to Main Menu',
-            'choose_bet_option': 'Please choose (0-5): ',
+            'choose_bet_option': 'Please choose (0-6): ',
             'enter_bet_amount': 'Enter bet amount: $',
             'total_bet': 'Total Bet: ',
             'remaining_balance': 'Remaining Balance: ',
+            'suggestion_title': 'Bet Suggestions',
+            'win_chance': 'Win chance ',
+            'ev_per_dollar': ', EV per $1: ',
+            'suggested_slip': 'Suggested slip: ',
+            'no_positive_ev': 'No bet has a positive expected value at these odds',
+            'slip_ev': 'Your slip: expected profit $',
+            'slip_stddev': ', std dev $',
+            'odds_pending': 'Working out fair odds in the background...',
+            'odds_still_computing': 'Still working out the odds, ask again in a moment.',
+            'fair_odds': 'Fair odds: ',
             
             # Racing phase
             'race_start': 'Race Start',
             'press_enter_start': 'Press Enter to start drawing cards...',
+            'press_key_skip': '(Press any key during the race to skip to the result)',
+            'playback_options': 'Speed: Enter = normal, f = 4x, i = instant',
             'track_status': 'Track Status',
             'position': 'Position: ',
+            'lane_horse': 'Horse #',
             'current_card': 'Current Card: ',
             'remaining_cards': 'Remaining Cards: ',
             'cards_suffix': ' cards',
@@ -82,6 +125,7 @@ class Language:
             'your_bet_results': 'Your Betting Results:',
             'win_result': ' → 🎉 Win! Earned $',
             'lose_result': ' → ❌ Lost',
+            'no_winner_refund': 'No horse finished, bets refunded: $',
             'total_profit_loss': 'Total Profit/Loss: ',
             'current_balance': 'Current Balance: ',
             'press_enter_continue': 'Press Enter to continue...',
@@ -94,6 +138,8 @@ class Language:
             'rule_4': '4. The first horse to reach the finish line wins',
             'rule_5': '5. Betting on the winning horse gets 3x payout',
             'rule_6': '6. You can bet on multiple horses simultaneously',
+            'rule_variant': '7. Variant rules (',
+            'sets_others_back': 'sets the others back ',
             'press_enter_return': 'Press Enter to return...',
             
             # Statistics
@@ -102,6 +148,13 @@ class Language:
             'total_profit': 'Total Profit: ',
             'win_rate': 'Win Rate: ',
             'games_suffix': ' games',
+            'race_length_stats': 'Race Length: median ',
+            'p90_cards': ' cards, p90 ',
+            'cards_unit': ' cards',
+            'profit_percentiles': 'Profit per Game: p10 $',
+            'median_profit': ', median $',
+            'p90_profit': ', p90 $',
+            'longest_losing_streak': 'Longest Losing Streak: ',
             
             # Messages
             'bet_success': 'Bet successful! ',
@@ -116,6 +169,7 @@ class Language:
             'game_interrupted': 'Game interrupted',
             'error_occurred': 'Error occurred: ',
             'no_bets_placed': 'No bets placed yet',
+            'session_restored': 'Restored your unfinished race, resuming...',
             
             # Language selection
             'language_menu': 'Language Selection',
@@ -159,17 +213,31 @@ class Language:
             'diamonds_option': '3. ♦ 方塊馬',
             'clubs_option': '4. ♣ 梅花馬',
             'finish_betting': '5. 完成下注',
+            'suggest_option': '6. 下注建議',
             'return_menu': '0. 返回主菜單',
-            'choose_bet_option': '請選擇 (0-5): ',
+            'choose_bet_option': '請選擇 (0-6): ',
             'enter_bet_amount': '請輸入下注金額: $',
             'total_bet': '總下注: ',
             'remaining_balance': '餘額: ',
+            'suggestion_title': '下注建議',
+            'win_chance': '勝率 ',
+            'ev_per_dollar': '，每 $1 期望值: ',
+            'suggested_slip': '建議下注: ',
+            'no_positive_ev': '以目前賠率，沒有期望值為正的下注',
+            'slip_ev': '您的下注: 期望盈虧 $',
+            'slip_stddev': '，標準差 $',
+            'odds_pending': '正在背景計算公平賠率...',
+            'odds_still_computing': '賠率仍在計算中，請稍後再查詢。',
+            'fair_odds': '公平賠率: ',
             
             # Racing phase
             'race_start': '比賽開始',
             'press_enter_start': '按 Enter 開始翻牌...',
+            'press_key_skip': '(比賽中按任意鍵可直接跳到結果)',
+            'playback_options': '速度: Enter = 正常, f = 4倍速, i = 立即',
             'track_status': '賽道狀況',
             'position': '位置: ',
+            'lane_horse': '馬 #',
             'current_card': '當前翻出: ',
             'remaining_cards': '剩餘卡牌: ',
             'cards_suffix': '張',
@@ -182,6 +250,7 @@ class Language:
             'your_bet_results': '您的下注結果:',
             'win_result': ' → 🎉 獲勝！贏得 $',
             'lose_result': ' → ❌ 失敗',
+            'no_winner_refund': '沒有馬匹抵達終點，退還下注: $',
             'total_profit_loss': '總盈虧: ',
             'current_balance': '目前餘額: ',
             'press_enter_continue': '按 Enter 繼續...',
@@ -194,6 +263,8 @@ class Language:
             'rule_4': '4. 最先到達終點的馬獲勝',
             'rule_5': '5. 下注獲勝的馬可獲得3倍賠率',
             'rule_6': '6. 可以對多匹馬同時下注',
+            'rule_variant': '7. 變體規則 (',
+            'sets_others_back': '讓其他馬後退 ',
             'press_enter_return': '按 Enter 返回...',
             
             # Statistics
@@ -202,6 +273,13 @@ class Language:
             'total_profit': '總盈虧: ',
             'win_rate': '勝率: ',
             'games_suffix': ' 局',
+            'race_length_stats': '比賽長度: 中位數 ',
+            'p90_cards': ' 張，p90 ',
+            'cards_unit': ' 張',
+            'profit_percentiles': '每局盈虧: p10 $',
+            'median_profit': '，中位數 $',
+            'p90_profit': '，p90 $',
+            'longest_losing_streak': '最長連敗: ',
             
             # Messages
             'bet_success': '下注成功！',
@@ -216,6 +294,7 @@ class Language:
             'game_interrupted': '遊戲被中斷',
             'error_occurred': '發生錯誤: ',
             'no_bets_placed': '尚未下注',
+            'session_restored': '已恢復未完成的比賽，繼續進行...',
             
             # Language selection
             'language_menu': '語言選擇',
@@ -282,7 +361,21 @@ class GameConfig:
     INITIAL_BALANCE = 1000
     WINNING_ODDS = 3.0
     ANIMATION_DELAY = 1.0  # seconds
+    MESSAGE_DELAY = 1.0  # seconds a message stays before the screen redraws
+    PLAYBACK_SPEED = '1x'  # default race playback speed
+    PLAYBACK_SPEEDS = {'1x': 1.0, '4x': 4.0, 'instant': 0.0}  # card rate multipliers
+    MAX_FPS = 30  # race frame budget, intermediate frames are dropped beyond it
     CLEAR_SCREEN = True
+    HISTORY_DB = None  # path to a SQLite file for persistent history, None keeps it in memory
+    SESSION_DIR = None  # directory for crash-safe session snapshots and bet journal
+    SPECTATOR_PORT = None  # TCP port streaming race frames to spectators, 0 picks a free port
+    SHUFFLE_POOL = 0  # deck permutations a background thread keeps ready, 0 shuffles inline
+    DECK_PACKS = 1  # packs in the shoe, 1 to 8
+    CUT_CARD = None  # reshuffle once fewer cards remain, None reshuffles every race
+    RULE_SET = 'standard'  # movement rules, a RULE_SETS name or a RuleSet
+    BACKGROUND_ODDS = True  # work out bet suggestions while the betting prompt waits
+    CLOCK = None  # time source for waits and frame pacing, None uses a RealClock
+    METRICS = None  # MetricsRegistry shared by hosted sessions, None records nothing
 
 # =============================================================================
 # Basic Classes - Card System
@@ -302,28 +395,112 @@ class Card:
     def __repr__(self) -> str:
         return f"Card({self.suit.name}, {self.rank.name})"
 
+class ShufflePool:
+    """Ring of pre-generated deck permutations, refilled by a background producer"""
+    
+    def __init__(self, size: int = 52, capacity: int = 1024, seed: Optional[int] = None,
+                 background: bool = True):
+        self.size = size
+        self.capacity = capacity
+        self.rng = random.Random(seed)  # one stream, so a seed fixes the handed-out sequence
+        self._identity = bytearray(range(size)) if size <= 256 else array('H', range(size))
+        self._ready: deque = deque()
+        self._wanted = threading.Condition()  # guards rng and the ring
+        self.hits = 0
+        self.misses = 0  # takes that found the ring empty and shuffled inline
+        self._running = background
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(target=self._produce, daemon=True)
+            self._thread.start()
+    
+    def _generate(self):
+        """Next permutation of the seeded stream, caller holds the lock"""
+        permutation = self._identity[:]
+        self.rng.shuffle(permutation)
+        return permutation
+    
+    def _produce(self) -> None:
+        """Top the ring up whenever it drains to half"""
+        while True:
+            with self._wanted:
+                while self._running and len(self._ready) >= self.capacity:
+                    self._wanted.wait()
+                if not self._running:
+                    return
+                self._ready.append(self._generate())
+    
+    def fill(self) -> None:
+        """Fill the ring to capacity on the calling thread"""
+        with self._wanted:
+            while len(self._ready) < self.capacity:
+                self._ready.append(self._generate())
+    
+    def take(self):
+        """Next permutation, generated inline from the same stream on a miss"""
+        with self._wanted:
+            if self._ready:
+                self.hits += 1
+                permutation = self._ready.popleft()
+            else:
+                self.misses += 1
+                permutation = self._generate()
+            if len(self._ready) <= self.capacity // 2:
+                self._wanted.notify()
+        return permutation
+    
+    def close(self) -> None:
+        """Stop the producer"""
+        with self._wanted:
+            self._running = False
+            self._wanted.notify()
+        if self._thread:
+            self._thread.join()
+
 class Deck:
-    """Deck class"""
+    """Deck class, a shoe of one to eight packs with an optional cut card"""
     
-    def __init__(self):
+    MAX_PACKS = 8
+    
+    def __init__(self, rng: Optional[random.Random] = None, pool: Optional[ShufflePool] = None,
+                 packs: int = 1, cut_card: Optional[int] = None):
+        if not 1 <= packs <= self.MAX_PACKS:
+            raise ValueError(f"packs must be between 1 and {self.MAX_PACKS}")
         self.cards: List[Card] = []
         self.used_cards: List[Card] = []
+        self.discarded = 0  # used cards from earlier races, reshuffled if a race runs the shoe dry
+        self.rng = rng or random  # seeded random.Random for reproducible shuffles
+        self.pool = pool  # hands out ready permutations of the full shoe
+        self.packs = packs
         self._initialize_deck()
+        self._ordered = tuple(self.cards)
+        if cut_card is not None and not 0 <= cut_card < len(self._ordered):
+            raise ValueError(f"cut_card must be between 0 and {len(self._ordered) - 1}")
+        self.cut_card = cut_card  # reshuffle only once fewer cards than this remain
     
     def _initialize_deck(self) -> None:
-        """Create standard 52-card deck"""
-        for suit in Suit:
-            for rank in Rank:
-                self.cards.append(Card(suit, rank))
+        """Create the shoe, packs share their Card objects"""
+        pack = [Card(suit, rank) for suit in Suit for rank in Rank]
+        self.cards.extend(pack * self.packs)
     
     def shuffle(self) -> None:
         """Shuffle the deck"""
-        random.shuffle(self.cards)
+        if (self.pool is not None and self.pool.size == len(self._ordered)
+                and len(self.cards) == len(self._ordered)):
+            ordered = self._ordered
+            self.cards[:] = [ordered[index] for index in self.pool.take()]
+        else:
+            self.rng.shuffle(self.cards)
     
     def draw_card(self) -> Optional[Card]:
-        """Draw a card, return None if deck is empty"""
+        """Draw a card, reshuffling earlier races' discards once the shoe runs out mid-race"""
         if not self.cards:
-            return None
+            if not self.discarded:
+                return None
+            self.cards.extend(self.used_cards[:self.discarded])
+            del self.used_cards[:self.discarded]
+            self.discarded = 0
+            self.shuffle()
         card = self.cards.pop()
         self.used_cards.append(card)
         return card
@@ -333,24 +510,76 @@ class Deck:
         return len(self.cards)
     
     def reset(self) -> None:
-        """Reset the deck"""
+        """Reset the deck, or keep dealing while the cut card is still ahead"""
+        if self.cut_card is not None and len(self.cards) > self.cut_card:
+            self.discarded = len(self.used_cards)
+            return
         self.cards.extend(self.used_cards)
         self.used_cards.clear()
+        self.discarded = 0
         self.shuffle()
 
 # =============================================================================
 # Game Logic Classes - Horses and Track
 # =============================================================================
 
+class LaneLayout:
+    """Which lane each card moves, by card code suit index * 13 + rank index"""
+    
+    def __init__(self, names: Tuple[str, ...], lane_of: Tuple[int, ...], by_suit: bool = False):
+        self.names = names  # short lane symbols for display
+        self.lane_of = lane_of
+        self.by_suit = by_suit  # the standard layout, horses keyed by Suit
+        ranks = list(Rank)
+        self._lane_of_card = {(suit, rank): lane_of[index * len(ranks) + position]
+                              for index, suit in enumerate(Suit) for position, rank in enumerate(ranks)}
+    
+    @property
+    def lanes(self) -> int:
+        return len(self.names)
+    
+    def lane_of_card(self, card: Card) -> int:
+        """Lane a card moves"""
+        return self._lane_of_card[(card.suit, card.rank)]
+    
+    def counts(self, packs: int = 1) -> Tuple[int, ...]:
+        """Cards per lane in a shoe of packs"""
+        counts = [0] * self.lanes
+        for lane in self.lane_of:
+            counts[lane] += packs
+        return tuple(counts)
+    
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def create(cls, lanes: int = 4) -> 'LaneLayout':
+        """Suits for 4, colors for 2, suit halves for 8, otherwise cards dealt round-robin"""
+        suits, ranks = list(Suit), len(Rank)
+        codes = range(len(suits) * ranks)
+        if lanes == 4:
+            return cls(tuple(suit.value for suit in suits), tuple(code // ranks for code in codes), True)
+        if lanes == 2:
+            red = (Suit.HEARTS, Suit.DIAMONDS)
+            return cls(("♠♣", "♥♦"), tuple(int(suits[code // ranks] in red) for code in codes))
+        if lanes == 8:
+            names = tuple(f"{suit.value}{half}" for suit in suits for half in ("A-6", "7-K"))
+            return cls(names, tuple(code // ranks * 2 + (code % ranks >= 6) for code in codes))
+        if 1 < lanes <= len(codes):
+            # Deal in rank then suit order so every lane gets a near equal share
+            return cls(tuple(f"L{lane + 1}" for lane in range(lanes)),
+                       tuple((code % ranks * len(suits) + code // ranks) % lanes for code in codes))
+        raise ValueError(f"lanes must be between 2 and {len(codes)}")
+
 class Horse:
     """Horse class"""
-    __slots__ = ['suit', 'position', 'track_length', 'name']
+    __slots__ = ['suit', 'position', 'track_length', 'name', 'symbol']
     
-    def __init__(self, suit: Suit, track_length: int = 10):
-        self.suit = suit
+    def __init__(self, suit: Optional[Suit], track_length: int = 10,
+                 name: Optional[str] = None, symbol: Optional[str] = None):
+        self.suit = suit  # None on lanes that are not a whole suit
         self.position = 0  # Starting position
         self.track_length = track_length
-        self.name = self._get_horse_name()
+        self.name = name or self._get_horse_name()
+        self.symbol = symbol or suit.value
     
     def _get_horse_name(self) -> str:
         """Get horse name based on suit"""
@@ -374,36 +603,58 @@ class Horse:
         """Check if reached finish line"""
         return self.position >= self.track_length
     
-    def get_progress_bar(self) -> str:
-        """Return progress bar string"""
-        bar = ['-'] * self.track_length
+    def get_progress_bar(self, width: Optional[int] = None) -> str:
+        """Return progress bar string, scaled down to width cells when given"""
+        cells = min(width or self.track_length, self.track_length)
+        bar = ['-'] * cells
         if self.position < self.track_length:
-            bar[self.position] = '🐎'
+            bar[self.position * cells // self.track_length] = '🐎'
         else:
             bar[-1] = '🏆'
         return '|' + ''.join(bar) + '|'
     
     def __str__(self) -> str:
-        return f"{self.suit.value} {self.name}"
+        return f"{self.symbol} {self.name}"
 
 class Track:
     """Track class"""
     
-    def __init__(self, length: int = 10):
+    COMPACT_WIDTH = 30  # longest bar drawn one cell per step
+    COMPACT_LANES = 8  # more lanes than this drop horse names
+    
+    def __init__(self, length: int = 10, layout: Optional[LaneLayout] = None):
         self.length = length
-        self.horses: Dict[Suit, Horse] = {}
+        self.layout = layout or LaneLayout.create()
+        self.horses: Dict = {}  # keyed by Suit, or by lane index on custom layouts
         self._initialize_horses()
     
     def _initialize_horses(self) -> None:
-        """Initialize four horses"""
-        for suit in Suit:
-            self.horses[suit] = Horse(suit, self.length)
+        """Initialize one horse per lane"""
+        if self.layout.by_suit:
+            for suit in Suit:
+                self.horses[suit] = Horse(suit, self.length)
+            return
+        for lane, symbol in enumerate(self.layout.names):
+            self.horses[lane] = Horse(None, self.length, f"{lang.get('lane_horse')}{lane + 1}", symbol)
     
     def move_horse(self, suit: Suit, steps: int = 1) -> None:
         """Move specified suit horse"""
         if suit in self.horses:
             self.horses[suit].move_forward(steps)
     
+    def move_card(self, card: Card, steps: int = 1) -> Horse:
+        """Move the horse of the card's lane, return it"""
+        horse = self.horses[card.suit if self.layout.by_suit else self.layout.lane_of_card(card)]
+        horse.move_forward(steps)
+        return horse
+    
+    def set_back(self, mover: Horse, steps: int) -> List[Horse]:
+        """Move every horse but mover back, not past the start, return them"""
+        others = [horse for horse in self.horses.values() if horse is not mover]
+        for horse in others:
+            horse.position = max(0, horse.position - steps)
+        return others
+    
     def get_winner(self) -> Optional[Horse]:
         """Get winning horse, return None if no winner"""
         for horse in self.horses.values():
@@ -411,16 +662,19 @@ class Track:
                 return horse
         return None
     
-    def get_positions(self) -> Dict[Suit, int]:
+    def get_positions(self) -> Dict:
         """Get all horse positions"""
-        return {suit: horse.position for suit, horse in self.horses.items()}
+        return {key: horse.position for key, horse in self.horses.items()}
     
     def display_track(self) -> str:
-        """Return track display string"""
+        """Return track display string, compact for long tracks or many lanes"""
         lines = [f"=== {lang.get('track_status')} ==="]
-        for suit in Suit:
-            horse = self.horses[suit]
-            progress_bar = horse.get_progress_bar()
+        many_lanes = len(self.horses) > self.COMPACT_LANES
+        for horse in self.horses.values():
+            progress_bar = horse.get_progress_bar(self.COMPACT_WIDTH)
+            if many_lanes:
+                lines.append(f"{horse.symbol:<5}{progress_bar} {horse.position}/{self.length}")
+                continue
             position_info = f"{lang.get('position')}{horse.position}/{self.length}"
             lines.append(f"{horse} {progress_bar} {position_info}")
         return "\n".join(lines)
@@ -430,27 +684,1090 @@ class Track:
         for horse in self.horses.values():
             horse.position = 0
 
+# =============================================================================
+# Movement Rule Sets
+# =============================================================================
+
+class RuleSet:
+    """Declarative movement rules: steps per rank, and how far a rank sets the other horses back"""
+    
+    def __init__(self, name: str, steps: Optional[Tuple[int, ...]] = None,
+                 setback: Optional[Tuple[int, ...]] = None):
+        ranks = len(Rank)
+        self.name = name
+        self.steps = tuple(steps) if steps is not None else (1,) * ranks  # in Rank order
+        self.setback = tuple(setback) if setback is not None else (0,) * ranks
+        if len(self.steps) != ranks or len(self.setback) != ranks:
+            raise ValueError(f"step tables need one entry per rank ({ranks})")
+        if min(self.steps + self.setback) < 0 or not any(self.steps):
+            raise ValueError("steps must be non-negative and move at least one rank forward")
+        ranks_in_order = list(Rank)
+        self._by_rank = {rank: (self.steps[index], self.setback[index])
+                         for index, rank in enumerate(ranks_in_order)}
+    
+    @classmethod
+    def named(cls, name: str) -> 'RuleSet':
+        """A preset from RULE_SETS"""
+        if name not in RULE_SETS:
+            raise ValueError(f"Unknown rule set: {name}")
+        return RULE_SETS[name]
+    
+    def key(self) -> Tuple:
+        """Hashable identity, the name is only a label"""
+        return (self.steps, self.setback)
+    
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RuleSet) and self.key() == other.key()
+    
+    def __hash__(self) -> int:
+        return hash(self.key())
+    
+    def __repr__(self) -> str:
+        return f"RuleSet({self.name!r})"
+    
+    def move(self, card: Card) -> Tuple[int, int]:
+        """(steps forward, setback for every other horse) for a card"""
+        return self._by_rank[card.rank]
+    
+    def compile(self, layout: 'LaneLayout', packs: int = 1) -> Tuple[Tuple[int, ...], ...]:
+        """Flatten a shoe into (count, lane, step, setback) columns, one slot per card class"""
+        ranks = len(Rank)
+        slots: Dict[Tuple[int, int, int], int] = {}
+        for code, lane in enumerate(layout.lane_of):
+            rank = code % ranks
+            key = (lane, self.steps[rank], self.setback[rank])
+            slots[key] = slots.get(key, 0) + packs
+        ordered = sorted(slots)
+        return (tuple(slots[key] for key in ordered), tuple(key[0] for key in ordered),
+                tuple(key[1] for key in ordered), tuple(key[2] for key in ordered))
+
+def _rank_table(**overrides) -> Tuple[int, ...]:
+    """Step table of ones with some ranks replaced, keyed by Rank name"""
+    return tuple(overrides.get(rank.name, 1) for rank in Rank)
+
+RULE_SETS = {
+    'standard': RuleSet('standard'),
+    'faces': RuleSet('faces', _rank_table(JACK=2, QUEEN=2, KING=2)),
+    'aces': RuleSet('aces', _rank_table(ACE=3)),
+    'faces_aces': RuleSet('faces_aces', _rank_table(ACE=3, JACK=2, QUEEN=2, KING=2)),
+    'setback': RuleSet('setback', setback=tuple(1 if rank is Rank.SEVEN else 0 for rank in Rank))
+}
+
+# =============================================================================
+# Event Bus
+# =============================================================================
+
+RACE_EVENTS = ('card_drawn', 'horse_moved', 'winner_declared', 'bet_placed', 'settled',
+               'race_started', 'race_finished', 'bet_rejected', 'phase_finished', 'frame_rendered')
+
+class EventBus:
+    """Route race events to plugin callbacks, emitting to nobody costs a dict lookup"""
+    
+    def __init__(self):
+        # Each event maps to an immutable tuple, replaced on change so emit never locks
+        self._listeners: Dict[str, Tuple[Callable, ...]] = {}
+        self._lock = threading.Lock()
+    
+    def subscribe(self, event: str, callback: Callable) -> Callable:
+        """Call callback with the event's keyword payload, return it for unsubscribe"""
+        if event not in RACE_EVENTS:
+            raise ValueError(f"Unknown event: {event}")
+        with self._lock:
+            self._listeners[event] = self._listeners.get(event, ()) + (callback,)
+        return callback
+    
+    def unsubscribe(self, event: str, callback: Callable) -> None:
+        """Stop calling callback for event"""
+        with self._lock:
+            remaining = tuple(listener for listener in self._listeners.get(event, ())
+                              if listener is not callback)
+            if remaining:
+                self._listeners[event] = remaining
+            else:
+                self._listeners.pop(event, None)
+    
+    def listeners(self, event: str) -> Tuple[Callable, ...]:
+        """Current subscribers, empty when nobody listens, for hoisting out of hot loops"""
+        return self._listeners.get(event, ())
+    
+    def emit(self, event: str, **payload) -> None:
+        """Deliver an event to its subscribers in subscription order"""
+        for callback in self._listeners.get(event, ()):
+            callback(**payload)
+
+# =============================================================================
+# Headless Simulation Engine
+# =============================================================================
+
+def simulate_races(races: int, seed: Optional[int] = None, track_length: int = 10,
+                   bus: Optional[EventBus] = None, packs: int = 1, lanes: int = 4,
+                   rules: Optional[RuleSet] = None) -> Dict:
+    """Run races on per-lane card counts without Card objects or display, return counters"""
+    rng = random.Random(seed)
+    layout = LaneLayout.create(lanes)
+    rules = rules or RULE_SETS['standard']
+    # Cards left per (lane, step, setback) slot, the shoe is never materialized
+    full, lane_of, step_of, back_of = rules.compile(layout, packs)
+    full = list(full)
+    shoe = sum(full)
+    sets_back = any(back_of)
+    keys = list(Suit) if layout.by_suit else list(layout.names)  # event payloads
+    wins = [0] * (lanes + 1)  # last slot counts races where the shoe ran out
+    lengths = [0] * (shoe + 1)
+    randrange = rng.randrange
+    # Subscribers are looked up once, an unobserved race pays one falsy check per card
+    card_drawn = bus.listeners('card_drawn') if bus else ()
+    horse_moved = bus.listeners('horse_moved') if bus else ()
+    winner_declared = bus.listeners('winner_declared') if bus else ()
+    observed = bool(card_drawn or horse_moved)
+    if observed:
+        # Observers get real cards like the game's: the pick left over inside a slot
+        # chooses one of its cards uniformly, so no extra random numbers are drawn
+        slot_index = {key: index for index, key in enumerate(zip(lane_of, step_of, back_of))}
+        slot_cards = [[] for _ in full]
+        ranks = list(Rank)
+        for code, lane in enumerate(layout.lane_of):
+            suit_index, rank_index = divmod(code, len(ranks))
+            key = (lane, rules.steps[rank_index], rules.setback[rank_index])
+            slot_cards[slot_index[key]].extend([Card(list(Suit)[suit_index], ranks[rank_index])] * packs)
+    
+    for _ in range(races):
+        remaining = full[:]
+        if observed:
+            cards_left = [cards[:] for cards in slot_cards]
+        positions = [0] * lanes
+        winner, drawn = lanes, shoe
+        for index in range(shoe):
+            # Draw without replacement: pick the card, then find its slot
+            pick = randrange(shoe - index)
+            slot = 0
+            while pick >= remaining[slot]:
+                pick -= remaining[slot]
+                slot += 1
+            remaining[slot] -= 1
+            lane = lane_of[slot]
+            if observed:
+                cards = cards_left[slot]
+                card = cards[pick]
+                cards[pick] = cards[-1]
+                cards.pop()
+                for callback in card_drawn:
+                    callback(suit=card.suit, card=card)
+            positions[lane] += step_of[slot]
+            if observed:
+                for callback in horse_moved:
+                    callback(suit=keys[lane], position=min(positions[lane], track_length))
+            if sets_back and back_of[slot]:
+                back = back_of[slot]
+                for other in range(lanes):
+                    if other != lane:
+                        positions[other] = max(0, positions[other] - back)
+                        for callback in horse_moved:
+                            callback(suit=keys[other], position=min(positions[other], track_length))
+            if positions[lane] >= track_length:
+                winner, drawn = lane, index + 1
+                break
+        wins[winner] += 1
+        lengths[drawn] += 1
+        if winner_declared and winner < lanes:
+            for callback in winner_declared:
+                callback(suit=keys[winner])
+    
+    return {'races': races, 'wins': wins[:lanes], 'no_winner': wins[lanes], 'race_lengths': lengths}
+
+@functools.lru_cache(maxsize=None)
+def _gauss_legendre(points: int) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    """Gauss-Legendre nodes and weights on [0, 1], exact for polynomials below degree 2 * points"""
+    nodes, weights = [], []
+    for index in range(1, points + 1):
+        x = math.cos(math.pi * (index - 0.25) / (points + 0.5))
+        for _ in range(100):
+            p0, p1 = 1.0, x
+            for order in range(2, points + 1):
+                p0, p1 = p1, ((2 * order - 1) * x * p1 - (order - 1) * p0) / order
+            derivative = points * (x * p1 - p0) / (x * x - 1) if points > 1 else 1.0
+            step = p1 / derivative
+            x -= step
+            if abs(step) < 1e-15:
+                break
+        nodes.append((1 - x) / 2)
+        weights.append(1 / ((1 - x * x) * derivative * derivative))
+    return tuple(nodes), tuple(weights)
+
+def _binomial_steps(count: int, step: int, t: float, cap: int) -> List[float]:
+    """Distribution of step * Binomial(count, t), totals at or above cap pooled in the last cell"""
+    pmf = [0.0] * (cap + 1)
+    log_t, log_u = math.log(t), math.log1p(-t)
+    for drawn in range(count + 1):
+        log_choose = math.lgamma(count + 1) - math.lgamma(drawn + 1) - math.lgamma(count - drawn + 1)
+        pmf[min(drawn * step, cap)] += math.exp(log_choose + drawn * log_t + (count - drawn) * log_u)
+    return pmf
+
+def _add_capped(left: List[float], right: List[float], cap: int) -> List[float]:
+    """Distribution of the capped sum of two independent capped totals"""
+    total = [0.0] * (cap + 1)
+    right = [(j, b) for j, b in enumerate(right) if b]
+    for i, a in enumerate(left):
+        if a:
+            for j, b in right:
+                total[min(i + j, cap)] += a * b
+    return total
+
+def _lane_finish(classes: Tuple[Tuple[int, int], ...], need: int, t: float) -> Tuple[float, float]:
+    """(chance the lane has finished by time t, finishing density at t) for (count, step) classes"""
+    if not classes:
+        return 0.0, 0.0
+    full = [_binomial_steps(count, step, t, need) for count, step in classes]
+    total = full[0]
+    for pmf in full[1:]:
+        total = _add_capped(total, pmf, need)
+    density = 0.0
+    for index, (count, step) in enumerate(classes):
+        # One card of this class arrives at t and carries the lane over the line
+        others = _binomial_steps(count - 1, step, t, need)
+        for other, pmf in enumerate(full):
+            if other != index:
+                others = _add_capped(others, pmf, need)
+        density += count * sum(others[max(0, need - step):need])
+    return total[need], density
+
+@functools.lru_cache(maxsize=1 << 16)
+def _exact_by_arrival_times(positions: Tuple[int, ...], remaining: Tuple[int, ...], track_length: int,
+                            lane_of: Tuple[int, ...], step_of: Tuple[int, ...]) -> Tuple[float, ...]:
+    """Win chance per lane when no card moves another lane
+
+    A uniformly shuffled shoe is the order of independent uniform arrival
+    times, one per card, so lanes finish independently and the winner is the
+    earliest finish. The integrand is a polynomial of degree below the card
+    count, so Gauss-Legendre quadrature with enough nodes is exact.
+    """
+    lanes = len(positions)
+    finished = [lane for lane in range(lanes) if positions[lane] >= track_length]
+    if finished:
+        return tuple(1.0 if lane == finished[0] else 0.0 for lane in range(lanes))
+    classes = [{} for _ in range(lanes)]
+    for lane, step, count in zip(lane_of, step_of, remaining):
+        if step and count:
+            classes[lane][step] = classes[lane].get(step, 0) + count
+    classes = [tuple((count, step) for step, count in sorted(lane.items())) for lane in classes]
+    needs = [track_length - position for position in positions]
+    nodes, weights = _gauss_legendre(sum(remaining) // 2 + 1)
+    result = [0.0] * lanes
+    for t, weight in zip(nodes, weights):
+        seen = {}  # lanes in the same state share one evaluation
+        finish = [seen[key] if key in seen else seen.setdefault(key, _lane_finish(key[0], key[1], t))
+                  for key in zip(classes, needs)]
+        for lane in range(lanes):
+            if finish[lane][1]:
+                others = 1.0
+                for other in range(lanes):
+                    if other != lane:
+                        others *= 1 - finish[other][0]
+                result[lane] += weight * finish[lane][1] * others
+    return tuple(result)
+
+@functools.lru_cache(maxsize=None)
+def _lane_symmetry(lanes: int, lane_of: Tuple[int, ...], step_of: Tuple[int, ...],
+                   back_of: Tuple[int, ...]) -> Tuple[Tuple[Tuple[int, ...], ...], Tuple[Tuple[int, ...], ...]]:
+    """(slots of each lane, groups of lanes whose slots move the same way)"""
+    blocks = tuple(tuple(slot for slot, owner in enumerate(lane_of) if owner == lane) for lane in range(lanes))
+    groups: Dict[Tuple, List[int]] = {}
+    for lane, block in enumerate(blocks):
+        groups.setdefault(tuple((step_of[slot], back_of[slot]) for slot in block), []).append(lane)
+    return blocks, tuple(tuple(group) for group in groups.values() if len(group) > 1)
+
+EXACT_STATE_BUDGET = 20000  # new solver states per exact call, about half a second of work
+
+class SolverBudgetExceeded(RuntimeError):
+    """The exact solver would need more states than its budget allows"""
+
+_solver_budget = threading.local()  # states left for the running exact call on this thread
+
+@functools.lru_cache(maxsize=1 << 20)
+def _exact_win_probabilities(positions: Tuple[int, ...], remaining: Tuple[int, ...], track_length: int,
+                             lane_of: Tuple[int, ...], step_of: Tuple[int, ...],
+                             back_of: Tuple[int, ...]) -> Tuple[float, ...]:
+    """Win chance per lane from a state of positions and cards left per slot, memoized across calls
+
+    Any rule set works here, including setbacks. Lanes that move the same
+    way are sorted first, so mirrored states share one cache entry.
+    """
+    lanes = len(positions)
+    blocks, groups = _lane_symmetry(lanes, lane_of, step_of, back_of)
+    source = list(range(lanes))  # canonical lane -> lane of this state
+    for group in groups:
+        members = sorted(group, key=lambda lane: (positions[lane], [remaining[slot] for slot in blocks[lane]]))
+        for target, lane in zip(group, members):
+            source[target] = lane
+    if any(lane != target for target, lane in enumerate(source)):
+        canonical = list(remaining)
+        for target, lane in enumerate(source):
+            for slot, original in zip(blocks[target], blocks[lane]):
+                canonical[slot] = remaining[original]
+        shared = _exact_win_probabilities(tuple(positions[lane] for lane in source), tuple(canonical),
+                                          track_length, lane_of, step_of, back_of)
+        result = [0.0] * lanes
+        for target, lane in enumerate(source):
+            result[lane] = shared[target]
+        return tuple(result)
+    
+    left = getattr(_solver_budget, 'left', None)  # memo hits never get here
+    if left is not None:
+        if left <= 0:
+            raise SolverBudgetExceeded("exact solver state budget exhausted")
+        _solver_budget.left = left - 1
+    
+    total = sum(remaining)
+    result = [0.0] * lanes
+    if not total:
+        return tuple(result)
+    for slot, count in enumerate(remaining):
+        if not count:
+            continue
+        chance = count / total
+        lane = lane_of[slot]
+        position = positions[lane] + step_of[slot]
+        if position >= track_length:
+            result[lane] += chance
+            continue
+        back = back_of[slot]
+        if back:
+            next_positions = tuple(position if other == lane else max(0, value - back)
+                                   for other, value in enumerate(positions))
+        else:
+            next_positions = positions[:lane] + (position,) + positions[lane + 1:]
+        next_remaining = remaining[:slot] + (count - 1,) + remaining[slot + 1:]
+        for other, probability in enumerate(_exact_win_probabilities(
+                next_positions, next_remaining, track_length, lane_of, step_of, back_of)):
+            result[other] += chance * probability
+    return tuple(result)
+
+def _solver_inputs(positions: Optional[Tuple[int, ...]], remaining: Optional[Tuple[int, ...]],
+                   packs: int, lanes: int, rules: Optional[RuleSet]) -> Tuple[Tuple[int, ...], ...]:
+    """(positions, remaining, lane_of, step_of, back_of) of a race state, checked"""
+    counts, lane_of, step_of, back_of = (rules or RULE_SETS['standard']).compile(
+        LaneLayout.create(lanes), packs)
+    positions = tuple(positions) if positions is not None else (0,) * lanes
+    remaining = tuple(remaining) if remaining is not None else counts
+    if len(positions) != lanes or len(remaining) not in (lanes, len(counts)):
+        raise ValueError("positions and remaining must have one entry per horse")
+    if len(remaining) != len(counts):
+        if len(counts) != lanes:
+            raise ValueError("these rules need remaining cards per compiled slot")
+        lane_of = tuple(range(lanes))
+    return positions, remaining, lane_of, step_of, back_of
+
+def exact_win_probabilities(positions: Optional[Tuple[int, ...]] = None,
+                            remaining: Optional[Tuple[int, ...]] = None,
+                            track_length: int = 10, packs: int = 1, lanes: int = 4,
+                            rules: Optional[RuleSet] = None,
+                            max_states: Optional[int] = EXACT_STATE_BUDGET) -> Tuple[float, ...]:
+    """Exact chance each horse wins, in lane (Suit) order, drawing without replacement
+
+    remaining counts cards per lane, or per compiled slot when the rules give
+    a lane cards with different moves. Setback rules need the recursive
+    solver, which raises SolverBudgetExceeded rather than add more than
+    max_states states (None for no limit).
+    """
+    positions, remaining, lane_of, step_of, back_of = _solver_inputs(positions, remaining, packs, lanes, rules)
+    if any(back_of):
+        previous = getattr(_solver_budget, 'left', None)
+        _solver_budget.left = max_states
+        try:
+            return _exact_win_probabilities(positions, remaining, track_length, lane_of, step_of, back_of)
+        finally:
+            _solver_budget.left = previous
+    return _exact_by_arrival_times(positions, remaining, track_length, lane_of, step_of)
+
+def estimate_win_probabilities(positions: Optional[Tuple[int, ...]] = None,
+                               remaining: Optional[Tuple[int, ...]] = None,
+                               track_length: int = 10, packs: int = 1, lanes: int = 4,
+                               rules: Optional[RuleSet] = None, races: int = 10000,
+                               seed: int = 0) -> Tuple[float, ...]:
+    """Monte Carlo win chances from a race state, for states the exact solver cannot afford"""
+    positions, remaining, lane_of, step_of, back_of = _solver_inputs(positions, remaining, packs, lanes, rules)
+    randrange = random.Random(seed).randrange
+    shoe = sum(remaining)
+    wins = [0] * lanes
+    for _ in range(races):
+        left, at = list(remaining), list(positions)
+        for index in range(shoe):
+            pick = randrange(shoe - index)
+            slot = 0
+            while pick >= left[slot]:
+                pick -= left[slot]
+                slot += 1
+            left[slot] -= 1
+            lane = lane_of[slot]
+            at[lane] += step_of[slot]
+            back = back_of[slot]
+            if back:
+                for other in range(lanes):
+                    if other != lane:
+                        at[other] = max(0, at[other] - back)
+            if at[lane] >= track_length:
+                wins[lane] += 1
+                break
+    return tuple(count / races for count in wins)
+
+@functools.lru_cache(maxsize=None)
+def race_length_distribution(track_length: int = 10) -> Tuple[float, ...]:
+    """Exact chance the race ends on each card count, the last entry includes no winner"""
+    ranks, lanes = len(Rank), len(Suit)
+    cards = ranks * lanes
+    # One lane's generating function over cards drawn while it stays short of the finish
+    lane = [math.comb(ranks, count) for count in range(min(track_length - 1, ranks) + 1)]
+    edge = [0] * (track_length - 1) + [math.comb(ranks, track_length - 1)] if track_length <= ranks else [0]
+    
+    def multiply(left, right):
+        product = [0] * (len(left) + len(right) - 1)
+        for i, a in enumerate(left):
+            if a:
+                for j, b in enumerate(right):
+                    product[i + j] += a * b
+        return product
+    
+    others = [1]
+    for _ in range(lanes - 1):
+        others = multiply(others, lane)
+    all_short = multiply(others, lane)
+    one_away = [lanes * ways for ways in multiply(others, edge)]  # any lane one step from home
+    
+    distribution = [0.0] * (cards + 1)
+    for drawn, ways in enumerate(one_away[:cards]):
+        distribution[drawn + 1] = ways * (ranks - track_length + 1) / (math.comb(cards, drawn) * (cards - drawn))
+    if len(all_short) > cards:
+        distribution[cards] += all_short[cards]  # deck ran out, C(52, 52) == 1
+    return tuple(distribution)
+
+def race_transcript(seed: Optional[int] = None, track_length: int = 10,
+                    packs: int = 1, lanes: int = 4, rules: Optional[RuleSet] = None) -> Dict:
+    """Play one full race with real Deck and Track objects and record every card"""
+    rules = rules or RULE_SETS['standard']
+    deck = Deck(random.Random(seed), packs=packs)
+    deck.shuffle()
+    track = Track(track_length, LaneLayout.create(lanes))
+    cards = []
+    winner = None
+    while winner is None:
+        card = deck.draw_card()
+        if not card:
+            break
+        steps, back = rules.move(card)
+        horse = track.move_card(card, steps)
+        if back:
+            track.set_back(horse, back)
+        cards.append({'card': str(card), 'suit': card.suit.name,
+                      'positions': [horse.position for horse in track.horses.values()]})
+        winner = track.get_winner()
+    if winner:
+        winner = winner.suit.name if winner.suit else winner.symbol
+    return {'seed': seed, 'track_length': track_length, 'cards': cards, 'winner': winner}
+
+# =============================================================================
+# Bet Optimizer
+# =============================================================================
+
+def evaluate_slip(slip: Dict[Suit, int], probabilities: Optional[Tuple[float, ...]] = None,
+                  odds: float = 3.0) -> Dict:
+    """Expected net profit and its variance for a slip, with payout rounding
+
+    Without probabilities this assumes the standard 10-step, one-pack race;
+    pass the game's own win probabilities for any other configuration.
+    """
+    probabilities = probabilities or exact_win_probabilities()
+    total_bet = sum(slip.values())
+    outcomes = [(probability, int(slip.get(suit, 0) * odds) - total_bet)
+                for suit, probability in zip(Suit, probabilities)]
+    outcomes.append((max(0.0, 1.0 - sum(probabilities)), -total_bet))  # deck ran out
+    expected = sum(probability * net for probability, net in outcomes)
+    variance = sum(probability * net * net for probability, net in outcomes) - expected * expected
+    return {'total_bet': total_bet, 'expected_value': expected, 'variance': max(variance, 0.0)}
+
+def kelly_fractions(probabilities: Tuple[float, ...], odds: float = 3.0) -> List[float]:
+    """Growth-optimal share of the balance per horse when exactly one horse wins"""
+    decimal_odds = [odds] * len(probabilities)
+    order = sorted(range(len(probabilities)),
+                   key=lambda lane: probabilities[lane] * decimal_odds[lane], reverse=True)
+    reserve = 1.0  # return rate of the money kept back
+    chosen_probability = chosen_inverse_odds = 0.0
+    chosen = []
+    for lane in order:
+        if probabilities[lane] * decimal_odds[lane] <= reserve:
+            break
+        if chosen_inverse_odds + 1 / decimal_odds[lane] >= 1:
+            break  # covering every horse would lock in a profit, keep the simple case
+        chosen.append(lane)
+        chosen_probability += probabilities[lane]
+        chosen_inverse_odds += 1 / decimal_odds[lane]
+        reserve = (1 - chosen_probability) / (1 - chosen_inverse_odds)
+    
+    fractions = [0.0] * len(probabilities)
+    for lane in chosen:
+        fractions[lane] = max(0.0, probabilities[lane] - reserve / decimal_odds[lane])
+    return fractions
+
+def optimize_slip(balance: int, probabilities: Optional[Tuple[float, ...]] = None,
+                  odds: float = 3.0, kelly_fraction: float = 1.0) -> Dict[Suit, int]:
+    """Kelly-style slip in whole dollars, empty when no bet has an edge"""
+    probabilities = probabilities or exact_win_probabilities()
+    fractions = kelly_fractions(probabilities, odds)
+    slip = {}
+    for suit, fraction in zip(Suit, fractions):
+        amount = int(balance * fraction * kelly_fraction)
+        if amount > 0:
+            slip[suit] = amount
+    return slip
+
+def suggest_bets(balance: int, config: Optional[GameConfig] = None,
+                 positions: Optional[Tuple[int, ...]] = None,
+                 remaining: Optional[Tuple[int, ...]] = None) -> Dict:
+    """Win chance and EV per $1 for each horse plus a suggested slip
+
+    The chances are exact, or a seeded Monte Carlo estimate where the exact
+    solver would exceed EXACT_STATE_BUDGET.
+    """
+    config = config or GameConfig()
+    rules = config.RULE_SET if isinstance(config.RULE_SET, RuleSet) else RuleSet.named(config.RULE_SET)
+    try:
+        probabilities = exact_win_probabilities(positions, remaining, config.TRACK_LENGTH,
+                                                config.DECK_PACKS, rules=rules)
+    except SolverBudgetExceeded:
+        probabilities = estimate_win_probabilities(positions, remaining, config.TRACK_LENGTH,
+                                                   config.DECK_PACKS, rules=rules)
+    slip = optimize_slip(balance, probabilities, config.WINNING_ODDS)
+    return {
+        'horses': {suit: {'probability': probability,
+                          'ev_per_dollar': probability * config.WINNING_ODDS - 1}
+                   for suit, probability in zip(Suit, probabilities)},
+        'slip': slip,
+        'evaluation': evaluate_slip(slip, probabilities, config.WINNING_ODDS)
+    }
+
+class OddsTask:
+    """suggest_bets on a worker thread, skipped if cancelled before it starts
+
+    The exact solver cannot be interrupted, a task cancelled mid-run finishes
+    in the background, its answer is dropped and only its memo is kept.
+    """
+    
+    def __init__(self, executor, balance: int, config: Optional[GameConfig] = None):
+        self.cancelled = False
+        self._future = executor.submit(suggest_bets, balance, config)
+    
+    def done(self) -> bool:
+        """Whether the computation has finished"""
+        return self._future.done()
+    
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """The suggestion once ready, None on timeout or cancellation"""
+        from concurrent.futures import CancelledError, TimeoutError
+        if self.cancelled:
+            return None
+        try:
+            return self._future.result(timeout)
+        except (CancelledError, TimeoutError):
+            return None
+    
+    def cancel(self) -> None:
+        """Drop the result, the worker skips the task if it has not started"""
+        self.cancelled = True
+        self._future.cancel()
+
 # =============================================================================
 # Player System
 # =============================================================================
 
+def is_losing_game(net_profit: int) -> bool:
+    """A game without a net profit, breaking even extends a losing streak too"""
+    return net_profit <= 0
+
+class GameHistory:
+    """Columnar game history, one array.array column per field"""
+    
+    SUITS = list(Suit)  # winner code is the index into this list
+    
+    def __init__(self):
+        self.winners = array('b')
+        self.bets = {suit: array('q') for suit in self.SUITS}
+        self.winnings = array('q')
+        self.net_profit = array('q')
+        self.balance_after = array('q')
+        self._total_profit = 0
+        self._winning_games = 0
+    
+    def record(self, bets: Dict[Suit, int], winner: Suit, winnings: int,
+               net_profit: int, balance_after: int) -> None:
+        """Append one settled game"""
+        self.winners.append(self.SUITS.index(winner))
+        for suit, column in self.bets.items():
+            column.append(bets.get(suit, 0))
+        self.winnings.append(winnings)
+        self.net_profit.append(net_profit)
+        self.balance_after.append(balance_after)
+        self._total_profit += net_profit
+        if not is_losing_game(net_profit):
+            self._winning_games += 1
+    
+    def append(self, game: Dict) -> None:
+        """Append a game given in the dict form returned by iteration"""
+        self.record(game['bets'], game['winner'], game['winnings'],
+                    game['net_profit'], game['balance_after'])
+    
+    def __len__(self) -> int:
+        return len(self.winners)
+    
+    def __getitem__(self, index: int) -> Dict:
+        """Rebuild the dict for one game"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("game history index out of range")
+        return {
+            'bets': {suit: column[index] for suit, column in self.bets.items() if column[index]},
+            'winner': self.SUITS[self.winners[index]],
+            'winnings': self.winnings[index],
+            'net_profit': self.net_profit[index],
+            'balance_after': self.balance_after[index]
+        }
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+    
+    def total_profit(self) -> int:
+        """Sum of net profit over all games"""
+        return self._total_profit
+    
+    def winning_games(self) -> int:
+        """Number of games with positive net profit"""
+        return self._winning_games
+    
+    def wins_by_horse(self) -> Dict[Suit, int]:
+        """Number of races won by each horse"""
+        return {suit: self.winners.count(code) for code, suit in enumerate(self.SUITS)}
+    
+    def bets_by_horse(self) -> Dict[Suit, int]:
+        """Total amount bet on each horse"""
+        return {suit: sum(column) for suit, column in self.bets.items()}
+    
+    def profit_by_horse(self) -> Dict[Suit, int]:
+        """Payouts from each winning horse minus the amount bet on it"""
+        payouts = {suit: 0 for suit in self.SUITS}
+        for code, winnings in zip(self.winners, self.winnings):
+            payouts[self.SUITS[code]] += winnings
+        totals = self.bets_by_horse()
+        return {suit: payouts[suit] - totals[suit] for suit in self.SUITS}
+    
+    def memory_bytes(self) -> int:
+        """Bytes held by the column buffers"""
+        columns = [self.winners, self.winnings, self.net_profit, self.balance_after]
+        columns.extend(self.bets.values())
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+    
+    def flush(self) -> None:
+        """Nothing to flush, the columns live in memory"""
+
+class SQLiteHistory:
+    """SQLite-backed game history with incrementally maintained summaries
+
+    Games are written in batches of batch_size, and a timer writes a partial
+    batch flush_interval seconds after its first game. A crash loses at most
+    that window; batch_size=1 writes every settle at one transaction per game.
+    """
+    
+    SUITS = GameHistory.SUITS
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY,
+            player TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            winner INTEGER NOT NULL,
+            bet_spades INTEGER NOT NULL,
+            bet_hearts INTEGER NOT NULL,
+            bet_diamonds INTEGER NOT NULL,
+            bet_clubs INTEGER NOT NULL,
+            winnings INTEGER NOT NULL,
+            net_profit INTEGER NOT NULL,
+            balance_after INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS games_player_time ON games (player, timestamp);
+        CREATE INDEX IF NOT EXISTS games_player_winner ON games (player, winner);
+        CREATE INDEX IF NOT EXISTS games_time ON games (timestamp);
+        CREATE TABLE IF NOT EXISTS player_summary (
+            player TEXT PRIMARY KEY,
+            games_played INTEGER NOT NULL,
+            total_profit INTEGER NOT NULL,
+            winning_games INTEGER NOT NULL,
+            losing_streak INTEGER NOT NULL,
+            longest_losing_streak INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS horse_summary (
+            player TEXT NOT NULL,
+            suit INTEGER NOT NULL,
+            races_won INTEGER NOT NULL,
+            amount_bet INTEGER NOT NULL,
+            payouts INTEGER NOT NULL,
+            PRIMARY KEY (player, suit)
+        );
+    """
+    
+    COLUMNS = ("winner, bet_spades, bet_hearts, bet_diamonds, bet_clubs, "
+               "winnings, net_profit, balance_after")
+    
+    def __init__(self, path: str, player: str = 'player', batch_size: int = 100,
+                 flush_interval: float = 1.0):
+        if sqlite3 is None:
+            raise RuntimeError("SQLite history requires the sqlite3 module")
+        self.player = player
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()  # the flush timer writes from its own thread
+        self._timer: Optional[threading.Timer] = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self._pending: List[tuple] = []
+        self._summary = self._load_summary()
+        self._horses = self._load_horses()
+    
+    def _load_summary(self) -> List[int]:
+        """Read [games, profit, winning games, streak, longest streak]"""
+        row = self.conn.execute(
+            "SELECT games_played, total_profit, winning_games, losing_streak, longest_losing_streak "
+            "FROM player_summary WHERE player = ?", (self.player,)).fetchone()
+        return list(row) if row else [0, 0, 0, 0, 0]
+    
+    def _load_horses(self) -> List[List[int]]:
+        """Read [races won, amount bet, payouts] per suit code"""
+        horses = [[0, 0, 0] for _ in self.SUITS]
+        rows = self.conn.execute(
+            "SELECT suit, races_won, amount_bet, payouts FROM horse_summary WHERE player = ?",
+            (self.player,))
+        for suit, races_won, amount_bet, payouts in rows:
+            horses[suit] = [races_won, amount_bet, payouts]
+        return horses
+    
+    def record(self, bets: Dict[Suit, int], winner: Suit, winnings: int,
+               net_profit: int, balance_after: int) -> None:
+        """Queue one settled game, written in batches or once flush_interval passes"""
+        code = self.SUITS.index(winner)
+        amounts = [bets.get(suit, 0) for suit in self.SUITS]
+        with self._lock:
+            self._pending.append((self.player, time.time(), code, *amounts,
+                                  winnings, net_profit, balance_after))
+            
+            summary = self._summary
+            summary[0] += 1
+            summary[1] += net_profit
+            if not is_losing_game(net_profit):
+                summary[2] += 1
+                summary[3] = 0
+            else:
+                summary[3] += 1
+                summary[4] = max(summary[4], summary[3])
+            self._horses[code][0] += 1
+            self._horses[code][2] += winnings
+            for horse, amount in zip(self._horses, amounts):
+                horse[1] += amount
+            
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def append(self, game: Dict) -> None:
+        """Append a game given in the dict form returned by iteration"""
+        self.record(game['bets'], game['winner'], game['winnings'],
+                    game['net_profit'], game['balance_after'])
+    
+    def flush(self) -> None:
+        """Write queued games and the updated summaries in one transaction"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                self._write()
+    
+    def _write(self) -> None:
+        """Run the batch transaction, caller holds the lock"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO games (player, timestamp, winner, bet_spades, bet_hearts, "
+                "bet_diamonds, bet_clubs, winnings, net_profit, balance_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO player_summary VALUES (?, ?, ?, ?, ?, ?)",
+                (self.player, *self._summary))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO horse_summary VALUES (?, ?, ?, ?, ?)",
+                [(self.player, code, *horse) for code, horse in enumerate(self._horses)])
+        self._pending.clear()
+    
+    def close(self) -> None:
+        """Flush and close the database"""
+        with self._lock:
+            self.flush()
+            self.conn.close()
+    
+    def __len__(self) -> int:
+        return self._summary[0]
+    
+    def _row_to_game(self, row: tuple) -> Dict:
+        """Convert a games row (from winner onwards) to the dict form"""
+        code, *amounts = row[:5]
+        return {
+            'bets': {suit: amount for suit, amount in zip(self.SUITS, amounts) if amount},
+            'winner': self.SUITS[code],
+            'winnings': row[5],
+            'net_profit': row[6],
+            'balance_after': row[7]
+        }
+    
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("game history index out of range")
+        self.flush()
+        row = self.conn.execute(
+            f"SELECT {self.COLUMNS} FROM games WHERE player = ? ORDER BY id LIMIT 1 OFFSET ?",
+            (self.player, index)).fetchone()
+        return self._row_to_game(row)
+    
+    def __iter__(self):
+        self.flush()
+        cursor = self.conn.execute(
+            f"SELECT {self.COLUMNS} FROM games WHERE player = ? ORDER BY id", (self.player,))
+        for row in cursor:
+            yield self._row_to_game(row)
+    
+    def total_profit(self) -> int:
+        """Sum of net profit over all games"""
+        return self._summary[1]
+    
+    def winning_games(self) -> int:
+        """Number of games with positive net profit"""
+        return self._summary[2]
+    
+    def longest_losing_streak(self) -> int:
+        """Most consecutive games without a net profit"""
+        return self._summary[4]
+    
+    def wins_by_horse(self) -> Dict[Suit, int]:
+        """Number of races won by each horse"""
+        return {suit: horse[0] for suit, horse in zip(self.SUITS, self._horses)}
+    
+    def bets_by_horse(self) -> Dict[Suit, int]:
+        """Total amount bet on each horse"""
+        return {suit: horse[1] for suit, horse in zip(self.SUITS, self._horses)}
+    
+    def profit_by_horse(self) -> Dict[Suit, int]:
+        """Payouts from each winning horse minus the amount bet on it"""
+        return {suit: horse[2] - horse[1] for suit, horse in zip(self.SUITS, self._horses)}
+    
+    def results_between(self, start: float, end: float) -> List[Dict]:
+        """Games settled between two Unix timestamps, using the time index"""
+        self.flush()
+        rows = self.conn.execute(
+            f"SELECT {self.COLUMNS} FROM games WHERE player = ? AND timestamp BETWEEN ? AND ? "
+            "ORDER BY id", (self.player, start, end))
+        return [self._row_to_game(row) for row in rows]
+
+class QuantileSketch:
+    """Mergeable log-bucket quantile sketch, relative error bounded, at most max_buckets buckets
+
+    Signed values go to separate positive and negative bucket maps. Past
+    max_buckets the buckets nearest zero are folded together, so the tails
+    keep their accuracy.
+    """
+    
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def add(self, value: float) -> None:
+        """Record one value"""
+        if value > 0:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.positive[index] = self.positive.get(index, 0) + 1
+        elif value < 0:
+            index = math.ceil(math.log(-value) / self._log_gamma)
+            self.negative[index] = self.negative.get(index, 0) + 1
+        else:
+            self.zero += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+    
+    def _collapse(self) -> None:
+        while len(self.positive) + len(self.negative) > self.max_buckets:
+            buckets = self.positive if len(self.positive) >= len(self.negative) else self.negative
+            lowest, second = sorted(buckets)[:2]
+            buckets[second] += buckets.pop(lowest)
+    
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Add another sketch with the same accuracy into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("sketches need the same relative accuracy to merge")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._collapse()
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q in [0, 1], None while empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        buckets = [(-index, self.negative[index], -1) for index in sorted(self.negative, reverse=True)]
+        buckets.append((None, self.zero, 0))
+        buckets.extend((index, self.positive[index], 1) for index in sorted(self.positive))
+        for index, count, sign in buckets:
+            seen += count
+            if seen > rank:
+                if not sign:
+                    return 0.0
+                magnitude = 2 * self._gamma ** (sign * index) / (self._gamma + 1)
+                return min(max(sign * magnitude, self.min), self.max)
+        return self.max
+    
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+class GameDistributions:
+    """Race length, profit per game and per session, longest losing streak, in fixed memory"""
+    
+    def __init__(self):
+        self.race_length = QuantileSketch()
+        self.profit = QuantileSketch()
+        self.session_profit = QuantileSketch()  # one value per finished session
+        self.longest_losing_streak = 0
+        self._losing_streak = 0
+        self._session_profit = 0
+        self._session_games = 0
+    
+    def record_race(self, cards: int) -> None:
+        """Cards drawn in one race"""
+        self.race_length.add(cards)
+    
+    def record_game(self, net_profit: int) -> None:
+        """Net profit of one settled game"""
+        self.profit.add(net_profit)
+        if is_losing_game(net_profit):
+            self._losing_streak += 1
+            self.longest_losing_streak = max(self.longest_losing_streak, self._losing_streak)
+        else:
+            self._losing_streak = 0
+        self._session_profit += net_profit
+        self._session_games += 1
+    
+    def end_session(self) -> None:
+        """Close the running session total, streaks do not carry over"""
+        if self._session_games:
+            self.session_profit.add(self._session_profit)
+        self._losing_streak = self._session_profit = self._session_games = 0
+    
+    def merge(self, other: 'GameDistributions') -> None:
+        """Fold in distributions from another player or worker"""
+        self.race_length.merge(other.race_length)
+        self.profit.merge(other.profit)
+        self.session_profit.merge(other.session_profit)
+        self.longest_losing_streak = max(self.longest_losing_streak, other.longest_losing_streak)
+    
+    def summary(self) -> Dict:
+        """Percentiles of each distribution, None where nothing was recorded"""
+        def percentiles(sketch, points):
+            return {name: sketch.quantile(q) for name, q in points}
+        return {
+            'games': self.profit.count,
+            'race_length': percentiles(self.race_length, (('median', 0.5), ('p90', 0.9))),
+            'profit': dict(percentiles(self.profit, (('p10', 0.1), ('median', 0.5), ('p90', 0.9))),
+                           mean=self.profit.mean()),
+            'session_profit': dict(percentiles(self.session_profit,
+                                               (('p10', 0.1), ('median', 0.5), ('p90', 0.9))),
+                                   sessions=self.session_profit.count),
+            'longest_losing_streak': self.longest_losing_streak
+        }
+
 class Player:
     """Player class"""
     
-    def __init__(self, initial_balance: int = 1000):
+    def __init__(self, initial_balance: int = 1000, history=None):
         self.balance = initial_balance
         self.bets: Dict[Suit, int] = {}  # {suit: bet_amount}
         self.total_bet = 0
-        self.game_history: List[Dict] = []  # Game history
+        self.game_history = history if history is not None else GameHistory()  # Game history
+        self.journal = None  # SessionStore logging each bet operation once it is applied
+        self.bus: Optional[EventBus] = None  # receives bet_placed and settled
+        self.distributions = GameDistributions()  # streaming sketches, fixed memory
+        self._lock = threading.Lock()  # guards balance, bets and total_bet
     
     def place_bet(self, suit: Suit, amount: int) -> Tuple[bool, str]:
         """Place bet, return (success, message)"""
-        if amount <= 0:
-            return False, lang.get('invalid_bet_amount')
-        
-        if amount > self.balance:
-            return False, f"{lang.get('insufficient_balance')}{self.balance}"
-        
+        with self._lock:
+            if amount <= 0:
+                error = lang.get('invalid_bet_amount')
+            elif amount > self.balance:
+                error = f"{lang.get('insufficient_balance')}{self.balance}"
+            else:
+                error = None
+                self._apply_bet(suit, amount)
+        if error:
+            if self.bus:
+                self.bus.emit('bet_rejected', player=self, suit=suit, amount=amount)
+            return False, error
+        if self.bus:
+            self.bus.emit('bet_placed', player=self, suit=suit, amount=amount)
+        return True, f"{lang.get('bet_success')}{suit.value} ${amount}"
+    
+    def place_bets(self, slip: Dict[Suit, int]) -> Tuple[bool, str]:
+        """Place a multi-horse slip all or nothing, return (success, message)"""
+        with self._lock:
+            if not slip or any(amount <= 0 for amount in slip.values()):
+                error = lang.get('invalid_bet_amount')
+            elif sum(slip.values()) > self.balance:
+                error = f"{lang.get('insufficient_balance')}{self.balance}"
+            else:
+                error = None
+                for suit, amount in slip.items():
+                    self._apply_bet(suit, amount)
+        if error:
+            if self.bus:
+                for suit, amount in slip.items():
+                    self.bus.emit('bet_rejected', player=self, suit=suit, amount=amount)
+            return False, error
+        if self.bus:
+            for suit, amount in slip.items():
+                self.bus.emit('bet_placed', player=self, suit=suit, amount=amount)
+        placed = " ".join(f"{suit.value} ${amount}" for suit, amount in slip.items())
+        return True, f"{lang.get('bet_success')}{placed}"
+    
+    def _apply_bet(self, suit: Suit, amount: int) -> None:
+        """Debit a validated bet, caller holds the lock"""
         # Accumulate bets (allow multiple bets on same horse)
         if suit in self.bets:
             self.bets[suit] += amount
@@ -459,39 +1776,52 @@ class Player:
         
         self.balance -= amount
         self.total_bet += amount
-        return True, f"{lang.get('bet_success')}{suit.value} ${amount}"
+        # Journaled once applied, a snapshot taken by log() must already include it
+        if self.journal:
+            self.journal.log('bet', suit=suit.name, amount=amount)
     
     def calculate_winnings(self, winning_suit: Suit, odds: float = 3.0) -> int:
         """Calculate winnings, return net profit/loss"""
-        winnings = 0
-        if winning_suit in self.bets:
-            bet_amount = self.bets[winning_suit]
-            winnings = int(bet_amount * odds)  # Odds multiplier
-            self.balance += winnings
-        
+        with self._lock:
+            winnings = 0
+            if winning_suit in self.bets:
+                bet_amount = self.bets[winning_suit]
+                winnings = int(bet_amount * odds)  # Odds multiplier
+            net_profit = self._settle(winning_suit, odds, winnings)
+        # Callbacks run outside the lock so they may read or bet on the player
+        if self.bus:
+            self.bus.emit('settled', player=self, winner=winning_suit, winnings=winnings,
+                          net_profit=net_profit)
+        return net_profit
+    
+    def _settle(self, winning_suit: Suit, odds: float, winnings: int) -> int:
+        """Credit computed winnings and record the game, caller holds the lock"""
+        self.balance += winnings
+        if self.journal:
+            self.journal.log('settle', winner=winning_suit.name, odds=odds)
         net_profit = winnings - self.total_bet
         
         # Record game history
-        self.game_history.append({
-            'bets': self.bets.copy(),
-            'winner': winning_suit,
-            'winnings': winnings,
-            'net_profit': net_profit,
-            'balance_after': self.balance
-        })
-        
+        self.game_history.record(self.bets, winning_suit, winnings, net_profit, self.balance)
+        self.distributions.record_game(net_profit)
         return net_profit
     
     def clear_bets(self) -> None:
         """Clear current bets"""
-        self.bets.clear()
-        self.total_bet = 0
+        with self._lock:
+            self.bets.clear()
+            self.total_bet = 0
+            if self.journal:
+                self.journal.log('clear')
     
     def cancel_bets(self) -> None:
         """Cancel bets and refund amount"""
-        self.balance += self.total_bet
-        self.bets.clear()
-        self.total_bet = 0
+        with self._lock:
+            self.balance += self.total_bet
+            self.bets.clear()
+            self.total_bet = 0
+            if self.journal:
+                self.journal.log('cancel')
     
     def get_bet_summary(self) -> str:
         """Get betting summary"""
@@ -522,8 +1852,8 @@ class Player:
             return {"games_played": 0, "total_profit": 0, "win_rate": 0, "current_balance": self.balance}
         
         games_played = len(self.game_history)
-        total_profit = sum(game['net_profit'] for game in self.game_history)
-        wins = sum(1 for game in self.game_history if game['net_profit'] > 0)
+        total_profit = self.game_history.total_profit()
+        wins = self.game_history.winning_games()
         win_rate = wins / games_played * 100
         
         return {
@@ -532,6 +1862,270 @@ class Player:
             "win_rate": win_rate,
             "current_balance": self.balance
         }
+    
+    def get_distributions(self) -> Dict:
+        """Race length and profit percentiles and the longest losing streak"""
+        return self.distributions.summary()
+
+class BetLedger:
+    """Concurrency-safe bet ledger with one lock per player"""
+    
+    def __init__(self):
+        self.players: Dict[str, Player] = {}
+        self._registry_lock = threading.Lock()  # only taken to open accounts
+    
+    def open_account(self, player_id: str, initial_balance: int = 1000) -> Player:
+        """Return the player for an id, creating it on first use"""
+        player = self.players.get(player_id)
+        if player is None:
+            with self._registry_lock:
+                player = self.players.setdefault(player_id, Player(initial_balance))
+        return player
+    
+    def place_bet(self, player_id: str, suit: Suit, amount: int) -> Tuple[bool, str]:
+        """Atomically check the balance and debit one bet"""
+        return self.players[player_id].place_bet(suit, amount)
+    
+    def place_bets(self, player_id: str, slip: Dict[Suit, int]) -> Tuple[bool, str]:
+        """Atomically check the balance and debit a whole slip"""
+        return self.players[player_id].place_bets(slip)
+    
+    def total_balance(self) -> int:
+        """Sum of balances plus open bets over all players"""
+        return sum(player.balance + player.total_bet for player in list(self.players.values()))
+
+# =============================================================================
+# Batch Settlement
+# =============================================================================
+
+def settle_batch(bets, winners, balances, odds: float = 3.0, use_numpy: Optional[bool] = None):
+    """
+    Settle many (player, race) pairs in one pass
+    bets: one column per suit in Suit order, winners: suit codes, balances: after betting
+    Return: (winnings, net_profit, new_balances) as NumPy arrays or array('q')
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        if np is None:
+            raise RuntimeError("NumPy is not installed")
+        bet_matrix = np.asarray(bets, dtype=np.int64)
+        winner_codes = np.asarray(winners, dtype=np.intp)
+        winning_bets = bet_matrix[winner_codes, np.arange(len(winner_codes))]
+        # int64 -> float64 multiply then truncate, the same steps as int(amount * odds)
+        winnings = np.trunc(winning_bets * float(odds)).astype(np.int64)
+        net_profit = winnings - bet_matrix.sum(axis=0)
+        return winnings, net_profit, np.asarray(balances, dtype=np.int64) + winnings
+    
+    columns = [array('q', column) for column in bets]
+    winnings = array('q', (int(columns[winner][index] * odds) for index, winner in enumerate(winners)))
+    totals = array('q', map(sum, zip(*columns))) if columns else array('q')
+    net_profit = array('q', map(int.__sub__, winnings, totals))
+    new_balances = array('q', map(int.__add__, array('q', balances), winnings))
+    return winnings, net_profit, new_balances
+
+def settle_players(players: List[Player], winning_suit: Suit, odds: float = 3.0) -> List[int]:
+    """Settle every player of one shared race, return each net profit"""
+    code = GameHistory.SUITS.index(winning_suit)
+    bets = [[player.bets.get(suit, 0) for player in players] for suit in GameHistory.SUITS]
+    winnings, _, _ = settle_batch(bets, [code] * len(players), [0] * len(players), odds)
+    results = []
+    for player, amount in zip(players, winnings):
+        with player._lock:
+            net_profit = player._settle(winning_suit, odds, int(amount))
+        if player.bus:
+            player.bus.emit('settled', player=player, winner=winning_suit, winnings=int(amount),
+                            net_profit=net_profit)
+        results.append(net_profit)
+    return results
+
+# =============================================================================
+# Session Persistence
+# =============================================================================
+
+def card_code(card: Card) -> int:
+    """Encode a card as suit index * 13 + rank index"""
+    return GameHistory.SUITS.index(card.suit) * len(Rank) + list(Rank).index(card.rank)
+
+def card_from_code(code: int) -> Card:
+    """Decode a card encoded by card_code"""
+    suit_index, rank_index = divmod(code, len(Rank))
+    return Card(GameHistory.SUITS[suit_index], list(Rank)[rank_index])
+
+class SessionJournal:
+    """Append-only journal of bet operations with group commit"""
+    
+    def __init__(self, path: str, group_size: int = 32, group_interval: float = 0.05):
+        self.path = path
+        self.group_size = group_size
+        self.group_interval = group_interval
+        self.seq = max((record['seq'] for record in self.read(path)), default=0)
+        self.file = open(path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._lock = threading.RLock()  # the sync timer runs on its own thread
+        self._timer: Optional[threading.Timer] = None
+    
+    @staticmethod
+    def read(path: str, after_seq: int = 0):
+        """Yield journal records newer than after_seq, skipping a torn last line"""
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record['seq'] > after_seq:
+                    yield record
+    
+    def append(self, op: str, **fields) -> int:
+        """Write a record through to the OS, fsync once per group or group_interval"""
+        with self._lock:
+            self.seq += 1
+            self.file.write(json.dumps({'seq': self.seq, 'op': op, **fields}) + "\n")
+            self.file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.group_size:
+                self.sync()
+            elif self._timer is None:
+                # Bound the wait even if no further record arrives
+                self._timer = threading.Timer(self.group_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+            return self.seq
+    
+    def sync(self) -> None:
+        """Make every written record durable"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._unsynced and not self.file.closed:
+                os.fsync(self.file.fileno())
+                self._unsynced = 0
+    
+    def truncate(self) -> None:
+        """Drop all records, called once a snapshot covers them"""
+        with self._lock:
+            self.file.close()
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self._unsynced = 0
+    
+    def close(self) -> None:
+        """Sync and close the journal"""
+        with self._lock:
+            self.sync()
+            self.file.close()
+
+class SessionStore:
+    """Crash recovery through snapshots plus a journal of applied bet operations"""
+    
+    def __init__(self, directory: str, snapshot_every: int = 100, group_size: int = 32):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, 'session.snapshot.json')
+        self.journal = SessionJournal(os.path.join(directory, 'session.journal'), group_size)
+        self.snapshot_every = snapshot_every
+        self.player: Optional[Player] = None
+        self.track: Optional[Track] = None
+        self.deck: Optional[Deck] = None
+        self.race_open = False  # bets placed and not yet settled or cancelled
+        self._since_snapshot = 0
+    
+    def attach(self, player: Player, track: Track, deck: Deck) -> None:
+        """Start journaling the player and snapshotting the game objects"""
+        self.player, self.track, self.deck = player, track, deck
+        player.journal = self
+    
+    def log(self, op: str, **fields) -> None:
+        """Journal one operation, snapshot after every snapshot_every records"""
+        self.journal.append(op, **fields)
+        self._track_race(op)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+    
+    def _track_race(self, op: str) -> None:
+        """Follow whether the journaled bets still await a race"""
+        if op == 'bet':
+            self.race_open = True
+        elif op in ('settle', 'cancel', 'clear'):
+            self.race_open = False
+    
+    def snapshot(self) -> None:
+        """Atomically replace the snapshot, then drop the covered journal"""
+        state = {
+            'seq': self.journal.seq,
+            'race_open': self.race_open,
+            'player': {
+                'balance': self.player.balance,
+                'bets': {suit.name: amount for suit, amount in self.player.bets.items()},
+                'total_bet': self.player.total_bet
+            },
+            'track': {suit.name: horse.position for suit, horse in self.track.horses.items()},
+            'deck': {
+                'cards': [card_code(card) for card in self.deck.cards],
+                'used_cards': [card_code(card) for card in self.deck.used_cards],
+                'discarded': self.deck.discarded
+            }
+        }
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot:
+            json.dump(state, snapshot, separators=(',', ':'))
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self.journal.truncate()
+        self._since_snapshot = 0
+    
+    def restore(self, player: Player, track: Track, deck: Deck) -> bool:
+        """Load the last snapshot and replay newer journal records"""
+        seq = 0
+        restored = False
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as snapshot:
+                state = json.load(snapshot)
+            seq = state['seq']
+            self.journal.seq = max(self.journal.seq, seq)  # the truncated journal restarts at 0
+            self.race_open = state['race_open']
+            player.balance = state['player']['balance']
+            player.bets = {Suit[name]: amount for name, amount in state['player']['bets'].items()}
+            player.total_bet = state['player']['total_bet']
+            for name, position in state['track'].items():
+                track.horses[Suit[name]].position = position
+            deck.cards = [card_from_code(code) for code in state['deck']['cards']]
+            deck.used_cards = [card_from_code(code) for code in state['deck']['used_cards']]
+            deck.discarded = state['deck'].get('discarded', 0)
+            restored = True
+        
+        journal, player.journal = player.journal, None  # replay without re-journaling
+        try:
+            for record in SessionJournal.read(self.journal.path, seq):
+                self._replay(player, record)
+                self._track_race(record['op'])
+                restored = True
+        finally:
+            player.journal = journal
+        return restored
+    
+    @staticmethod
+    def _replay(player: Player, record: Dict) -> None:
+        """Apply one journal record to the player"""
+        op = record['op']
+        if op == 'bet':
+            player.place_bet(Suit[record['suit']], record['amount'])
+        elif op == 'cancel':
+            player.cancel_bets()
+        elif op == 'clear':
+            player.clear_bets()
+        elif op == 'settle':
+            # Only the balance, the game is already in the player's history
+            with player._lock:
+                player.balance += int(player.bets.get(Suit[record['winner']], 0) * record['odds'])
+    
+    def close(self) -> None:
+        """Sync and close the journal"""
+        self.journal.close()
 
 # =============================================================================
 # Input Validation System
@@ -583,20 +2177,20 @@ class GameDisplay:
     """Game display class"""
     
     @staticmethod
-    def print_error(message: str) -> None:
-        print(f"❌ Error: {message}")
+    def print_error(message: str, output=print) -> None:
+        output(f"❌ Error: {message}")
     
     @staticmethod
-    def print_success(message: str) -> None:
-        print(f"✅ {message}")
+    def print_success(message: str, output=print) -> None:
+        output(f"✅ {message}")
     
     @staticmethod
-    def print_info(message: str) -> None:
-        print(f"ℹ️ {message}")
+    def print_info(message: str, output=print) -> None:
+        output(f"ℹ️ {message}")
     
     @staticmethod
-    def print_warning(message: str) -> None:
-        print(f"⚠️ Warning: {message}")
+    def print_warning(message: str, output=print) -> None:
+        output(f"⚠️ Warning: {message}")
     
     @staticmethod
     def format_currency(amount: int) -> str:
@@ -607,45 +2201,376 @@ class GameDisplay:
         return f"{value:.1f}%"
 
 # =============================================================================
-# Main Game Engine
+# Event Loop System
 # =============================================================================
 
-class HorseRacingGame:
-    """Horse racing game main class"""
+class RealClock:
+    """Monotonic wall-clock time with real sleeps"""
     
-    def __init__(self, config: GameConfig = None):
-        self.config = config or GameConfig()
-        self.deck = Deck()
-        self.track = Track(self.config.TRACK_LENGTH)
-        self.player = Player(self.config.INITIAL_BALANCE)
-        self.current_card: Optional[Card] = None
-        self.game_running = False
-        self.display = GameDisplay()
+    def now(self) -> float:
+        return time.monotonic()
     
-    def clear_screen(self) -> None:
-        """Clear screen"""
-        if self.config.CLEAR_SCREEN:
-            os.system('cls' if os.name == 'nt' else 'clear')
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
     
-    def display_header(self) -> None:
-        """Display game title"""
-        print("="*50)
-        print(f"🎰 {lang.get('game_title')} 🐎")
-        print("="*50)
+    def select(self, selector: selectors.BaseSelector, timeout: Optional[float]):
+        """Wait for input up to timeout clock seconds"""
+        return selector.select(timeout)
+
+class ScaledClock(RealClock):
+    """Real time running scale times faster, 2.0 halves every wait"""
     
-    def show_language_menu(self) -> None:
-        """Show language selection menu"""
-        self.clear_screen()
-        print("="*50)
-        print(f"🌐 {lang.get('language_menu')}")
-        print("="*50)
-        print(lang.get('english_option'))
-        print(lang.get('chinese_option'))
-        print()
-        
-        while True:
-            choice = input(lang.get('choose_language')).strip()
-            valid, choice_num, error_msg = InputValidator.validate_menu_choice(choice, range(1, 3))
+    def __init__(self, scale: float):
+        if scale <= 0:
+            raise ValueError("scale must be positive")
+        self.scale = scale
+        self._origin = time.monotonic()
+    
+    def now(self) -> float:
+        return self._origin + (time.monotonic() - self._origin) * self.scale
+    
+    def sleep(self, seconds: float) -> None:
+        super().sleep(seconds / self.scale)
+    
+    def select(self, selector: selectors.BaseSelector, timeout: Optional[float]):
+        return selector.select(None if timeout is None else timeout / self.scale)
+
+class VirtualClock:
+    """Time that jumps forward on sleep, recording every requested delay"""
+    
+    def __init__(self, start: float = 0.0):
+        self.time = start
+        self.sleeps: List[float] = []
+    
+    def now(self) -> float:
+        return self.time
+    
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.time += max(seconds, 0)
+    
+    def select(self, selector: selectors.BaseSelector, timeout: Optional[float]):
+        """Poll for input, then skip to the timeout instead of waiting for it"""
+        if timeout is None:
+            return selector.select()
+        events = selector.select(0)
+        if not events:
+            self.sleep(timeout)
+        return events
+    
+    @property
+    def slept(self) -> float:
+        """Total seconds skipped"""
+        return sum(self.sleeps)
+
+class EventLoop:
+    """Selector-based event loop for keyboard input and timers"""
+
+    def __init__(self, stream=None, interactive: Optional[bool] = None, clock=None):
+        self.stream = stream if stream is not None else sys.stdin
+        self.clock = clock or RealClock()
+        self.selector: Optional[selectors.BaseSelector] = None
+        self._timers: List[list] = []  # heap of [deadline, seq, callback]
+        self._seq = 0
+        self.prompt: Optional[str] = None  # shown while read_line waits
+
+        if interactive is None:
+            interactive = self._is_tty()
+        if interactive:
+            try:
+                selector = selectors.DefaultSelector()
+                selector.register(self.stream.fileno(), selectors.EVENT_READ)
+                self.selector = selector
+            except (AttributeError, OSError, ValueError):
+                # Not selectable (e.g. Windows console), fall back to sleeping
+                self.selector = None
+
+    def _is_tty(self) -> bool:
+        """Check whether the input stream is an interactive terminal"""
+        try:
+            return self.stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    def call_later(self, delay: float, callback) -> list:
+        """Schedule callback after delay seconds, return a cancellable handle"""
+        self._seq += 1
+        timer = [self.clock.now() + max(delay, 0), self._seq, callback]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+    @staticmethod
+    def cancel(timer: list) -> None:
+        """Cancel a timer returned by call_later"""
+        timer[2] = None
+
+    def _run_due_timers(self) -> None:
+        """Run every timer whose deadline has passed"""
+        now = self.clock.now()
+        while self._timers and self._timers[0][0] <= now:
+            callback = heapq.heappop(self._timers)[2]
+            if callback is not None:
+                callback()
+
+    def _next_timeout(self) -> Optional[float]:
+        """Seconds until the next timer, None if no timer is pending"""
+        while self._timers and self._timers[0][2] is None:
+            heapq.heappop(self._timers)
+        if not self._timers:
+            return None
+        return max(self._timers[0][0] - self.clock.now(), 0)
+
+    def run_once(self) -> bool:
+        """Block until the next timer or keypress, return True on keypress"""
+        timeout = self._next_timeout()
+        if self.selector is None:
+            if timeout is None:
+                return False
+            self.clock.sleep(timeout)
+        elif self.clock.select(self.selector, timeout):
+            self._drain_input()
+            return True
+        self._run_due_timers()
+        return False
+
+    def _drain_input(self) -> None:
+        """Consume pending keypresses so they don't leak into the next prompt"""
+        try:
+            os.read(self.stream.fileno(), 1024)
+        except (AttributeError, OSError, ValueError):
+            pass
+
+    def _key_mode(self):
+        """Context manager delivering single keypresses without Enter"""
+        return _CbreakMode(self.stream if self.selector is not None else None)
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds, return True if a keypress skipped it"""
+        if timeout <= 0:
+            return False
+        expired = []
+        timer = self.call_later(timeout, lambda: expired.append(True))
+        with self._key_mode():
+            while not expired:
+                if self.run_once():
+                    self.cancel(timer)
+                    return True
+        return False
+
+    def read_line(self, prompt: str = "") -> str:
+        """Read a line of input, running timers while the player types"""
+        if self.selector is None:
+            return input(prompt)
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        self.prompt = prompt
+        try:
+            while not self.clock.select(self.selector, self._next_timeout()):
+                self._run_due_timers()
+        finally:
+            self.prompt = None
+        return input()
+
+class ConsoleIO(EventLoop):
+    """Terminal I/O backend, stdout output on top of the event loop"""
+    
+    def write(self, text: str = "") -> None:
+        """Write one line of output"""
+        print(text)
+    
+    def flush(self) -> None:
+        """Push buffered output to the terminal"""
+        sys.stdout.flush()
+    
+    def notify(self, text: str) -> None:
+        """Write a line from a timer, redrawing the prompt if one is waiting"""
+        if self.prompt is None:
+            print(text)
+            return
+        sys.stdout.write(f"\n{text}\n{self.prompt}")
+        sys.stdout.flush()
+    
+    def clear(self) -> None:
+        """Clear the terminal"""
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+class ScriptedIO:
+    """I/O backend replaying canned answers, output is counted and dropped or buffered into a sink"""
+    
+    BUFFER_LINES = 4096  # lines collected before one write to the sink
+    
+    def __init__(self, answers, sink=None):
+        self.answers = iter(answers)
+        self.sink = sink  # text stream receiving the transcript, None drops it
+        self.lines_written = 0
+        self._buffer: List[str] = []
+    
+    @staticmethod
+    def read_script(stream) -> List[str]:
+        """One answer per line, blank lines press Enter, lines starting with # are comments"""
+        return [line.rstrip('\r\n') for line in stream if not line.startswith('#')]
+    
+    def read_line(self, prompt: str = "") -> str:
+        """Return the next answer, EOFError once they run out like input()"""
+        try:
+            answer = next(self.answers)
+        except StopIteration:
+            raise EOFError("scripted input exhausted") from None
+        if self.sink is not None:
+            self._buffer.append(prompt + answer)  # echoed like a terminal would
+        return answer
+    
+    def wait(self, timeout: float) -> bool:
+        """Return immediately, nobody is watching"""
+        return False
+    
+    def write(self, text: str = "") -> None:
+        """Count an output line, keep it for the sink"""
+        self.lines_written += 1
+        if self.sink is not None:
+            self._buffer.append(text)
+            if len(self._buffer) >= self.BUFFER_LINES:
+                self.drain()
+    
+    notify = write
+    
+    def flush(self) -> None:
+        """Per-frame flushes are ignored, the sink is written in blocks"""
+    
+    def drain(self) -> None:
+        """Write buffered lines to the sink"""
+        if self._buffer:
+            self.sink.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+    
+    def clear(self) -> None:
+        """No screen to clear"""
+
+class _CbreakMode:
+    """Put a terminal in cbreak mode for the duration of a with block"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.saved = None
+
+    def __enter__(self):
+        if self.stream is None:
+            return self
+        try:
+            import termios
+            import tty
+        except ImportError:
+            return self
+        try:
+            fd = self.stream.fileno()
+            self.saved = termios.tcgetattr(fd)
+            tty.setcbreak(fd)
+        except (termios.error, AttributeError, OSError, ValueError):
+            self.saved = None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.saved is not None:
+            import termios
+            termios.tcsetattr(self.stream.fileno(), termios.TCSADRAIN, self.saved)
+        return False
+
+class FrameScheduler:
+    """Adaptive frame pacing for race playback"""
+    
+    def __init__(self, max_fps: float = 30):
+        self.frame_budget = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.render_cost = 0.0  # smoothed seconds spent drawing one frame
+        self.next_frame_at = 0.0
+        self.frames_rendered = 0
+        self.frames_dropped = 0
+    
+    def is_due(self, now: float) -> bool:
+        """Check whether the frame budget allows drawing another frame"""
+        return now >= self.next_frame_at
+    
+    def record_render(self, started: float, finished: float) -> None:
+        """Record a drawn frame, slow terminals push the next frame back"""
+        cost = finished - started
+        if self.frames_rendered:
+            self.render_cost = 0.8 * self.render_cost + 0.2 * cost
+        else:
+            self.render_cost = cost
+        self.frames_rendered += 1
+        self.next_frame_at = finished + max(self.frame_budget, self.render_cost)
+    
+    def record_drop(self) -> None:
+        """Record a frame skipped to stay within budget"""
+        self.frames_dropped += 1
+
+# =============================================================================
+# Main Game Engine
+# =============================================================================
+
+class HorseRacingGame:
+    """Horse racing game main class"""
+    
+    def __init__(self, config: GameConfig = None, io=None, clock=None):
+        self.config = config or GameConfig()
+        self.clock = clock or self.config.CLOCK or getattr(io, 'clock', None) or RealClock()
+        self.io = io or ConsoleIO(clock=self.clock)  # input, output and timed waits
+        if hasattr(self.io, 'clock'):
+            self.io.clock = self.clock
+        self.shuffle_pool = None
+        if self.config.SHUFFLE_POOL:
+            self.shuffle_pool = ShufflePool(len(Suit) * len(Rank) * self.config.DECK_PACKS,
+                                            self.config.SHUFFLE_POOL)
+        self.deck = Deck(pool=self.shuffle_pool, packs=self.config.DECK_PACKS, cut_card=self.config.CUT_CARD)
+        self.track = Track(self.config.TRACK_LENGTH)
+        rules = self.config.RULE_SET
+        self.rules = rules if isinstance(rules, RuleSet) else RuleSet.named(rules)
+        history = SQLiteHistory(self.config.HISTORY_DB) if self.config.HISTORY_DB else None
+        self.player = Player(self.config.INITIAL_BALANCE, history)
+        self.current_card: Optional[Card] = None
+        self.game_running = False
+        self.display = GameDisplay()
+        self.phase_listener = None  # called with (phase name, seconds) after each phase
+        self.bus = EventBus()  # plugins subscribe here instead of editing the phases
+        self.player.bus = self.bus
+        self.odds_task: Optional[OddsTask] = None  # suggestions computed while betting
+        self._odds_timer = None
+        self._odds_executor = None  # one worker thread, started on the first betting phase
+        self.broadcaster: Optional[RaceBroadcaster] = None
+        if self.config.SPECTATOR_PORT is not None:
+            self.broadcaster = RaceBroadcaster(port=self.config.SPECTATOR_PORT)
+            self.broadcaster.start()
+        self._detach_metrics = self.config.METRICS.attach(self) if self.config.METRICS else None
+        self.session: Optional[SessionStore] = None
+        if self.config.SESSION_DIR:
+            self.session = SessionStore(self.config.SESSION_DIR)
+            self.session.restore(self.player, self.track, self.deck)
+            self.session.attach(self.player, self.track, self.deck)
+    
+    def clear_screen(self) -> None:
+        """Clear screen"""
+        if self.config.CLEAR_SCREEN:
+            self.io.clear()
+    
+    def display_header(self) -> None:
+        """Display game title"""
+        self.io.write("="*50)
+        self.io.write(f"🎰 {lang.get('game_title')} 🐎")
+        self.io.write("="*50)
+    
+    def show_language_menu(self) -> None:
+        """Show language selection menu"""
+        self.clear_screen()
+        self.io.write("="*50)
+        self.io.write(f"🌐 {lang.get('language_menu')}")
+        self.io.write("="*50)
+        self.io.write(lang.get('english_option'))
+        self.io.write(lang.get('chinese_option'))
+        self.io.write()
+        
+        while True:
+            choice = self.io.read_line(lang.get('choose_language')).strip()
+            valid, choice_num, error_msg = InputValidator.validate_menu_choice(choice, range(1, 3))
             
             if valid:
                 if choice_num == 1:
@@ -654,7 +2579,7 @@ class HorseRacingGame:
                     lang.set_language('zh')
                 break
             else:
-                print(f"❌ {error_msg}")
+                self.io.write(f"❌ {error_msg}")
     
     def start_game(self) -> None:
         """Start game main loop"""
@@ -663,19 +2588,25 @@ class HorseRacingGame:
         
         self.game_running = True
         
-        print(lang.get('welcome'))
-        print(lang.get('initializing'))
-        time.sleep(1)
+        self.io.write(lang.get('welcome'))
+        self.io.write(lang.get('initializing'))
+        self.io.wait(self.config.MESSAGE_DELAY)
+        
+        # Finish a race interrupted by a crash with the restored deck order
+        if self.session and self.session.race_open:
+            self.display.print_info(lang.get('session_restored'), self.io.write)
+            self.racing_phase()
+            self.settlement_phase()
         
         while self.game_running:
             try:
                 self.show_main_menu()
-                choice = input(lang.get('choose_option')).strip()
+                choice = self.io.read_line(lang.get('choose_option')).strip()
                 
                 valid, choice_num, error_msg = InputValidator.validate_menu_choice(choice, range(1, 5))
                 if not valid:
-                    self.display.print_error(error_msg)
-                    time.sleep(1)
+                    self.display.print_error(error_msg, self.io.write)
+                    self.io.wait(self.config.MESSAGE_DELAY)
                     continue
                 
                 if choice_num == 1:
@@ -688,86 +2619,176 @@ class HorseRacingGame:
                     self.quit_game()
             
             except KeyboardInterrupt:
-                print(f"\n{lang.get('game_interrupted')}")
+                self.io.write(f"\n{lang.get('game_interrupted')}")
                 self.quit_game()
             except Exception as e:
-                self.display.print_error(f"{lang.get('error_occurred')}{e}")
-                input(lang.get('press_enter_continue'))
+                self.display.print_error(f"{lang.get('error_occurred')}{e}", self.io.write)
+                self.io.read_line(lang.get('press_enter_continue'))
     
     def show_main_menu(self) -> None:
         """Display main menu"""
         self.clear_screen()
         self.display_header()
-        print(f"{lang.get('your_balance')}{self.display.format_currency(self.player.balance)}")
-        print()
-        print(lang.get('start_new_game'))
-        print(lang.get('view_rules'))
-        print(lang.get('view_stats'))
-        print(lang.get('quit_game'))
-        print()
+        self.io.write(f"{lang.get('your_balance')}{self.display.format_currency(self.player.balance)}")
+        self.io.write()
+        self.io.write(lang.get('start_new_game'))
+        self.io.write(lang.get('view_rules'))
+        self.io.write(lang.get('view_stats'))
+        self.io.write(lang.get('quit_game'))
+        self.io.write()
     
     def play_single_game(self) -> None:
         """Play single game"""
         # Check balance
         if self.player.balance <= 0:
-            self.display.print_error(lang.get('insufficient_balance_game'))
-            input(lang.get('press_enter_continue'))
+            self.display.print_error(lang.get('insufficient_balance_game'), self.io.write)
+            self.io.read_line(lang.get('press_enter_continue'))
             return
         
         # Initialize game
         self.deck.reset()
         self.track.reset()
         self.player.clear_bets()
+        if self.session:
+            self.session.snapshot()
         
         # Game phases
-        if self.betting_phase():
-            self.racing_phase()
-            self.settlement_phase()
+        if self._run_phase('betting', self.betting_phase):
+            self._run_phase('racing', self.racing_phase)
+            self._run_phase('settlement', self.settlement_phase)
+    
+    def _run_phase(self, name: str, phase):
+        """Run a game phase, reporting its duration to phase_listener and phase_finished"""
+        phase_finished = self.bus.listeners('phase_finished')
+        if self.phase_listener is None and not phase_finished:
+            return phase()
+        started = time.perf_counter()
+        result = phase()
+        seconds = time.perf_counter() - started
+        if self.phase_listener is not None:
+            self.phase_listener(name, seconds)
+        for callback in phase_finished:
+            callback(phase=name, seconds=seconds)
+        return result
+    
+    ODDS_POLL = 0.1  # seconds between checks on the background odds while a prompt waits
+    SUGGEST_WAIT = 2.0  # seconds the suggest option waits for unfinished background odds
     
     def betting_phase(self) -> bool:
         """Betting phase, return whether betting was successful"""
+        self.start_odds_task()
+        try:
+            return self._betting_menu()
+        finally:
+            self.stop_odds_task()
+    
+    def start_odds_task(self) -> None:
+        """Start suggestions for this bankroll, announced by an event loop timer when ready"""
+        if not self.config.BACKGROUND_ODDS:
+            return
+        if self._odds_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._odds_executor = ThreadPoolExecutor(1, thread_name_prefix='odds')
+        self.odds_task = OddsTask(self._odds_executor, self.player.balance + self.player.total_bet,
+                                  self.config)
+        if hasattr(self.io, 'call_later'):
+            self._odds_timer = self.io.call_later(self.ODDS_POLL, self._poll_odds)
+    
+    def stop_odds_task(self) -> None:
+        """Cancel the background odds and their timer when leaving the betting screen"""
+        if self._odds_timer is not None:
+            EventLoop.cancel(self._odds_timer)
+            self._odds_timer = None
+        if self.odds_task is not None:
+            self.odds_task.cancel()
+            self.odds_task = None
+    
+    def _poll_odds(self) -> None:
+        """Timer callback, print the odds over the waiting prompt as soon as they exist"""
+        self._odds_timer = None
+        if self.odds_task is None:
+            return
+        if not self.odds_task.done():
+            self._odds_timer = self.io.call_later(self.ODDS_POLL, self._poll_odds)
+            return
+        for line in self._odds_lines():
+            self.io.notify(line)
+    
+    def _odds_lines(self) -> List[str]:
+        """Fair odds and EV per horse plus the suggested slip, or a pending note"""
+        task = self.odds_task
+        if task is None:
+            return []
+        if not task.done():
+            return [lang.get('odds_pending')]
+        try:
+            suggestion = task.wait()
+        except Exception:  # the suggest option reports it, the menu just stays quiet
+            return []
+        if suggestion is None:
+            return []
+        horses = "  ".join(
+            f"{suit.value} {1 / horse['probability']:.2f}x ({horse['ev_per_dollar']:+.2f})"
+            if horse['probability'] else f"{suit.value} -"
+            for suit, horse in suggestion['horses'].items())
+        lines = [f"{lang.get('fair_odds')}{horses}"]
+        if suggestion['slip']:
+            slip = " ".join(f"{suit.value} ${amount}" for suit, amount in suggestion['slip'].items())
+            lines.append(f"{lang.get('suggested_slip')}{slip}")
+        return lines
+    
+    def _betting_menu(self) -> bool:
+        """Betting menu loop, return whether bets were placed"""
         while True:
             self.clear_screen()
             self.display_header()
-            print(f"=== {lang.get('betting_phase')} ===")
-            print(f"{lang.get('your_balance')}{self.display.format_currency(self.player.balance)}")
-            print()
+            self.io.write(f"=== {lang.get('betting_phase')} ===")
+            self.io.write(f"{lang.get('your_balance')}{self.display.format_currency(self.player.balance)}")
+            self.io.write()
             
             # Display current betting status
             if self.player.bets:
-                print(self.player.get_bet_summary())
-                print()
+                self.io.write(self.player.get_bet_summary())
+                self.io.write()
             
-            print(f"{lang.get('choose_horse')}")
-            print(lang.get('spades_option'))
-            print(lang.get('hearts_option'))
-            print(lang.get('diamonds_option'))
-            print(lang.get('clubs_option'))
-            print(lang.get('finish_betting'))
-            print(lang.get('return_menu'))
-            print()
+            self.io.write(f"{lang.get('choose_horse')}")
+            self.io.write(lang.get('spades_option'))
+            self.io.write(lang.get('hearts_option'))
+            self.io.write(lang.get('diamonds_option'))
+            self.io.write(lang.get('clubs_option'))
+            self.io.write(lang.get('finish_betting'))
+            self.io.write(lang.get('suggest_option'))
+            self.io.write(lang.get('return_menu'))
+            self.io.write()
+            odds_lines = self._odds_lines()
+            for line in odds_lines:
+                self.io.write(line)
+            if odds_lines:
+                self.io.write()
             
-            choice = input(lang.get('choose_bet_option')).strip()
+            choice = self.io.read_line(lang.get('choose_bet_option')).strip()
             
-            valid, choice_num, error_msg = InputValidator.validate_menu_choice(choice, range(0, 6))
+            valid, choice_num, error_msg = InputValidator.validate_menu_choice(choice, range(0, 7))
             if not valid:
-                self.display.print_error(error_msg)
-                time.sleep(1)
+                self.display.print_error(error_msg, self.io.write)
+                self.io.wait(self.config.MESSAGE_DELAY)
                 continue
             
             if choice_num == 0:
                 # Refund bet amount
                 if self.player.bets:
                     self.player.cancel_bets()
-                    self.display.print_info(lang.get('bet_cancelled'))
-                    time.sleep(1)
+                    self.display.print_info(lang.get('bet_cancelled'), self.io.write)
+                    self.io.wait(self.config.MESSAGE_DELAY)
                 return False
             elif choice_num == 5:
                 if self.player.bets:
                     return True
                 else:
-                    self.display.print_error(lang.get('bet_at_least_one'))
-                    time.sleep(1)
+                    self.display.print_error(lang.get('bet_at_least_one'), self.io.write)
+                    self.io.wait(self.config.MESSAGE_DELAY)
+            elif choice_num == 6:
+                self.show_suggestions()
             elif choice_num in [1, 2, 3, 4]:
                 suit_map = {
                     1: Suit.SPADES,
@@ -777,125 +2798,1907 @@ class HorseRacingGame:
                 }
                 selected_suit = suit_map[choice_num]
                 
-                amount_str = input(lang.get('enter_bet_amount')).strip()
+                amount_str = self.io.read_line(lang.get('enter_bet_amount')).strip()
                 valid, amount, error_msg = InputValidator.validate_bet_amount(amount_str, self.player.balance)
                 
                 if valid:
                     success, message = self.player.place_bet(selected_suit, amount)
                     if success:
-                        self.display.print_success(message)
+                        self.display.print_success(message, self.io.write)
                     else:
-                        self.display.print_error(message)
+                        self.display.print_error(message, self.io.write)
                 else:
-                    self.display.print_error(error_msg)
+                    self.bus.emit('bet_rejected', player=self.player, suit=selected_suit, amount=amount)
+                    self.display.print_error(error_msg, self.io.write)
                 
-                time.sleep(1)
+                self.io.wait(self.config.MESSAGE_DELAY)
+    
+    def show_suggestions(self) -> None:
+        """Show exact win chances, EV per horse and a Kelly-style slip"""
+        if self.odds_task and not self.odds_task.cancelled:
+            suggestion = self.odds_task.wait(self.SUGGEST_WAIT)
+            if suggestion is None:  # the menu stays responsive, the task keeps going
+                self.io.write(lang.get('odds_still_computing'))
+                self.io.read_line(lang.get('press_enter_continue'))
+                return
+        else:
+            suggestion = suggest_bets(self.player.balance + self.player.total_bet, self.config)
+        self.io.write()
+        self.io.write(f"=== {lang.get('suggestion_title')} ===")
+        for suit, horse in suggestion['horses'].items():
+            self.io.write(f"{suit.value} {self.player._get_horse_name_for_suit(suit)}: "
+                          f"{lang.get('win_chance')}{self.display.format_percentage(horse['probability'] * 100)}"
+                          f"{lang.get('ev_per_dollar')}{horse['ev_per_dollar']:+.3f}")
+        if suggestion['slip']:
+            slip = " ".join(f"{suit.value} ${amount}" for suit, amount in suggestion['slip'].items())
+            self.io.write(f"{lang.get('suggested_slip')}{slip}")
+        else:
+            self.io.write(lang.get('no_positive_ev'))
+        if self.player.bets:
+            probabilities = tuple(horse['probability'] for horse in suggestion['horses'].values())
+            evaluation = evaluate_slip(self.player.bets, probabilities, self.config.WINNING_ODDS)
+            self.io.write(f"{lang.get('slip_ev')}{evaluation['expected_value']:.2f}"
+                          f"{lang.get('slip_stddev')}{math.sqrt(evaluation['variance']):.2f}")
+        self.io.read_line(lang.get('press_enter_continue'))
     
     def racing_phase(self) -> None:
-        """Racing phase"""
+        """Racing phase, any keypress skips the animation to the result"""
         self.clear_screen()
-        print(f"=== {lang.get('race_start')} ===")
-        print(lang.get('press_enter_start'))
-        input()
+        self.io.write(f"=== {lang.get('race_start')} ===")
+        self.io.write(lang.get('press_enter_start'))
+        self.io.write(lang.get('playback_options'))
+        self.io.write(lang.get('press_key_skip'))
+        speed = self.parse_playback_speed(self.io.read_line())
+        card_delay = self.config.ANIMATION_DELAY / speed if speed else 0.0
+        scheduler = FrameScheduler(self.config.MAX_FPS)
+        frame_rendered = self.bus.listeners('frame_rendered')
+        self.bus.emit('race_started')
+        
+        def render(frame: Optional[str] = None) -> None:
+            started = self.clock.now()
+            self.render_race_frame(frame)
+            finished = self.clock.now()
+            scheduler.record_render(started, finished)
+            for callback in frame_rendered:
+                callback(seconds=finished - started)
         
+        skipping = False
+        cards = 0
+        winner = None
+        dropped = False  # the last card's frame was skipped
         while True:
             # Draw card
-            self.current_card = self.deck.draw_card()
-            if not self.current_card:
-                print("Deck is empty, game ended")
+            card = self.deck.draw_card()
+            if not card:
+                if dropped:
+                    render()  # show where the horses ended up
+                self.io.write("Deck is empty, game ended")
                 break
+            self.current_card = card
+            cards += 1
+            
+            self.bus.emit('card_drawn', suit=self.current_card.suit, card=self.current_card)
             
             # Move corresponding horse
-            self.track.move_horse(self.current_card.suit)
+            steps, back = self.rules.move(self.current_card)
+            horse = self.track.move_card(self.current_card, steps)
+            self.bus.emit('horse_moved', suit=horse.suit, position=horse.position)
+            if back:
+                for other in self.track.set_back(horse, back):
+                    self.bus.emit('horse_moved', suit=other.suit, position=other.position)
+            winner = self.track.get_winner()
             
-            # Display current status
-            self.clear_screen()
-            print(self.track.display_track())
-            print()
-            print(f"{lang.get('current_card')}{self.current_card}")
-            print(f"{lang.get('remaining_cards')}{self.deck.remaining_count()}{lang.get('cards_suffix')}")
+            # Render once per card for spectators, they coalesce on their own
+            frame = None
+            if self.broadcaster:
+                frame = self.race_frame()
+                self.broadcaster.publish(frame)
+            
+            # Display current status, the final frame is never dropped
+            dropped = not (winner or (not skipping and scheduler.is_due(self.clock.now())))
+            if dropped:
+                scheduler.record_drop()
+            else:
+                render(frame)
             
             # Check winning condition
-            winner = self.track.get_winner()
             if winner:
-                print(f"\n🏆 {lang.get('winner_announcement')}{winner.name}!")
+                self.bus.emit('winner_declared', suit=winner.suit)
+                self.io.write(f"\n🏆 {lang.get('winner_announcement')}{winner.name}!")
                 break
             
-            # Animation delay
-            time.sleep(self.config.ANIMATION_DELAY)
+            # Animation delay, cut short by a keypress
+            if not skipping and self.io.wait(card_delay):
+                skipping = True
         
-        input(f"\n{lang.get('press_enter_results')}")
+        self.bus.emit('race_finished', suit=winner.suit if winner else None, cards=cards)
+        self.player.distributions.record_race(cards)
+        self.io.read_line(f"\n{lang.get('press_enter_results')}")
+    
+    def parse_playback_speed(self, choice: str) -> float:
+        """Map the race start input to a card rate multiplier"""
+        shortcuts = {'f': '4x', '4': '4x', 'i': 'instant', '1': '1x'}
+        key = shortcuts.get(choice.strip().lower(), self.config.PLAYBACK_SPEED)
+        return self.config.PLAYBACK_SPEEDS.get(key, 1.0)
+    
+    def race_frame(self) -> str:
+        """Text of one race frame: the track and the current card"""
+        return "\n".join([
+            self.track.display_track(),
+            "",
+            f"{lang.get('current_card')}{self.current_card}",
+            f"{lang.get('remaining_cards')}{self.deck.remaining_count()}{lang.get('cards_suffix')}"
+        ])
+    
+    def render_race_frame(self, frame: Optional[str] = None) -> None:
+        """Draw the track and the current card"""
+        self.clear_screen()
+        self.io.write(frame or self.race_frame())
+        self.io.flush()
     
     def settlement_phase(self) -> None:
         """Settlement phase"""
         winner = self.track.get_winner()
         if not winner:
-            print("Game ended abnormally")
+            # The shoe ran out (setback rules can outlast it), the race is void
+            refund = self.player.total_bet
+            self.player.cancel_bets()
+            self.io.write(f"{lang.get('no_winner_refund')}{refund}")
+            self.io.read_line(f"\n{lang.get('press_enter_continue')}")
             return
         
         self.clear_screen()
-        print(f"=== {lang.get('race_results')} ===")
-        print(f"🏆 {lang.get('winner')}{winner}")
-        print()
+        self.io.write(f"=== {lang.get('race_results')} ===")
+        self.io.write(f"🏆 {lang.get('winner')}{winner}")
+        self.io.write()
         
         # Calculate profit/loss
         net_profit = self.player.calculate_winnings(winner.suit, self.config.WINNING_ODDS)
         
-        print(f"{lang.get('your_bet_results')}")
+        self.io.write(f"{lang.get('your_bet_results')}")
         for suit, amount in self.player.bets.items():
             horse_name = self.player._get_horse_name_for_suit(suit)
             if suit == winner.suit:
                 winnings = int(amount * self.config.WINNING_ODDS)
-                print(f"{suit.value} {horse_name}: ${amount}{lang.get('win_result')}{winnings}")
+                self.io.write(f"{suit.value} {horse_name}: ${amount}{lang.get('win_result')}{winnings}")
             else:
-                print(f"{suit.value} {horse_name}: ${amount}{lang.get('lose_result')}")
+                self.io.write(f"{suit.value} {horse_name}: ${amount}{lang.get('lose_result')}")
         
-        print(f"\n{lang.get('total_profit_loss')}{'+' if net_profit >= 0 else ''}${net_profit}")
-        print(f"{lang.get('current_balance')}{self.display.format_currency(self.player.balance)}")
+        self.io.write(f"\n{lang.get('total_profit_loss')}{'+' if net_profit >= 0 else ''}${net_profit}")
+        self.io.write(f"{lang.get('current_balance')}{self.display.format_currency(self.player.balance)}")
         
-        input(f"\n{lang.get('press_enter_continue')}")
+        self.io.read_line(f"\n{lang.get('press_enter_continue')}")
     
     def show_rules(self) -> None:
         """Display game rules"""
         self.clear_screen()
-        print(f"=== {lang.get('game_rules_title')} ===")
-        print(lang.get('rule_1'))
-        print(lang.get('rule_2'))
-        print(lang.get('rule_3'))
-        print(lang.get('rule_4'))
-        print(lang.get('rule_5'))
-        print(lang.get('rule_6'))
-        print()
-        input(lang.get('press_enter_return'))
+        self.io.write(f"=== {lang.get('game_rules_title')} ===")
+        self.io.write(lang.get('rule_1'))
+        self.io.write(lang.get('rule_2'))
+        self.io.write(lang.get('rule_3'))
+        self.io.write(lang.get('rule_4'))
+        self.io.write(lang.get('rule_5'))
+        self.io.write(lang.get('rule_6'))
+        if self.rules != RULE_SETS['standard']:
+            moves = [f"{rank.value} +{steps}" for rank, steps in zip(Rank, self.rules.steps) if steps != 1]
+            moves += [f"{rank.value} {lang.get('sets_others_back')}{back}"
+                      for rank, back in zip(Rank, self.rules.setback) if back]
+            self.io.write(f"{lang.get('rule_variant')}{self.rules.name}): {', '.join(moves)}")
+        self.io.write()
+        self.io.read_line(lang.get('press_enter_return'))
     
     def show_statistics(self) -> None:
         """Display statistics"""
         self.clear_screen()
         stats = self.player.get_statistics()
-        print(f"=== {lang.get('game_stats_title')} ===")
-        print(f"{lang.get('games_played')}{stats['games_played']}{lang.get('games_suffix')}")
-        print(f"{lang.get('total_profit')}${stats['total_profit']}")
-        print(f"{lang.get('win_rate')}{self.display.format_percentage(stats['win_rate'])}")
-        print(f"{lang.get('current_balance')}{self.display.format_currency(stats['current_balance'])}")
-        print()
-        input(lang.get('press_enter_return'))
+        self.io.write(f"=== {lang.get('game_stats_title')} ===")
+        self.io.write(f"{lang.get('games_played')}{stats['games_played']}{lang.get('games_suffix')}")
+        self.io.write(f"{lang.get('total_profit')}${stats['total_profit']}")
+        self.io.write(f"{lang.get('win_rate')}{self.display.format_percentage(stats['win_rate'])}")
+        self.io.write(f"{lang.get('current_balance')}{self.display.format_currency(stats['current_balance'])}")
+        distributions = self.player.get_distributions()
+        race_length = distributions['race_length']
+        if race_length['median'] is not None:
+            self.io.write(f"{lang.get('race_length_stats')}{race_length['median']:.0f}{lang.get('p90_cards')}"
+                          f"{race_length['p90']:.0f}{lang.get('cards_unit')}")
+        profit = distributions['profit']
+        if profit['median'] is not None:
+            self.io.write(f"{lang.get('profit_percentiles')}{profit['p10']:.0f}{lang.get('median_profit')}"
+                          f"{profit['median']:.0f}{lang.get('p90_profit')}{profit['p90']:.0f}")
+            self.io.write(f"{lang.get('longest_losing_streak')}{distributions['longest_losing_streak']}"
+                          f"{lang.get('games_suffix')}")
+        self.io.write()
+        self.io.read_line(lang.get('press_enter_return'))
     
     def quit_game(self) -> None:
         """Quit game"""
-        print(lang.get('goodbye'))
+        self.io.write(lang.get('goodbye'))
+        self.player.game_history.flush()
+        self.player.distributions.end_session()
+        if self.session:
+            self.session.snapshot()  # a clean restart replays nothing
+            self.session.close()
+        if self.broadcaster:
+            self.broadcaster.close()
+        if self.shuffle_pool:
+            self.shuffle_pool.close()
+        if self._odds_executor:
+            self._odds_executor.shutdown(wait=False, cancel_futures=True)
+        if self._detach_metrics:
+            self._detach_metrics()
+            self._detach_metrics = None
         self.game_running = False
 
+# =============================================================================
+# Load Testing
+# =============================================================================
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with percentile estimates"""
+    
+    BUCKETS_PER_DECADE = 20
+    MIN_SECONDS = 1e-6
+    
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds: float) -> None:
+        """Add one latency sample"""
+        index = max(0, math.ceil(math.log10(max(seconds, self.MIN_SECONDS) / self.MIN_SECONDS)
+                                 * self.BUCKETS_PER_DECADE))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+    
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Add another histogram's samples to this one"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+    
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(self.MIN_SECONDS * 10 ** (index / self.BUCKETS_PER_DECADE), self.max)
+        return self.max
+    
+    def summary(self) -> Dict:
+        """Count, mean and tail latencies in seconds"""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max
+        }
+
+def read_rss_bytes() -> int:
+    """Resident set size of this process, 0 when the platform hides it"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, in KiB on Linux
+    except ImportError:
+        return 0
+
+def play_script(answers: List[str], sessions: int = 1, seed: Optional[int] = None,
+                sink=None, metrics: Optional['MetricsRegistry'] = None) -> Dict:
+    """Run whole sessions from the language menu to quit on scripted answers"""
+    config = GameConfig()
+    config.CLEAR_SCREEN = False
+    config.BACKGROUND_ODDS = False
+    config.METRICS = metrics
+    games = lines = 0
+    balances = []
+    distributions = GameDistributions()
+    started = time.perf_counter()
+    for session in range(sessions):
+        io = ScriptedIO(answers, sink)
+        game = HorseRacingGame(config, io)
+        if seed is not None:
+            game.deck.rng = random.Random(seed * 1000003 + session)
+        try:
+            game.start_game()
+        except EOFError:  # the script ended without choosing quit
+            game.quit_game()
+        if sink is not None:
+            io.drain()
+        games += len(game.player.game_history)
+        lines += io.lines_written
+        balances.append(game.player.balance)
+        distributions.merge(game.player.distributions)
+    elapsed = time.perf_counter() - started
+    return {
+        'sessions': sessions,
+        'games': games,
+        'lines_written': lines,
+        'final_balances': balances,
+        'distributions': distributions.summary(),
+        'elapsed_seconds': elapsed,
+        'sessions_per_second': sessions / elapsed if elapsed else 0.0
+    }
+
+class LoadTester:
+    """Drive scripted virtual players through full bet, race and settle cycles"""
+    
+    def __init__(self, players: int = 1000, games_per_player: int = 3, concurrency: int = 32,
+                 seed: int = 0, sample_interval: float = 0.5, shuffle_pool: int = 0):
+        self.players = players
+        self.games_per_player = games_per_player
+        self.concurrency = concurrency
+        self.seed = seed
+        self.sample_interval = sample_interval
+        self.shuffle_pool = shuffle_pool  # capacity of one pool shared by every virtual player
+        self._pool: Optional[ShufflePool] = None
+    
+    def _answers(self, rng: random.Random) -> List[str]:
+        """Menu input for one game: one bet, instant race, skip the result screens"""
+        return [str(rng.randint(1, 4)), str(rng.randint(1, 50)), '5', 'i', '', '']
+    
+    def _virtual_player(self, index: int) -> Tuple[Dict[str, LatencyHistogram], GameDistributions]:
+        """Play every game of one virtual player, return its latencies and distributions"""
+        rng = random.Random(self.seed * 1000003 + index)
+        answers = []
+        for _ in range(self.games_per_player):
+            answers.extend(self._answers(rng))
+        config = GameConfig()
+        config.CLEAR_SCREEN = False
+        config.BACKGROUND_ODDS = False  # scripted players never read them
+        game = HorseRacingGame(config, ScriptedIO(answers))
+        game.deck.pool = self._pool
+        
+        histograms = {name: LatencyHistogram() for name in ('betting', 'racing', 'settlement', 'game')}
+        game.phase_listener = lambda name, seconds: histograms[name].record(seconds)
+        for _ in range(self.games_per_player):
+            started = time.perf_counter()
+            game.play_single_game()
+            histograms['game'].record(time.perf_counter() - started)
+        game.player.distributions.end_session()
+        return histograms, game.player.distributions
+    
+    def run(self) -> Dict:
+        """Run all virtual players and return the report"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        rss_samples = []
+        stop = threading.Event()
+        started = time.perf_counter()
+        
+        def sample_rss():
+            while True:
+                rss_samples.append([round(time.perf_counter() - started, 3), read_rss_bytes()])
+                if stop.wait(self.sample_interval):
+                    break
+        
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        if self.shuffle_pool:
+            self._pool = ShufflePool(capacity=self.shuffle_pool, seed=self.seed)
+        totals = {name: LatencyHistogram() for name in ('betting', 'racing', 'settlement', 'game')}
+        distributions = GameDistributions()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                for histograms, player_distributions in pool.map(self._virtual_player, range(self.players)):
+                    for name, histogram in histograms.items():
+                        totals[name].merge(histogram)
+                    distributions.merge(player_distributions)
+        finally:
+            stop.set()
+            sampler.join()
+            if self._pool:
+                self._pool.close()
+        elapsed = time.perf_counter() - started
+        
+        games = totals['game'].count
+        return {
+            'version': VERSION,
+            'players': self.players,
+            'games_per_player': self.games_per_player,
+            'concurrency': self.concurrency,
+            'elapsed_seconds': elapsed,
+            'games_per_second': games / elapsed if elapsed else 0.0,
+            'actions_per_second': sum(h.count for h in totals.values()) / elapsed if elapsed else 0.0,
+            'latency': {name: histogram.summary() for name, histogram in totals.items()},
+            'distributions': distributions.summary(),
+            'rss_samples': rss_samples,
+            'peak_rss_bytes': max(rss for _, rss in rss_samples),
+            'shuffle_pool': ({'hits': self._pool.hits, 'misses': self._pool.misses}
+                             if self._pool else None)
+        }
+
+def compare_load_reports(baseline: Dict, current: Dict) -> List[str]:
+    """Describe throughput and latency changes between two reports"""
+    def change(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+    
+    lines = [f"games/s: {baseline['games_per_second']:.1f} -> {current['games_per_second']:.1f} "
+             f"({change(baseline['games_per_second'], current['games_per_second'])})"]
+    for name, latency in current['latency'].items():
+        old = baseline['latency'].get(name)
+        if old:
+            lines.append(f"{name} p99: {old['p99'] * 1000:.3f}ms -> {latency['p99'] * 1000:.3f}ms "
+                         f"({change(old['p99'], latency['p99'])})")
+    lines.append(f"peak RSS: {baseline['peak_rss_bytes']} -> {current['peak_rss_bytes']} "
+                 f"({change(baseline['peak_rss_bytes'], current['peak_rss_bytes'])})")
+    return lines
+
+class SoakTester:
+    """Play games back to back through play_single_game and watch memory per game"""
+    
+    def __init__(self, games: int = 10000, duration: Optional[float] = None, seed: int = 0,
+                 sample_every: int = 1000, warmup: int = 200, max_growth_per_game: int = 256,
+                 top: int = 10):
+        self.games = games
+        self.duration = duration  # seconds, stops early when reached
+        self.seed = seed
+        self.sample_every = sample_every
+        self.warmup = warmup
+        self.max_growth_per_game = max_growth_per_game  # traced bytes, history included
+        self.top = top
+    
+    @staticmethod
+    def _answers(rng: random.Random):
+        """Endless menu input: one small bet, instant race, skip the result screens"""
+        while True:
+            yield from (str(rng.randint(1, 4)), str(rng.randint(1, 10)), '5', 'i', '', '')
+    
+    def _sample(self, game: 'HorseRacingGame', played: int, started: float) -> Dict:
+        """Memory and container sizes after played games"""
+        import tracemalloc
+        return {
+            'games': played,
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+            'rss_bytes': read_rss_bytes(),
+            'traced_bytes': tracemalloc.get_traced_memory()[0],
+            'history_games': len(game.player.game_history),
+            'history_bytes': game.player.game_history.memory_bytes(),
+            'used_cards': len(game.deck.used_cards)
+        }
+    
+    def run(self) -> Dict:
+        """Play until games or duration runs out, return the report"""
+        import tracemalloc
+        config = GameConfig()
+        config.CLEAR_SCREEN = False
+        game = HorseRacingGame(config, ScriptedIO(self._answers(random.Random(self.seed))))
+        
+        tracemalloc.start()
+        started = time.perf_counter()
+        samples, baseline, baseline_games = [], None, 0
+        played = 0
+        try:
+            while played < self.games:
+                if self.duration is not None and time.perf_counter() - started >= self.duration:
+                    break
+                if game.player.balance < 10:
+                    game.player.balance = config.INITIAL_BALANCE  # refill, a broke player only sees a menu
+                game.play_single_game()
+                played += 1
+                if played == self.warmup or (baseline is None and played == self.games):
+                    baseline, baseline_games = tracemalloc.take_snapshot(), played
+                    samples.append(self._sample(game, played, started))
+                elif played % self.sample_every == 0:
+                    samples.append(self._sample(game, played, started))
+            final = self._sample(game, played, started)
+            if not samples or samples[-1]['games'] != played:
+                samples.append(final)
+            measured = played - baseline_games
+            growth = ((final['traced_bytes'] - samples[0]['traced_bytes']) / measured
+                      if baseline is not None and measured else 0.0)
+            passed = growth <= self.max_growth_per_game and final['used_cards'] <= len(Suit) * len(Rank)
+            top_sites = []
+            if not passed and baseline is not None:
+                top_sites = [str(stat) for stat in
+                             tracemalloc.take_snapshot().compare_to(baseline, 'lineno')[:self.top]]
+        finally:
+            tracemalloc.stop()
+            game.quit_game()
+        
+        return {
+            'version': VERSION,
+            'games': played,
+            'elapsed_seconds': time.perf_counter() - started,
+            'growth_bytes_per_game': growth,
+            'max_growth_per_game': self.max_growth_per_game,
+            'rss_growth_bytes': final['rss_bytes'] - samples[0]['rss_bytes'],
+            'samples': samples,
+            'top_allocations': top_sites,
+            'passed': passed
+        }
+
+# =============================================================================
+# Result Cache
+# =============================================================================
+
+class LRUCache:
+    """Bounded thread-safe least-recently-used cache"""
+    
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._items: 'OrderedDict' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, default=None):
+        """Return a cached value and mark it recently used"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return default
+    
+    def put(self, key, value) -> None:
+        """Store a value, evicting the least recently used beyond max_items"""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._items)
+
+class ResultCache:
+    """Content-addressed results: an in-memory LRU over an optional size-bounded directory"""
+    
+    # v<engine version>-<sha256>.json, and the .<thread>.tmp form of an unfinished write
+    FILE_NAME = re.compile(r"v(\d+)-([0-9a-f]{64})\.json(\.\d+\.tmp)?")
+    
+    def __init__(self, directory: Optional[str] = None, max_items: int = 256,
+                 max_bytes: int = 256 * 1024 * 1024, engine_version: int = ENGINE_VERSION):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.engine_version = engine_version
+        self.memory = LRUCache(max_items)
+        self._files: 'OrderedDict[str, int]' = OrderedDict()  # digest -> bytes, least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+    
+    def _scan(self) -> None:
+        """Index cache files of this engine version by access time, delete stale cache files
+
+        Only names the cache writes itself are touched, anything else in the
+        directory is left alone.
+        """
+        found = []
+        for entry in os.scandir(self.directory):
+            match = self.FILE_NAME.fullmatch(entry.name)
+            if not match:
+                continue
+            version, digest, unfinished = match.groups()
+            if int(version) == self.engine_version and not unfinished:
+                stat = entry.stat()
+                found.append((stat.st_mtime, digest, stat.st_size))
+            else:
+                os.remove(entry.path)  # another engine version, or an interrupted write
+        for _, digest, size in sorted(found):
+            self._files[digest] = size
+    
+    def _path(self, digest: str) -> str:
+        name = f"v{self.engine_version}-{digest}.json"
+        if not self.FILE_NAME.fullmatch(name):
+            raise ValueError("disk cache digests must come from key()")
+        return os.path.join(self.directory, name)
+    
+    def key(self, *parts) -> str:
+        """Stable hash of JSON-serializable parts and the engine version"""
+        text = json.dumps([self.engine_version, *parts], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode()).hexdigest()
+    
+    def simulation_key(self, races: int, seed: int, config=None, lanes: int = len(Suit)) -> str:
+        """Key of a seeded simulate_races run for a GameConfig"""
+        config = config or GameConfig
+        rules = config.RULE_SET if isinstance(config.RULE_SET, RuleSet) else RuleSet.named(config.RULE_SET)
+        return self.key('simulate', {'track_length': config.TRACK_LENGTH, 'packs': config.DECK_PACKS,
+                                     'lanes': lanes, 'rules': rules.key()}, seed, races)
+    
+    def get(self, digest: str):
+        """Cached value from memory, then disk, or None"""
+        value = self.memory.get(digest)
+        if value is None and self.directory:
+            with self._lock:
+                if digest in self._files:
+                    try:
+                        with open(self._path(digest), encoding='utf-8') as stored:
+                            value = json.load(stored)
+                        self._files.move_to_end(digest)
+                        os.utime(self._path(digest))  # keeps the LRU order across restarts
+                    except (OSError, ValueError):
+                        self._files.pop(digest)
+            if value is not None:
+                self.memory.put(digest, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    
+    def put(self, digest: str, value) -> None:
+        """Store a JSON-serializable value, evicting old files beyond max_bytes"""
+        self.memory.put(digest, value)
+        if not self.directory:
+            return
+        data = json.dumps(value, separators=(',', ':')).encode()
+        path = self._path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as output:
+            output.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._files[digest] = len(data)
+            self._files.move_to_end(digest)
+            total = sum(self._files.values())
+            while total > self.max_bytes and len(self._files) > 1:
+                oldest, size = self._files.popitem(last=False)
+                total -= size
+                try:
+                    os.remove(self._path(oldest))
+                except FileNotFoundError:
+                    pass
+    
+    def get_or_compute(self, digest: str, function: Callable, *args):
+        """Cached value, or function(*args) stored under digest"""
+        value = self.get(digest)
+        if value is None:
+            value = function(*args)
+            self.put(digest, value)
+        return value
+    
+    def simulate(self, races: int, seed: int, config=None, lanes: int = len(Suit)) -> Dict:
+        """simulate_races for a GameConfig, computed once per key"""
+        config = config or GameConfig
+        rules = config.RULE_SET if isinstance(config.RULE_SET, RuleSet) else RuleSet.named(config.RULE_SET)
+        return self.get_or_compute(self.simulation_key(races, seed, config, lanes), simulate_races,
+                                   races, seed, config.TRACK_LENGTH, None, config.DECK_PACKS, lanes, rules)
+    
+    @property
+    def disk_bytes(self) -> int:
+        with self._lock:
+            return sum(self._files.values())
+
+# =============================================================================
+# HTTP API
+# =============================================================================
+
+class SimulationAPI:
+    """Simulation, odds and race transcript endpoints behind an LRU response cache"""
+    
+    MAX_RACES = 10_000_000
+    
+    def __init__(self, cache_size: int = 256, executor=None, workers: Optional[int] = None,
+                 cache_dir: Optional[str] = None):
+        from concurrent.futures import ProcessPoolExecutor
+        self.cache = LRUCache(cache_size)
+        # Seeded results also survive restarts when a directory is given
+        self.results = ResultCache(cache_dir, max_items=cache_size) if cache_dir else None
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers)
+        self.routes = {'/simulate': self._simulate, '/odds': self._odds, '/race': self._race}
+    
+    @staticmethod
+    def _int(query: Dict[str, List[str]], name: str, default: Optional[int],
+             low: int, high: int) -> Optional[int]:
+        """Read one integer parameter within [low, high]"""
+        if name not in query:
+            return default
+        value = int(query[name][0])
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        return value
+    
+    @staticmethod
+    def _int_list(query: Dict[str, List[str]], name: str, default: Tuple[int, ...],
+                  maximum: int) -> Tuple[int, ...]:
+        """Read a comma separated list with one integer from 0 to maximum per horse"""
+        if name not in query:
+            return default
+        values = tuple(int(value) for value in query[name][0].split(','))
+        if len(values) != len(Suit) or min(values) < 0 or max(values) > maximum:
+            raise ValueError(f"{name} needs {len(Suit)} integers from 0 to {maximum}")
+        return values
+    
+    def _simulate(self, query):
+        """(cache key or None, callable, args) for /simulate"""
+        races = self._int(query, 'races', 1000, 1, self.MAX_RACES)
+        seed = self._int(query, 'seed', None, 0, 2 ** 63)
+        packs, lanes, track_length = self._shoe(query)
+        key = ('simulate', races, seed, track_length, packs, lanes) if seed is not None else None
+        return key, simulate_races, (races, seed, track_length, None, packs, lanes)
+    
+    def _shoe(self, query) -> Tuple[int, int, int]:
+        """(packs, lanes, track_length), the track may grow with the shoe"""
+        packs = self._int(query, 'packs', 1, 1, Deck.MAX_PACKS)
+        lanes = self._int(query, 'lanes', len(Suit), 2, len(Suit) * len(Rank))
+        track_length = self._int(query, 'track_length', GameConfig.TRACK_LENGTH, 1, len(Rank) * packs)
+        return packs, lanes, track_length
+    
+    def _odds(self, query):
+        """(cache key, callable, args) for /odds"""
+        track_length = self._int(query, 'track_length', GameConfig.TRACK_LENGTH, 1, len(Rank))
+        # Bounded by the one-pack shoe, larger counts would make the solver run for minutes
+        positions = self._int_list(query, 'positions', (0,) * len(Suit), track_length)
+        remaining = self._int_list(query, 'remaining', (len(Rank),) * len(Suit), len(Rank))
+        return ('odds', positions, remaining, track_length), fair_odds, (positions, remaining, track_length)
+    
+    def _race(self, query):
+        """(cache key or None, callable, args) for /race"""
+        seed = self._int(query, 'seed', None, 0, 2 ** 63)
+        packs, lanes, track_length = self._shoe(query)
+        key = ('race', seed, track_length, packs, lanes) if seed is not None else None
+        return key, race_transcript, (seed, track_length, packs, lanes)
+    
+    def handle(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, bytes]:
+        """Return (status, JSON body) for a GET request"""
+        route = self.routes.get(path)
+        if route is None:
+            return 404, json.dumps({'error': f"unknown endpoint {path}"}).encode()
+        try:
+            key, function, args = route(query)
+        except ValueError as error:
+            return 400, json.dumps({'error': str(error)}).encode()
+        
+        if key is not None:
+            body = self.cache.get(key)
+            if body is not None:
+                return 200, body
+        if key is not None and self.results is not None:
+            result = self.results.get_or_compute(self.results.key(*key), self._compute, function, args)
+        else:
+            result = self._compute(function, args)
+        body = json.dumps(result).encode()
+        if key is not None:
+            self.cache.put(key, body)
+        return 200, body
+    
+    def _compute(self, function: Callable, args: Tuple):
+        """Run one request in the worker pool"""
+        return self.executor.submit(function, *args).result()
+    
+    def close(self) -> None:
+        """Stop the worker pool"""
+        self.executor.shutdown()
+
+def fair_odds(positions: Tuple[int, ...], remaining: Tuple[int, ...], track_length: int) -> Dict:
+    """Exact win probability and fair decimal odds per horse"""
+    probabilities = exact_win_probabilities(positions, remaining, track_length)
+    return {
+        'positions': list(positions),
+        'remaining': list(remaining),
+        'track_length': track_length,
+        'horses': {suit.name: {'probability': probability,
+                               'fair_odds': 1 / probability if probability else None}
+                   for suit, probability in zip(Suit, probabilities)}
+    }
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """JSON over HTTP/1.1 with keep-alive"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        status, body = self.server.api.handle(url.path, parse_qs(url.query))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format: str, *args) -> None:
+        """Keep the console quiet"""
+
+def create_api_server(host: str = '127.0.0.1', port: int = 8080,
+                      api: Optional[SimulationAPI] = None) -> ThreadingHTTPServer:
+    """Create the HTTP server, one thread per connection, CPU work in the API pool"""
+    server = ThreadingHTTPServer((host, port), APIRequestHandler)
+    server.daemon_threads = True
+    server.api = api or SimulationAPI()
+    return server
+
+# =============================================================================
+# Metrics
+# =============================================================================
+
+# name: (type, help, histogram bucket bounds)
+GAME_METRICS = {
+    'races_started_total': ('counter', "Races started", None),
+    'races_finished_total': ('counter', "Races finished, with or without a winner", None),
+    'bets_placed_total': ('counter', "Bets accepted", None),
+    'bets_rejected_total': ('counter', "Bets refused for amount or balance", None),
+    'bet_amount_total': ('counter', "Dollars staked", None),
+    'payouts_total': ('counter', "Dollars paid out to winning bets", None),
+    'active_sessions': ('gauge', "Games attached to this registry", None),
+    'player_balance_total': ('gauge', "Sum of attached player balances in dollars", None),
+    'race_length_cards': ('histogram', "Cards drawn per race",
+                          (10, 15, 20, 25, 30, 35, 40, 45, 52, 104, 208, 416)),
+    'phase_seconds': ('histogram', "Wall time per game phase",
+                      (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120, 600)),
+    'frame_render_seconds': ('histogram', "Time to draw one race frame",
+                             (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)),
+}
+
+class _MetricShard:
+    """One thread's counters and histogram buckets, only that thread writes it"""
+    
+    __slots__ = ('counters', 'histograms')
+    
+    def __init__(self):
+        self.counters: Dict[Tuple, float] = {}
+        self.histograms: Dict[Tuple, List[float]] = {}  # key -> bucket counts + [+Inf, sum, count]
+    
+    def merge(self, other: '_MetricShard') -> None:
+        """Add another shard's values"""
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, buckets in other.histograms.copy().items():
+            merged = self.histograms.get(key)
+            self.histograms[key] = list(buckets) if merged is None else [a + b for a, b in zip(merged, buckets)]
+
+class _ShardOwner:
+    """Kept in a thread's local storage, so it is freed when that thread ends"""
+    
+    __slots__ = ('__weakref__',)
+
+class MetricsRegistry:
+    """Counters and histograms sharded per thread, summed only when scraped
+
+    An update is a thread-local lookup and a dict add with no lock, cheap
+    enough for the race loop. Gauges are computed from attached games.
+    """
+    
+    def __init__(self, metrics: Optional[Dict] = None):
+        self.metrics = dict(GAME_METRICS if metrics is None else metrics)
+        self._local = threading.local()
+        self._shards: List[_MetricShard] = []  # live threads only
+        self._retired = _MetricShard()  # totals of threads that have ended
+        self._gauges: Dict[str, float] = {}
+        self._players: Dict[int, 'Player'] = {}
+        self._lock = threading.RLock()  # shard list and attached games only
+    
+    def _shard(self) -> _MetricShard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _MetricShard()
+            owner = self._local.owner = _ShardOwner()
+            with self._lock:
+                self._shards.append(shard)
+            # A thread per connection would otherwise leave one shard per thread forever
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+    
+    def _retire(self, shard: _MetricShard) -> None:
+        """Fold a finished thread's shard into the retired totals"""
+        with self._lock:
+            self._shards.remove(shard)
+            self._retired.merge(shard)
+    
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items()))) if labels else (name, ())
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record one histogram sample"""
+        key = (name, tuple(sorted(labels.items()))) if labels else (name, ())
+        histograms = self._shard().histograms
+        buckets = histograms.get(key)
+        bounds = self.metrics[name][2]
+        if buckets is None:
+            buckets = histograms[key] = [0] * (len(bounds) + 3)
+        buckets[bisect.bisect_left(bounds, value)] += 1
+        buckets[-2] += value
+        buckets[-1] += 1
+    
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge that is not derived from attached games"""
+        self._gauges[name] = value
+    
+    def attach(self, game: 'HorseRacingGame') -> Callable[[], None]:
+        """Record a game's events, return the function that detaches it"""
+        subscriptions = {
+            'race_started': lambda: self.inc('races_started_total'),
+            'race_finished': lambda suit, cards: (self.inc('races_finished_total'),
+                                                  self.observe('race_length_cards', cards)),
+            'bet_placed': lambda player, suit, amount: (self.inc('bets_placed_total'),
+                                                        self.inc('bet_amount_total', amount)),
+            'bet_rejected': lambda player, suit, amount: self.inc('bets_rejected_total'),
+            'settled': lambda player, winner, winnings, net_profit: self.inc('payouts_total', winnings),
+            'phase_finished': lambda phase, seconds: self.observe('phase_seconds', seconds, phase=phase),
+            'frame_rendered': lambda seconds: self.observe('frame_render_seconds', seconds),
+        }
+        for event, callback in subscriptions.items():
+            game.bus.subscribe(event, callback)
+        with self._lock:
+            self._players[id(game)] = game.player
+        
+        def detach() -> None:
+            for event, callback in subscriptions.items():
+                game.bus.unsubscribe(event, callback)
+            with self._lock:
+                self._players.pop(id(game), None)
+        return detach
+    
+    def collect(self) -> Dict[str, Dict[Tuple, object]]:
+        """Merged values per metric, keyed by label tuple"""
+        retired = _MetricShard()
+        with self._lock:
+            shards = list(self._shards)
+            retired.merge(self._retired)
+            players = list(self._players.values())
+        shards.append(retired)
+        values: Dict[str, Dict[Tuple, object]] = {name: {} for name in self.metrics}
+        for shard in shards:
+            for (name, labels), value in shard.counters.copy().items():
+                series = values.setdefault(name, {})
+                series[labels] = series.get(labels, 0) + value
+            for (name, labels), buckets in shard.histograms.copy().items():
+                series = values.setdefault(name, {})
+                merged = series.get(labels)
+                series[labels] = list(buckets) if merged is None else [a + b for a, b in zip(merged, buckets)]
+        for name, (kind, _, _) in self.metrics.items():
+            if kind == 'counter' and not values[name]:
+                values[name] = {(): 0}
+        values['active_sessions'] = {(): len(players)}
+        values['player_balance_total'] = {(): sum(player.balance for player in players)}
+        for name, value in self._gauges.items():
+            values.setdefault(name, {})[()] = value
+        return values
+    
+    @staticmethod
+    def _labels(labels: Tuple, extra: str = "") -> str:
+        parts = [f'{key}="{value}"' for key, value in labels] + ([extra] if extra else [])
+        return "{" + ",".join(parts) + "}" if parts else ""
+    
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines = []
+        for name, series in self.collect().items():
+            kind, help_text, bounds = self.metrics.get(name, ('untyped', name, None))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series.items()):
+                if kind != 'histogram':
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(bounds) + ['+Inf'], value):
+                    cumulative += count
+                    bucket = self._labels(labels, f'le="{bound}"')
+                    lines.append(f"{name}_bucket{bucket} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{self._labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+    
+    def snapshot(self) -> Dict:
+        """JSON-friendly view: totals, gauges and histogram buckets by upper bound"""
+        result = {'timestamp': time.time()}
+        for name, series in self.collect().items():
+            kind, _, bounds = self.metrics.get(name, ('untyped', name, None))
+            entries = {}
+            for labels, value in series.items():
+                label = ",".join(f"{key}={item}" for key, item in labels)
+                if kind == 'histogram':
+                    value = {'buckets': dict(zip([str(bound) for bound in bounds] + ['+Inf'], value[:-2])),
+                             'sum': value[-2], 'count': value[-1]}
+                entries[label] = value
+            result[name] = entries[''] if list(entries) == [''] else entries
+        return result
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """GET /metrics in Prometheus text format, /metrics.json as JSON"""
+    
+    def do_GET(self) -> None:
+        registry = self.server.registry
+        path = urlsplit(self.path).path
+        if path == '/metrics':
+            body, content_type = registry.prometheus_text().encode(), 'text/plain; version=0.0.4'
+        elif path == '/metrics.json':
+            body, content_type = json.dumps(registry.snapshot()).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format: str, *args) -> None:
+        """Keep the console quiet"""
+
+def create_metrics_server(registry: MetricsRegistry, host: str = '127.0.0.1',
+                          port: int = 9100) -> ThreadingHTTPServer:
+    """HTTP server exposing a registry, the caller runs serve_forever"""
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    return server
+
+class MetricsDumper:
+    """Write registry snapshots to a JSON file every interval seconds"""
+    
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-dump', daemon=True)
+    
+    def start(self) -> 'MetricsDumper':
+        self._thread.start()
+        return self
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.dump()
+    
+    def dump(self) -> None:
+        """Replace the file atomically with the current snapshot"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as output:
+            json.dump(self.registry.snapshot(), output, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def close(self) -> None:
+        """Stop the thread and write a final snapshot"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.dump()
+
+# =============================================================================
+# Spectator Broadcast
+# =============================================================================
+
+class _Spectator:
+    """Send state of one spectator socket"""
+    __slots__ = ['sock', 'pending', 'seq']
+    
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.pending: Optional[memoryview] = None  # unsent tail of a shared frame
+        self.seq = 0  # last frame handed to this spectator
+
+class RaceBroadcaster:
+    """Fan race frames out to spectator sockets, encoding each frame once"""
+    
+    CLEAR = "\x1b[2J\x1b[H"
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.selector.register(self._wake_reader, selectors.EVENT_READ)
+        self.spectators: Dict[socket.socket, _Spectator] = {}
+        self._frame: Tuple[int, bytes] = (0, b'')
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.frames_published = 0
+        self.frames_dropped = 0  # frames a slow spectator skipped
+    
+    def start(self) -> None:
+        """Start serving spectators on a background thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+    
+    def publish(self, text: str) -> None:
+        """Encode a frame once and hand it to every spectator"""
+        data = (self.CLEAR + text + "\n").replace("\n", "\r\n").encode('utf-8')
+        with self._lock:
+            self._frame = (self._frame[0] + 1, data)
+            self.frames_published += 1
+        self._wake()
+    
+    def _wake(self) -> None:
+        """Interrupt the selector from another thread"""
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # a wakeup is already pending
+    
+    def _serve(self) -> None:
+        """Accept spectators and push frames until closed"""
+        while self._running:
+            for key, mask in self.selector.select():
+                sock = key.fileobj
+                if sock is self.listener:
+                    self._accept()
+                elif sock is self._wake_reader:
+                    self._drain_wakeups()
+                    for spectator in list(self.spectators.values()):
+                        self._offer(spectator)
+                elif sock in self.spectators:
+                    spectator = self.spectators[sock]
+                    if mask & selectors.EVENT_READ:
+                        self._read(spectator)
+                    if mask & selectors.EVENT_WRITE and sock in self.spectators:
+                        self._send(spectator)
+    
+    def _accept(self) -> None:
+        """Register a new spectator and show it the current frame"""
+        try:
+            sock, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        spectator = _Spectator(sock)
+        self.spectators[sock] = spectator
+        self.selector.register(sock, selectors.EVENT_READ)
+        self._offer(spectator)
+    
+    def _drain_wakeups(self) -> None:
+        """Empty the wakeup socket"""
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def _offer(self, spectator: _Spectator) -> None:
+        """Give an idle spectator the latest frame, skipping any it missed"""
+        if spectator.pending is not None:
+            return  # still sending an older frame, coalesce once it finishes
+        with self._lock:
+            seq, data = self._frame
+        if seq <= spectator.seq or not data:
+            return
+        if spectator.seq:
+            self.frames_dropped += seq - spectator.seq - 1
+        spectator.seq = seq
+        spectator.pending = memoryview(data)
+        self.selector.modify(spectator.sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+    
+    def _send(self, spectator: _Spectator) -> None:
+        """Write as much of the pending frame as the socket takes"""
+        try:
+            sent = spectator.sock.send(spectator.pending)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(spectator)
+            return
+        spectator.pending = spectator.pending[sent:]
+        if not spectator.pending:
+            spectator.pending = None
+            self.selector.modify(spectator.sock, selectors.EVENT_READ)
+            self._offer(spectator)
+    
+    def _read(self, spectator: _Spectator) -> None:
+        """Discard spectator input, drop the spectator on disconnect"""
+        try:
+            if not spectator.sock.recv(1024):
+                self._drop(spectator)
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop(spectator)
+    
+    def _drop(self, spectator: _Spectator) -> None:
+        """Forget a disconnected spectator"""
+        self.spectators.pop(spectator.sock, None)
+        self.selector.unregister(spectator.sock)
+        spectator.sock.close()
+    
+    def close(self) -> None:
+        """Stop the background thread and close every socket"""
+        self._running = False
+        self._wake()
+        if self._thread:
+            self._thread.join()
+        for spectator in list(self.spectators.values()):
+            self._drop(spectator)
+        self.selector.close()
+        self.listener.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+# =============================================================================
+# Distributed Simulation
+# =============================================================================
+
+def chunk_seed(seed: int, index: int) -> int:
+    """Seed of one simulation chunk, independent of how chunks are scheduled"""
+    return int.from_bytes(hashlib.sha256(f"{seed}:{index}".encode()).digest()[:8], 'big')
+
+def merge_simulations(results: List[Dict]) -> Dict:
+    """Add up simulate_races counters"""
+    merged = {'races': 0, 'wins': None, 'no_winner': 0, 'race_lengths': None}
+    for result in results:
+        merged['races'] += result['races']
+        merged['no_winner'] += result['no_winner']
+        for name in ('wins', 'race_lengths'):
+            merged[name] = (list(result[name]) if merged[name] is None
+                            else [a + b for a, b in zip(merged[name], result[name])])
+    return merged
+
+def _send_message(stream, message: Dict) -> None:
+    """Write one newline-delimited JSON message"""
+    stream.write(json.dumps(message, separators=(',', ':')).encode() + b"\n")
+    stream.flush()
+
+def _read_message(stream) -> Optional[Dict]:
+    """Read one message, None once the peer has gone"""
+    line = stream.readline()
+    return json.loads(line) if line.strip() else None
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """One connected worker: hand out chunks until none are left"""
+    
+    def handle(self) -> None:
+        coordinator = self.server.coordinator
+        with coordinator._changed:
+            coordinator.workers_seen += 1
+        index = None
+        try:
+            while True:
+                message = _read_message(self.rfile)
+                if message is None:
+                    break
+                if message.get('type') == 'result':
+                    if index is None or message.get('index') != index:
+                        # Not the chunk this worker holds, drop the worker and requeue its lease below
+                        _send_message(self.wfile, {'type': 'error',
+                                                   'error': f"result for chunk {message.get('index')}, "
+                                                            f"leased chunk is {index}"})
+                        break
+                    if not coordinator._valid_result(index, message.get('result')):
+                        break  # garbled, the chunk is released below
+                    coordinator._complete(index, message['result'])
+                    index = None
+                if index is not None:
+                    # Asked for more work without returning the leased chunk, hand it back first
+                    coordinator._release(index, self)
+                    index = None
+                index = coordinator._next_chunk(self)
+                if index is None:
+                    _send_message(self.wfile, {'type': 'done'})
+                    break
+                races, seed = coordinator.chunks[index]
+                _send_message(self.wfile, {'type': 'chunk', 'index': index, 'races': races, 'seed': seed,
+                                           'params': coordinator.params})
+        except (OSError, ValueError):
+            pass  # a dead or garbled worker loses its chunk below
+        finally:
+            if index is not None:
+                coordinator._release(index, self)
+
+class SimulationCoordinator:
+    """Split a simulation into seeded chunks and serve them to TCP workers
+
+    Workers pull one chunk at a time. A chunk comes back to the queue when
+    its worker disconnects or its lease runs out. Each chunk's seed depends
+    only on (seed, index), and counters are summed, so the result is the
+    same for any number of workers.
+    """
+    
+    def __init__(self, races: int, seed: int = 0, track_length: int = 10, packs: int = 1,
+                 lanes: int = 4, rules: Optional[RuleSet] = None, chunk_races: int = 10000,
+                 host: str = '127.0.0.1', port: int = 0, lease: float = 300.0):
+        rules = rules or RULE_SETS['standard']
+        self.params = {'track_length': track_length, 'packs': packs, 'lanes': lanes,
+                       'rules': {'name': rules.name, 'steps': rules.steps, 'setback': rules.setback}}
+        self.chunks = [(min(chunk_races, races - start), chunk_seed(seed, index))
+                       for index, start in enumerate(range(0, races, chunk_races))]
+        self.lease = lease  # seconds a worker may hold a chunk before it is handed out again
+        self.retries = 0
+        self.workers_seen = 0
+        self._pending = deque(range(len(self.chunks)))
+        self._leases: Dict[int, Tuple[float, object]] = {}  # chunk -> (deadline, holder)
+        self._results: Dict[int, Dict] = {}
+        self._changed = threading.Condition()
+        self.server = socketserver.ThreadingTCPServer((host, port), _WorkerHandler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.coordinator = self
+        self.address = self.server.server_address
+    
+    def _next_chunk(self, holder) -> Optional[int]:
+        """Lease the next chunk, waiting while others are out, None when all are done"""
+        with self._changed:
+            while len(self._results) < len(self.chunks):
+                now = time.monotonic()
+                for index, (deadline, _) in list(self._leases.items()):
+                    if deadline <= now:
+                        del self._leases[index]
+                        self._pending.append(index)
+                        self.retries += 1
+                while self._pending:
+                    index = self._pending.popleft()
+                    if index not in self._results and index not in self._leases:
+                        self._leases[index] = (now + self.lease, holder)
+                        return index
+                self._changed.wait(min(self.lease, 1.0))
+            return None
+    
+    def _valid_result(self, index: int, result) -> bool:
+        """Whether a worker's counters have the shape merge_simulations needs for this chunk"""
+        if not isinstance(result, dict) or result.get('races') != self.chunks[index][0]:
+            return False
+        lanes = self.params['lanes']
+        return (isinstance(result.get('wins'), list) and len(result['wins']) == lanes
+                and isinstance(result.get('no_winner'), int)
+                and isinstance(result.get('race_lengths'), list))
+    
+    def _complete(self, index: int, result: Dict) -> None:
+        """Keep the first result of a chunk, a late duplicate is identical anyway"""
+        with self._changed:
+            self._results.setdefault(index, result)
+            self._leases.pop(index, None)
+            self._changed.notify_all()
+    
+    def _release(self, index: int, holder) -> None:
+        """Requeue a chunk whose worker went away, unless it was already handed on"""
+        with self._changed:
+            if index not in self._results and self._leases.get(index, (0, None))[1] is holder:
+                del self._leases[index]
+                self._pending.appendleft(index)
+                self.retries += 1
+                self._changed.notify_all()
+    
+    def run(self, timeout: Optional[float] = None) -> Dict:
+        """Serve until every chunk is back, return the merged counters"""
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with self._changed:
+                if not self._changed.wait_for(lambda: len(self._results) == len(self.chunks), timeout):
+                    raise TimeoutError(f"{len(self._results)} of {len(self.chunks)} chunks finished")
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            thread.join()
+        merged = merge_simulations([self._results[index] for index in range(len(self.chunks))])
+        merged.update(chunks=len(self.chunks), retries=self.retries, workers=self.workers_seen)
+        return merged
+
+def run_simulation_worker(host: str = '127.0.0.1', port: int = 8765) -> int:
+    """Pull and run chunks until the coordinator is done, return how many ran"""
+    completed = 0
+    with socket.create_connection((host, port)) as sock, sock.makefile('rwb') as stream:
+        _send_message(stream, {'type': 'ready'})
+        while True:
+            message = _read_message(stream)
+            if message is None or message.get('type') != 'chunk':
+                return completed
+            params = message['params']
+            rules = RuleSet(params['rules']['name'], params['rules']['steps'], params['rules']['setback'])
+            result = simulate_races(message['races'], message['seed'], params['track_length'],
+                                    packs=params['packs'], lanes=params['lanes'], rules=rules)
+            _send_message(stream, {'type': 'result', 'index': message['index'], 'result': result})
+            completed += 1
+
+# =============================================================================
+# Fairness Validation
+# =============================================================================
+
+def regularized_gamma_q(a: float, x: float) -> float:
+    """Upper regularized incomplete gamma Q(a, x), the chi-square survival function core"""
+    if x <= 0:
+        return 1.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Series for the lower tail P(a, x)
+        term = total = 1.0 / a
+        n = a
+        for _ in range(100000):
+            n += 1
+            term *= x / n
+            total += term
+            if term < total * 1e-15:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    # Continued fraction for the upper tail (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c, d = 1 / tiny, 1 / b
+    result = d
+    for i in range(1, 100000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = 1 / (d if abs(d) > tiny else tiny)
+        c = b + an / c
+        c = c if abs(c) > tiny else tiny
+        result *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * result
+
+def chi_square_test(observed: List[int], probabilities: List[float], min_expected: float = 5.0) -> Dict:
+    """Goodness of fit, neighbouring bins merge until each expects min_expected"""
+    total = sum(observed)
+    bins, pending_observed, pending_expected = [], 0, 0.0
+    for count, probability in zip(observed, probabilities):
+        pending_observed += count
+        pending_expected += probability * total
+        if pending_expected >= min_expected:
+            bins.append([pending_observed, pending_expected])
+            pending_observed, pending_expected = 0, 0.0
+    if bins:
+        bins[-1][0] += pending_observed
+        bins[-1][1] += pending_expected
+    statistic = sum((count - expected) ** 2 / expected for count, expected in bins)
+    df = len(bins) - 1
+    p_value = regularized_gamma_q(df / 2, statistic / 2) if df > 0 else 1.0
+    return {'statistic': statistic, 'df': df, 'p_value': p_value}
+
+def contingency_test(table: List[List[int]]) -> Dict:
+    """Chi-square test of independence between rows and columns, empty lines dropped"""
+    table = [row for row in table if any(row)]
+    columns = [column for column in zip(*table) if any(column)] if table else []
+    table = [list(row) for row in zip(*columns)]
+    total = sum(map(sum, table))
+    row_sums = [sum(row) for row in table]
+    column_sums = [sum(column) for column in columns]
+    statistic = sum((table[i][j] - row_sums[i] * column_sums[j] / total) ** 2
+                    / (row_sums[i] * column_sums[j] / total)
+                    for i in range(len(table)) for j in range(len(columns)))
+    df = (len(table) - 1) * (len(columns) - 1)
+    p_value = regularized_gamma_q(df / 2, statistic / 2) if df > 0 else 1.0
+    return {'statistic': statistic, 'df': df, 'p_value': p_value}
+
+def _validation_chunk(decks: int, seed: str, track_length: int) -> Dict:
+    """Shuffle and race decks the way Deck does, counting what the tests need"""
+    rng = random.Random(seed)
+    lanes, ranks = len(Suit), len(Rank)
+    size = lanes * ranks
+    shoe = list(range(size))  # card codes, suit index * 13 + rank index
+    wins = [0] * (lanes + 1)
+    lengths = [0] * (size + 1)
+    positions = [0] * (size * size)  # draw position * 52 + card code
+    transitions = [[0] * (lanes + 1) for _ in range(lanes + 1)]
+    shuffle = rng.shuffle
+    previous = None
+    
+    for _ in range(decks):
+        shuffle(shoe)
+        order = shoe[::-1]  # Deck.draw_card pops from the end
+        for position, code in enumerate(order):
+            positions[position * size + code] += 1
+        progress = [0] * lanes
+        winner, drawn = lanes, size
+        for index, code in enumerate(order):
+            lane = code // ranks
+            progress[lane] += 1
+            if progress[lane] >= track_length:
+                winner, drawn = lane, index + 1
+                break
+        wins[winner] += 1
+        lengths[drawn] += 1
+        if previous is not None:
+            transitions[previous][winner] += 1
+        previous = winner
+    return {'wins': wins, 'lengths': lengths, 'positions': positions, 'transitions': transitions}
+
+def validate_fairness(cards: int, seed: Optional[int] = None, track_length: int = 10,
+                      workers: Optional[int] = None, alpha: float = 0.001,
+                      chunk_decks: int = 20000) -> Dict:
+    """Run chi-square audits of the shuffle and race rules over cards shuffled cards"""
+    size = len(Suit) * len(Rank)
+    decks = max(1, cards // size)
+    base = seed if seed is not None else random.randrange(2 ** 63)
+    chunks = [(min(chunk_decks, decks - start), f"{base}:{index}", track_length)
+              for index, start in enumerate(range(0, decks, chunk_decks))]
+    
+    started = time.perf_counter()
+    if workers == 1 or len(chunks) == 1:
+        results = [_validation_chunk(*chunk) for chunk in chunks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_validation_chunk, *zip(*chunks)))
+    
+    # Merge in chunk order, each chunk is its own seeded stream so the report is reproducible
+    merged = results[0]
+    for result in results[1:]:
+        for name in ('wins', 'lengths', 'positions'):
+            merged[name] = [a + b for a, b in zip(merged[name], result[name])]
+        merged['transitions'] = [[a + b for a, b in zip(row, other)]
+                                 for row, other in zip(merged['transitions'], result['transitions'])]
+    
+    win_probabilities = list(exact_win_probabilities(track_length=track_length))
+    win_probabilities.append(max(0.0, 1.0 - sum(win_probabilities)))
+    position_table = [merged['positions'][position * size:(position + 1) * size]
+                      for position in range(size)]
+    position_test = chi_square_test(merged['positions'], [1 / (size * size)] * (size * size))
+    if position_test['df'] == size * size - 1:
+        position_test['df'] = size * (size - 1)  # every position row sums to the deck count
+        position_test['p_value'] = regularized_gamma_q(position_test['df'] / 2, position_test['statistic'] / 2)
+    
+    tests = {
+        'suit_wins': chi_square_test(merged['wins'], win_probabilities),
+        'card_positions': position_test,
+        'race_length': chi_square_test(merged['lengths'], list(race_length_distribution(track_length))),
+        'serial_winners': contingency_test(merged['transitions'])
+    }
+    for test in tests.values():
+        test['passed'] = test['p_value'] >= alpha
+    
+    return {
+        'cards': decks * size,
+        'decks': decks,
+        'seed': base,
+        'track_length': track_length,
+        'alpha': alpha,
+        'elapsed_seconds': time.perf_counter() - started,
+        'min_position_count': min(map(min, position_table)),
+        'tests': tests,
+        'passed': all(test['passed'] for test in tests.values())
+    }
+
+# =============================================================================
+# Configuration Sweep
+# =============================================================================
+
+SWEEP_FIELDS = ['track_length', 'odds', 'packs', 'rules', 'method', 'races'] + \
+    [f"p_{suit.name.lower()}" for suit in Suit] + ['p_no_winner', 'rtp', 'house_edge', 'variance', 'stddev']
+
+def _sweep_cell(track_length: int, packs: int, rules: RuleSet, races: int, seed: int) -> Dict:
+    """Win probabilities for one shoe: exact without setbacks, simulated otherwise"""
+    if not any(rules.setback):
+        return {'probabilities': list(exact_win_probabilities(None, None, track_length, packs, rules=rules))}
+    return simulate_races(races, seed, track_length, None, packs, len(Suit), rules)
+
+def run_sweep(track_lengths: List[int], odds: List[float], packs: List[int], rules: List,
+              races: int = 200000, seed: int = 0, workers: Optional[int] = None,
+              cache: Optional[ResultCache] = None) -> List[Dict]:
+    """RTP, house edge and variance of a $1 single-horse bet for every grid cell
+
+    Odds only scale payouts, so each (track length, packs, rules) shoe is
+    solved once and shared by every odds value. Shoes run in a process pool
+    and each finished shoe is stored in cache.
+    """
+    rules = [rule if isinstance(rule, RuleSet) else RuleSet.named(rule) for rule in rules]
+    if min(packs) < 1 or max(packs) > Deck.MAX_PACKS:
+        raise ValueError(f"packs must be between 1 and {Deck.MAX_PACKS}")
+    if min(track_lengths) < 1 or min(odds) <= 0:
+        raise ValueError("track lengths and odds must be positive")
+    cache = cache or ResultCache()
+    
+    keys, results, pending = {}, {}, []
+    for shoe in [(length, pack, rule) for length in track_lengths for pack in packs for rule in rules]:
+        length, pack, rule = shoe
+        if any(rule.setback):
+            config = GameConfig()
+            config.TRACK_LENGTH, config.DECK_PACKS, config.RULE_SET = length, pack, rule
+            keys[shoe] = cache.simulation_key(races, seed, config)  # shared with ResultCache.simulate
+        else:
+            keys[shoe] = cache.key('exact', length, pack, len(Suit), rule.key())
+        results[shoe] = cache.get(keys[shoe])
+        if results[shoe] is None:
+            pending.append(shoe)
+    
+    if workers == 1 or len(pending) <= 1:
+        for shoe in pending:
+            results[shoe] = _sweep_cell(*shoe, races, seed)
+            cache.put(keys[shoe], results[shoe])
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_sweep_cell, *shoe, races, seed): shoe for shoe in pending}
+            for future in as_completed(futures):
+                shoe = futures[future]
+                results[shoe] = future.result()
+                cache.put(keys[shoe], results[shoe])  # kept even if a later shoe fails
+    
+    rows = []
+    for (length, pack, rule), result in results.items():
+        if 'probabilities' in result:
+            method, count, probabilities = 'exact', 0, result['probabilities']
+        else:
+            method, count = 'simulated', result['races']
+            probabilities = [wins / count for wins in result['wins']]
+        for value in odds:
+            rtp = sum(probabilities) * value / len(probabilities)
+            # Net of a $1 bet on horse i: odds - 1 with p_i, otherwise -1
+            variance = sum(p * (1 - p) for p in probabilities) * value * value / len(probabilities)
+            row = {'track_length': length, 'odds': value, 'packs': pack, 'rules': rule.name,
+                   'method': method, 'races': count}
+            row.update({f"p_{suit.name.lower()}": p for suit, p in zip(Suit, probabilities)})
+            row.update({'p_no_winner': max(0.0, 1.0 - sum(probabilities)), 'rtp': rtp,
+                        'house_edge': 1 - rtp, 'variance': variance, 'stddev': math.sqrt(variance)})
+            rows.append(row)
+    return rows
+
+def write_sweep(rows: List[Dict], output, fmt: str = 'csv') -> None:
+    """Write sweep rows to a text stream as CSV or JSON"""
+    if fmt == 'json':
+        json.dump(rows, output, indent=2)
+        output.write("\n")
+        return
+    writer = csv.DictWriter(output, fieldnames=SWEEP_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
 # =============================================================================
 # Main Program Entry Point
 # =============================================================================
 
-def main():
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Command line options, no command starts the interactive game"""
+    parser = argparse.ArgumentParser(description="Poker Horse Racing Game")
+    commands = parser.add_subparsers(dest='command')
+    
+    loadtest = commands.add_parser('loadtest', help="run scripted virtual players and report latency")
+    loadtest.add_argument('--players', type=int, default=1000)
+    loadtest.add_argument('--games', type=int, default=3, help="games per virtual player")
+    loadtest.add_argument('--concurrency', type=int, default=32)
+    loadtest.add_argument('--seed', type=int, default=0)
+    loadtest.add_argument('--report', default='loadtest_report.json')
+    loadtest.add_argument('--compare', help="earlier report to compare against")
+    loadtest.add_argument('--shuffle-pool', type=int, default=0,
+                          help="pre-shuffled decks kept ready for all players, 0 disables")
+    
+    serve = commands.add_parser('serve', help="serve simulations and odds over HTTP/JSON")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--workers', type=int, default=None, help="simulation processes")
+    serve.add_argument('--cache-size', type=int, default=256)
+    serve.add_argument('--cache-dir', help="keep seeded results in this directory across restarts")
+    
+    coordinate = commands.add_parser('coordinate', help="serve a seeded simulation to TCP workers")
+    coordinate.add_argument('--races', type=lambda value: int(float(value)), default=10 ** 6)
+    coordinate.add_argument('--seed', type=int, default=0)
+    coordinate.add_argument('--chunk-races', type=int, default=10000)
+    coordinate.add_argument('--track-length', type=int, default=GameConfig.TRACK_LENGTH)
+    coordinate.add_argument('--packs', type=int, default=1)
+    coordinate.add_argument('--lanes', type=int, default=len(Suit))
+    coordinate.add_argument('--rules', default='standard', choices=sorted(RULE_SETS))
+    coordinate.add_argument('--host', default='127.0.0.1')
+    coordinate.add_argument('--port', type=int, default=8765)
+    coordinate.add_argument('--lease', type=float, default=300.0, help="seconds before a silent chunk is retried")
+    coordinate.add_argument('--report', help="write the JSON result here")
+    
+    worker = commands.add_parser('worker', help="run simulation chunks for a coordinator")
+    worker.add_argument('--host', default='127.0.0.1')
+    worker.add_argument('--port', type=int, default=8765)
+    
+    script = commands.add_parser('script', help="play whole sessions from a file of menu answers")
+    script.add_argument('file', help="one answer per line, - reads stdin")
+    script.add_argument('--sessions', type=int, default=1, help="times to replay the script")
+    script.add_argument('--seed', type=int, default=None, help="seed for reproducible shuffles")
+    script.add_argument('--output', help="write the transcript here, - for stdout")
+    script.add_argument('--metrics-port', type=int, default=None,
+                        help="serve Prometheus metrics on this localhost port while running")
+    script.add_argument('--metrics-json', help="dump metrics to this JSON file periodically")
+    script.add_argument('--metrics-interval', type=float, default=10.0, help="seconds between dumps")
+    
+    soak = commands.add_parser('soak', help="play games back to back and check memory growth")
+    soak.add_argument('--games', type=int, default=10000)
+    soak.add_argument('--hours', type=float, default=None, help="stop after this long")
+    soak.add_argument('--seed', type=int, default=0)
+    soak.add_argument('--sample-every', type=int, default=1000, help="games between memory samples")
+    soak.add_argument('--max-growth', type=int, default=256, help="allowed traced bytes per game")
+    soak.add_argument('--report', help="write the JSON report here")
+    
+    number_list = lambda cast: lambda text: [cast(value) for value in text.split(',')]
+    sweep = commands.add_parser('sweep', help="RTP and house edge table over a grid of configs")
+    sweep.add_argument('--track-length', type=number_list(int), default=[GameConfig.TRACK_LENGTH],
+                       help="comma separated, e.g. 8,10,12")
+    sweep.add_argument('--odds', type=number_list(float), default=[GameConfig.WINNING_ODDS])
+    sweep.add_argument('--packs', type=number_list(int), default=[1])
+    sweep.add_argument('--rules', type=lambda text: text.split(','), default=['standard'],
+                       help=f"comma separated from {', '.join(sorted(RULE_SETS))}")
+    sweep.add_argument('--races', type=lambda value: int(float(value)), default=200000,
+                       help="races per simulated cell, rules with setbacks are simulated")
+    sweep.add_argument('--seed', type=int, default=0)
+    sweep.add_argument('--workers', type=int, default=None, help="solver processes")
+    sweep.add_argument('--cache-dir', help="keep finished cells in this directory")
+    sweep.add_argument('--format', choices=('csv', 'json'), default=None,
+                       help="defaults to the output file extension, else csv")
+    sweep.add_argument('--output', help="write the table here instead of stdout")
+    
+    validate = commands.add_parser('validate', help="chi-square audit of the shuffle and race rules")
+    validate.add_argument('--cards', type=lambda value: int(float(value)), default=10 ** 6,
+                          help="shuffled cards to examine, e.g. 1e8")
+    validate.add_argument('--seed', type=int, default=None)
+    validate.add_argument('--track-length', type=int, default=GameConfig.TRACK_LENGTH)
+    validate.add_argument('--workers', type=int, default=None, help="simulation processes")
+    validate.add_argument('--alpha', type=float, default=0.001, help="significance level per test")
+    validate.add_argument('--report', help="write the JSON report here")
+    return parser
+
+def run_api_server(args) -> None:
+    """Run the HTTP API until interrupted"""
+    api = SimulationAPI(args.cache_size, workers=args.workers, cache_dir=args.cache_dir)
+    server = create_api_server(args.host, args.port, api)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.api.close()
+
+def run_load_test(args) -> None:
+    """Run the load test command"""
+    report = LoadTester(args.players, args.games, args.concurrency, args.seed,
+                        shuffle_pool=args.shuffle_pool).run()
+    with open(args.report, 'w', encoding='utf-8') as output:
+        json.dump(report, output, indent=2)
+    print(f"{report['players'] * report['games_per_player']} games in "
+          f"{report['elapsed_seconds']:.2f}s ({report['games_per_second']:.1f} games/s)")
+    for name, latency in report['latency'].items():
+        print(f"{name:>10}: p50 {latency['p50'] * 1000:.3f}ms  p95 {latency['p95'] * 1000:.3f}ms  "
+              f"p99 {latency['p99'] * 1000:.3f}ms")
+    if report['shuffle_pool']:
+        print(f"shuffle pool: {report['shuffle_pool']['hits']} hits, {report['shuffle_pool']['misses']} misses")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline:
+            for line in compare_load_reports(json.load(baseline), report):
+                print(line)
+    print(f"Report written to {args.report}")
+
+def run_coordinator(args) -> None:
+    """Run the coordinate command and print the merged result"""
+    coordinator = SimulationCoordinator(args.races, args.seed, args.track_length, args.packs, args.lanes,
+                                        RuleSet.named(args.rules), args.chunk_races, args.host, args.port,
+                                        args.lease)
+    print(f"Waiting for workers on {coordinator.address[0]}:{coordinator.address[1]} "
+          f"({len(coordinator.chunks)} chunks)")
+    started = time.perf_counter()
+    result = coordinator.run()
+    elapsed = time.perf_counter() - started
+    print(f"{result['races']} races in {elapsed:.2f}s from {result['workers']} workers, "
+          f"{result['retries']} retried chunks")
+    print("wins: " + " ".join(f"{wins / result['races']:.5f}" for wins in result['wins']))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as output:
+            json.dump(result, output)
+        print(f"Report written to {args.report}")
+
+def run_script(args) -> None:
+    """Run the script command, the summary goes to stderr so stdout can carry the transcript"""
+    if args.file == '-':
+        answers = ScriptedIO.read_script(sys.stdin)
+    else:
+        with open(args.file, encoding='utf-8') as script:
+            answers = ScriptedIO.read_script(script)
+    metrics = MetricsRegistry() if args.metrics_port is not None or args.metrics_json else None
+    server = dumper = None
+    if args.metrics_port is not None:
+        server = create_metrics_server(metrics, port=args.metrics_port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Metrics on http://127.0.0.1:{server.server_address[1]}/metrics", file=sys.stderr)
+    if args.metrics_json:
+        dumper = MetricsDumper(metrics, args.metrics_json, args.metrics_interval).start()
+    try:
+        if args.output == '-':
+            report = play_script(answers, args.sessions, args.seed, sys.stdout, metrics)
+        elif args.output:
+            with open(args.output, 'w', encoding='utf-8') as sink:
+                report = play_script(answers, args.sessions, args.seed, sink, metrics)
+        else:
+            report = play_script(answers, args.sessions, args.seed, metrics=metrics)
+    finally:
+        if dumper:
+            dumper.close()
+        if server:
+            server.shutdown()
+            server.server_close()
+    print(f"{report['sessions']} sessions, {report['games']} games in {report['elapsed_seconds']:.2f}s "
+          f"({report['sessions_per_second']:.1f} sessions/s)", file=sys.stderr)
+
+def run_soak_test(args) -> None:
+    """Run the soak command, exiting non-zero on memory growth"""
+    duration = args.hours * 3600 if args.hours else None
+    games = args.games if duration is None else sys.maxsize
+    report = SoakTester(games, duration, args.seed, args.sample_every,
+                        max_growth_per_game=args.max_growth).run()
+    for sample in report['samples']:
+        print(f"{sample['games']:>9} games  {sample['elapsed_seconds']:>9.1f}s  "
+              f"RSS {sample['rss_bytes'] / 1e6:.1f}MB  traced {sample['traced_bytes'] / 1e6:.2f}MB  "
+              f"history {sample['history_games']}  used cards {sample['used_cards']}")
+    print(f"Growth {report['growth_bytes_per_game']:.1f} bytes/game "
+          f"(limit {report['max_growth_per_game']}): {'PASS' if report['passed'] else 'FAIL'}")
+    for site in report['top_allocations']:
+        print(site)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+        print(f"Report written to {args.report}")
+    if not report['passed']:
+        sys.exit(1)
+
+def run_sweep_command(args) -> None:
+    """Run the sweep command, the summary goes to stderr"""
+    cache = ResultCache(args.cache_dir)
+    started = time.perf_counter()
+    rows = run_sweep(args.track_length, args.odds, args.packs, args.rules, args.races, args.seed,
+                     args.workers, cache)
+    elapsed = time.perf_counter() - started
+    fmt = args.format or ('json' if args.output and args.output.endswith('.json') else 'csv')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            write_sweep(rows, output, fmt)
+    else:
+        write_sweep(rows, sys.stdout, fmt)
+    print(f"{len(rows)} cells in {elapsed:.2f}s, {cache.hits} shoes from cache", file=sys.stderr)
+
+def run_validation(args) -> None:
+    """Run the fairness audit, exiting non-zero when a test fails"""
+    report = validate_fairness(args.cards, args.seed, args.track_length, args.workers, args.alpha)
+    print(f"{report['cards']} cards ({report['decks']} decks) in {report['elapsed_seconds']:.2f}s, "
+          f"seed {report['seed']}")
+    for name, test in report['tests'].items():
+        print(f"{name:>15}: chi2 {test['statistic']:.1f}  df {test['df']}  p {test['p_value']:.4f}  "
+              f"{'PASS' if test['passed'] else 'FAIL'}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+        print(f"Report written to {args.report}")
+    if not report['passed']:
+        sys.exit(1)
+
+def main(argv=None):
     """Main program entry point"""
+    args = build_arg_parser().parse_args(argv)
     try:
         # Set encoding
         if sys.platform.startswith('win'):
             os.system('chcp 65001')
         
+        if args.command == 'loadtest':
+            run_load_test(args)
+            return
+        if args.command == 'serve':
+            run_api_server(args)
+            return
+        if args.command == 'coordinate':
+            run_coordinator(args)
+            return
+        if args.command == 'worker':
+            print(f"Ran {run_simulation_worker(args.host, args.port)} chunks")
+            return
+        if args.command == 'script':
+            run_script(args)
+            return
+        if args.command == 'soak':
+            run_soak_test(args)
+            return
+        if args.command == 'validate':
+            run_validation(args)
+            return
+        if args.command == 'sweep':
+            run_sweep_command(args)
+            return
+        
         config = GameConfig()
         game = HorseRacingGame(config)
         game.start_game()
@@ -8,15 +8,32 @@ Complete test suite for English/Chinese bilingual version
 import unittest
 import sys
 import os
+import math
+import time
+import tempfile
+import threading
+import random
 from unittest.mock import patch, MagicMock
 from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import socket
 
 # Import game modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from horse_racing_poker import (
-    Suit, Rank, Card, Deck, Horse, Track, Player, 
+    Suit, Rank, Card, Deck, ShufflePool, QuantileSketch, GameDistributions, LaneLayout, RuleSet, RULE_SETS, Horse, Track, Player, GameHistory, SQLiteHistory,
+    SessionJournal, SessionStore, BetLedger, settle_batch, settle_players, np,
     InputValidator, GameDisplay, HorseRacingGame, GameConfig,
-    Language, lang
+    Language, lang, EventLoop, FrameScheduler, ScriptedIO, RealClock, VirtualClock, ScaledClock,
+    LatencyHistogram, LoadTester, compare_load_reports, SoakTester, play_script, main,
+    simulate_races, exact_win_probabilities, estimate_win_probabilities, SolverBudgetExceeded, race_transcript,
+    evaluate_slip, kelly_fractions, optimize_slip, suggest_bets, OddsTask, ConsoleIO,
+    LRUCache, ResultCache, SimulationAPI, create_api_server, RaceBroadcaster, EventBus,
+    race_length_distribution, regularized_gamma_q, chi_square_test, contingency_test,
+    MetricsRegistry, MetricsDumper, create_metrics_server,
+    validate_fairness, run_sweep, SimulationCoordinator, run_simulation_worker, merge_simulations, chunk_seed
 )
 
 class TestLanguage(unittest.TestCase):
@@ -162,6 +179,80 @@ class TestDeck(unittest.TestCase):
         self.assertEqual(len(deck.cards), 52)
         self.assertEqual(len(deck.used_cards), 0)
     
+    def test_multi_pack_shoe(self):
+        """Test a shoe holds every pack and rejects bad sizes"""
+        deck = Deck(packs=8)
+        self.assertEqual(deck.remaining_count(), 416)
+        self.assertEqual(sum(1 for card in deck.cards if str(card) == "♠A"), 8)
+        with self.assertRaises(ValueError):
+            Deck(packs=9)
+        with self.assertRaises(ValueError):
+            Deck(cut_card=52)
+    
+    def test_cut_card_delays_reshuffle(self):
+        """Test reset keeps dealing until the cut card comes out"""
+        deck = Deck(packs=2, cut_card=52)
+        for _ in range(40):
+            deck.draw_card()
+        deck.reset()
+        self.assertEqual(deck.remaining_count(), 64)
+        for _ in range(20):
+            deck.draw_card()
+        deck.reset()
+        self.assertEqual(deck.remaining_count(), 104)
+        self.assertEqual(deck.used_cards, [])
+    
+    def test_cut_card_shoe_recycles_discards_mid_race(self):
+        """Test a race that outlasts the shoe draws from earlier races' discards"""
+        deck = Deck(cut_card=10)
+        for _ in range(35):
+            deck.draw_card()
+        deck.reset()
+        self.assertEqual(deck.remaining_count(), 17)
+        drawn = [deck.draw_card() for _ in range(20)]
+        self.assertTrue(all(drawn))
+        self.assertEqual(deck.remaining_count() + len(deck.used_cards), 52)
+        self.assertEqual(deck.discarded, 0)
+        fresh = Deck()
+        for _ in range(52):
+            fresh.draw_card()
+        self.assertIsNone(fresh.draw_card())
+    
+    def test_shuffle_pool_seeded_sequence(self):
+        """Test hits and inline misses hand out the same seeded permutations"""
+        prefilled = ShufflePool(capacity=4, seed=9, background=False)
+        prefilled.fill()
+        inline = ShufflePool(capacity=4, seed=9, background=False)
+        first = [prefilled.take() for _ in range(6)]
+        self.assertEqual(first, [inline.take() for _ in range(6)])
+        self.assertEqual((prefilled.hits, prefilled.misses), (4, 2))
+        self.assertEqual((inline.hits, inline.misses), (0, 6))
+        self.assertEqual(sorted(first[0]), list(range(52)))
+    
+    def test_shuffle_pool_background_producer(self):
+        """Test the producer refills the ring without the caller"""
+        pool = ShufflePool(capacity=8, seed=1)
+        try:
+            for _ in range(200):
+                if len(pool._ready) == 8:
+                    break
+                time.sleep(0.01)
+            permutations = [pool.take() for _ in range(8)]
+        finally:
+            pool.close()
+        self.assertEqual(pool.hits, 8)
+        self.assertEqual(len(set(map(bytes, permutations))), 8)
+    
+    def test_deck_uses_shuffle_pool(self):
+        """Test a pooled deck still holds every card once after reset"""
+        deck = Deck(pool=ShufflePool(capacity=2, seed=3, background=False))
+        for _ in range(20):
+            deck.draw_card()
+        deck.reset()
+        self.assertEqual(deck.pool.misses, 1)
+        self.assertEqual(len({str(card) for card in deck.cards}), 52)
+        self.assertEqual(deck.used_cards, [])
+    
     def test_remaining_count(self):
         """Test remaining card count"""
         deck = Deck()
@@ -349,6 +440,312 @@ class TestTrack(unittest.TestCase):
         self.assertIn("Hearts Horse", display)
         self.assertIn("Diamonds Horse", display)
         self.assertIn("Clubs Horse", display)
+    
+    def test_lane_layouts(self):
+        """Test every layout covers the pack with near equal lanes"""
+        self.assertEqual(LaneLayout.create(4).counts(), (13, 13, 13, 13))
+        self.assertEqual(LaneLayout.create(2).counts(2), (52, 52))
+        self.assertEqual(LaneLayout.create(8).counts(), (6, 7) * 4)
+        self.assertEqual(sorted(set(LaneLayout.create(5).counts())), [10, 11])
+        with self.assertRaises(ValueError):
+            LaneLayout.create(1)
+    
+    def test_custom_lanes_move_by_card(self):
+        """Test cards move the horse of their lane"""
+        track = Track(length=3, layout=LaneLayout.create(8))
+        self.assertEqual(len(track.horses), 8)
+        horse = track.move_card(Card(Suit.HEARTS, Rank.KING))
+        self.assertEqual(horse.symbol, "♥7-K")
+        self.assertEqual(track.get_positions()[3], 1)
+        self.assertEqual(Track(3).move_card(Card(Suit.CLUBS, Rank.ACE)).suit, Suit.CLUBS)
+    
+    def test_compact_display(self):
+        """Test long tracks and many lanes stay readable"""
+        track = Track(length=200, layout=LaneLayout.create(13))
+        track.horses[0].move_forward(100)
+        lines = track.display_track().splitlines()
+        self.assertEqual(len(lines), 14)
+        self.assertTrue(all(len(line) < 50 for line in lines))
+        self.assertTrue(lines[1].startswith("L1"))
+        self.assertIn("100/200", lines[1])
+
+class TestEventBus(unittest.TestCase):
+    """Test event subscription and delivery"""
+    
+    def test_subscribe_emit_unsubscribe(self):
+        """Test callbacks receive payloads until unsubscribed"""
+        bus = EventBus()
+        seen = []
+        callback = bus.subscribe('horse_moved', lambda **payload: seen.append(payload))
+        bus.emit('horse_moved', suit=Suit.CLUBS, position=3)
+        bus.unsubscribe('horse_moved', callback)
+        bus.emit('horse_moved', suit=Suit.CLUBS, position=4)
+        self.assertEqual(seen, [{'suit': Suit.CLUBS, 'position': 3}])
+        self.assertEqual(bus.listeners('horse_moved'), ())
+        with self.assertRaises(ValueError):
+            bus.subscribe('horse_teleported', callback)
+    
+    def test_simulator_emits_events(self):
+        """Test the headless engine reports every card and winner"""
+        bus = EventBus()
+        cards, winners = [], []
+        bus.subscribe('card_drawn', lambda suit, card: cards.append(suit))
+        bus.subscribe('winner_declared', lambda suit: winners.append(suit))
+        result = simulate_races(20, seed=5, bus=bus)
+        self.assertEqual(len(cards), sum(length * count for length, count
+                                         in enumerate(result['race_lengths'])))
+        self.assertEqual([winners.count(suit) for suit in Suit], result['wins'])
+        self.assertEqual(result, simulate_races(20, seed=5))
+    
+    def test_simulator_events_match_game(self):
+        """Test the simulator emits real cards before moving, like the game"""
+        bus = EventBus()
+        events = []
+        bus.subscribe('card_drawn', lambda suit, card: events.append(('card', card)))
+        bus.subscribe('horse_moved', lambda suit, position: events.append(('moved', suit)))
+        result = simulate_races(1, seed=3, bus=bus, rules=RULE_SETS['setback'])
+        cards = [payload for kind, payload in events if kind == 'card']
+        self.assertTrue(all(isinstance(card, Card) for card in cards))
+        self.assertEqual(len({str(card) for card in cards}), len(cards))  # one pack, no repeats
+        for index, (kind, card) in enumerate(events):
+            if kind == 'card':
+                moved = 4 if card.rank is Rank.SEVEN else 1
+                self.assertEqual(events[index + 1], ('moved', card.suit))
+                self.assertEqual([kind for kind, _ in events[index + 1:index + 1 + moved]], ['moved'] * moved)
+        self.assertEqual(result, simulate_races(1, seed=3, rules=RULE_SETS['setback']))
+    
+    def test_player_emits_bets_and_settlement(self):
+        """Test bet_placed and settled carry the player's amounts"""
+        player = Player(1000)
+        player.bus = EventBus()
+        events = []
+        player.bus.subscribe('bet_placed', lambda **payload: events.append(('bet', payload['amount'])))
+        player.bus.subscribe('settled', lambda **payload: events.append(('settled', payload['net_profit'])))
+        player.bus.subscribe('bet_rejected', lambda **payload: events.append(('rejected', payload['amount'])))
+        player.place_bet(Suit.HEARTS, 100)
+        player.place_bets({Suit.SPADES: 50})
+        self.assertFalse(player.place_bet(Suit.CLUBS, 5000)[0])
+        self.assertFalse(player.place_bets({Suit.CLUBS: 600, Suit.HEARTS: 600})[0])
+        self.assertFalse(player.place_bets({Suit.CLUBS: 0})[0])
+        player.calculate_winnings(Suit.HEARTS, 3.0)
+        self.assertEqual(events, [('bet', 100), ('bet', 50), ('rejected', 5000), ('rejected', 600),
+                                  ('rejected', 600), ('rejected', 0), ('settled', 150)])
+
+class TestSimulationEngine(unittest.TestCase):
+    """Test the headless simulator and exact odds"""
+    
+    def test_simulate_races_is_seeded(self):
+        """Test seeded simulations repeat and count every race"""
+        first = simulate_races(200, seed=7)
+        self.assertEqual(first, simulate_races(200, seed=7))
+        self.assertEqual(sum(first['wins']), 200)
+        self.assertEqual(sum(first['race_lengths']), 200)
+        self.assertEqual(first['no_winner'], 0)
+    
+    def test_exact_odds_symmetric_start(self):
+        """Test every horse has an equal chance from the start"""
+        for probability in exact_win_probabilities():
+            self.assertAlmostEqual(probability, 0.25)
+    
+    def test_exact_odds_leader_favoured(self):
+        """Test a leading horse is favoured and probabilities sum to one"""
+        probabilities = exact_win_probabilities((8, 2, 2, 2), (5, 11, 11, 11))
+        self.assertAlmostEqual(sum(probabilities), 1.0)
+        self.assertGreater(probabilities[0], 0.8)
+        with self.assertRaises(ValueError):
+            exact_win_probabilities((0, 0), (13, 13, 13, 13))
+    
+    def test_race_length_distribution(self):
+        """Test the exact race length distribution against known cases"""
+        self.assertEqual(race_length_distribution(1)[1], 1.0)
+        self.assertEqual(race_length_distribution(14)[-1], 1.0)  # nobody can finish
+        distribution = race_length_distribution(10)
+        self.assertAlmostEqual(sum(distribution), 1.0)
+        self.assertEqual(distribution[:10], (0.0,) * 10)
+        result = simulate_races(5000, seed=2)
+        mean = sum(length * count for length, count in enumerate(result['race_lengths'])) / 5000
+        self.assertAlmostEqual(mean, sum(n * p for n, p in enumerate(distribution)), delta=0.3)
+    
+    def test_race_transcript(self):
+        """Test a transcript ends with the winner reaching the finish"""
+        transcript = race_transcript(seed=3, track_length=5)
+        self.assertEqual(transcript, race_transcript(seed=3, track_length=5))
+        self.assertEqual(max(transcript['cards'][-1]['positions']), 5)
+        self.assertEqual(transcript['cards'][-1]['suit'], transcript['winner'])
+        wide = race_transcript(seed=3, track_length=20, packs=8, lanes=8)
+        self.assertEqual(len(wide['cards'][-1]['positions']), 8)
+        self.assertEqual(max(wide['cards'][-1]['positions']), 20)
+    
+    def test_multi_pack_and_lanes(self):
+        """Test shoes and lane counts in both engines"""
+        result = simulate_races(500, seed=1, track_length=20, packs=8, lanes=8)
+        self.assertEqual(len(result['wins']), 8)
+        self.assertEqual(sum(result['wins']), 500)
+        self.assertEqual(len(result['race_lengths']), 8 * 52 + 1)
+        self.assertEqual(simulate_races(10, seed=1, track_length=14)['no_winner'], 10)
+        for probability in exact_win_probabilities(packs=8):
+            self.assertAlmostEqual(probability, 0.25)
+        halves = exact_win_probabilities(track_length=3, lanes=8)
+        self.assertAlmostEqual(sum(halves), 1.0)
+        self.assertGreater(halves[1], halves[0])  # 7-K lanes hold one more card
+
+class TestRuleSets(unittest.TestCase):
+    """Test declarative movement rules in both engines"""
+    
+    def test_rule_tables(self):
+        """Test presets compile into per-slot columns and bad tables are rejected"""
+        counts, lane_of, step_of, back_of = RULE_SETS['faces'].compile(LaneLayout.create(4))
+        self.assertEqual(counts, (10, 3) * 4)
+        self.assertEqual(step_of, (1, 2) * 4)
+        self.assertEqual(RULE_SETS['aces'].move(Card(Suit.CLUBS, Rank.ACE)), (3, 0))
+        self.assertEqual(RULE_SETS['setback'].move(Card(Suit.CLUBS, Rank.SEVEN)), (1, 1))
+        self.assertEqual(RuleSet('copy', RULE_SETS['faces'].steps), RULE_SETS['faces'])
+        with self.assertRaises(ValueError):
+            RuleSet('short', (1, 2))
+        with self.assertRaises(ValueError):
+            RuleSet.named('teleport')
+    
+    def test_exact_paths_agree(self):
+        """Test the arrival-time solver matches the recursive one"""
+        from horse_racing_poker import _exact_win_probabilities, _exact_by_arrival_times
+        counts, lane_of, step_of, back_of = RULE_SETS['faces_aces'].compile(LaneLayout.create(4))
+        positions, remaining = (2, 0, 1, 3), (8, 2, 1, 9, 3, 1, 7, 3, 1, 9, 2, 0)
+        recursive = _exact_win_probabilities(positions, remaining, 6, lane_of, step_of, back_of)
+        quadrature = _exact_by_arrival_times(positions, remaining, 6, lane_of, step_of)
+        for a, b in zip(recursive, quadrature):
+            self.assertAlmostEqual(a, b, places=12)
+    
+    def test_setback_exact_matches_simulation(self):
+        """Test setbacks on uneven lanes in both engines"""
+        exact = exact_win_probabilities(track_length=3, lanes=3, rules=RULE_SETS['setback'])
+        self.assertAlmostEqual(sum(exact), 1.0)
+        result = simulate_races(20000, seed=1, track_length=3, lanes=3, rules=RULE_SETS['setback'])
+        for probability, wins in zip(exact, result['wins']):
+            self.assertAlmostEqual(probability, wins / 20000, delta=0.015)
+    
+    def test_exact_solver_budget(self):
+        """Test oversized setback states are refused quickly and estimated instead"""
+        started = time.perf_counter()
+        with self.assertRaises(SolverBudgetExceeded):
+            exact_win_probabilities(track_length=10, rules=RULE_SETS['setback'], max_states=2000)
+        self.assertLess(time.perf_counter() - started, 1)
+        exact = exact_win_probabilities(track_length=3, lanes=3, rules=RULE_SETS['setback'])
+        estimate = estimate_win_probabilities(track_length=3, lanes=3, rules=RULE_SETS['setback'], races=5000)
+        for a, b in zip(exact, estimate):
+            self.assertAlmostEqual(a, b, delta=0.03)
+    
+    def test_big_steps_shorten_races(self):
+        """Test faces and aces finish in fewer cards"""
+        def mean_length(rules):
+            lengths = simulate_races(2000, seed=4, rules=rules)['race_lengths']
+            return sum(n * count for n, count in enumerate(lengths)) / 2000
+        self.assertLess(mean_length(RULE_SETS['faces_aces']), mean_length(RULE_SETS['standard']) - 3)
+        for probability in exact_win_probabilities(packs=4, track_length=20, rules=RULE_SETS['faces_aces']):
+            self.assertAlmostEqual(probability, 0.25)
+
+class TestBetOptimizer(unittest.TestCase):
+    """Test expected value and Kelly allocation"""
+    
+    def test_evaluate_slip(self):
+        """Test EV and variance of a single bet at even chances"""
+        evaluation = evaluate_slip({Suit.SPADES: 100}, (0.25, 0.25, 0.25, 0.25), 3.0)
+        self.assertEqual(evaluation['total_bet'], 100)
+        self.assertAlmostEqual(evaluation['expected_value'], -25.0)
+        self.assertAlmostEqual(evaluation['variance'], 0.25 * 200 ** 2 + 0.75 * 100 ** 2 - 25.0 ** 2)
+    
+    def test_no_edge_means_no_bet(self):
+        """Test a fair start at 3x odds suggests nothing"""
+        self.assertEqual(optimize_slip(1000, odds=3.0), {})
+        self.assertEqual(kelly_fractions((0.25, 0.25, 0.25, 0.25), 3.0), [0.0] * 4)
+    
+    def test_kelly_single_favourite(self):
+        """Test the classic single-bet Kelly fraction"""
+        fractions = kelly_fractions((0.5, 0.2, 0.2, 0.1), 3.0)
+        self.assertAlmostEqual(fractions[0], 0.25)
+        self.assertEqual(fractions[1:], [0.0, 0.0, 0.0])
+        self.assertEqual(optimize_slip(1000, (0.5, 0.2, 0.2, 0.1), 3.0, kelly_fraction=0.5),
+                         {Suit.SPADES: 125})
+    
+    def test_suggest_bets_from_race_state(self):
+        """Test suggestions back a clear leader"""
+        suggestion = suggest_bets(1000, positions=(8, 2, 2, 2), remaining=(5, 11, 11, 11))
+        self.assertIn(Suit.SPADES, suggestion['slip'])
+        self.assertGreater(suggestion['horses'][Suit.SPADES]['ev_per_dollar'], 0)
+        self.assertGreater(suggestion['evaluation']['expected_value'], 0)
+
+class TestFairnessValidation(unittest.TestCase):
+    """Test the chi-square audit helpers"""
+    
+    def test_regularized_gamma_q(self):
+        """Test chi-square tail values against tables"""
+        self.assertAlmostEqual(regularized_gamma_q(1.5, 7.815 / 2), 0.05, places=4)
+        self.assertAlmostEqual(regularized_gamma_q(1.0, 2.0), math.exp(-2.0))
+        self.assertEqual(regularized_gamma_q(3.0, 0.0), 1.0)
+    
+    def test_chi_square_detects_bias(self):
+        """Test fair counts pass and skewed counts fail"""
+        self.assertGreater(chi_square_test([250, 245, 255, 250], [0.25] * 4)['p_value'], 0.5)
+        self.assertLess(chi_square_test([400, 200, 200, 200], [0.25] * 4)['p_value'], 1e-6)
+        merged = chi_square_test([1, 0, 0, 99], [0.01, 0.01, 0.01, 0.97])
+        self.assertEqual(merged['df'], 0)
+    
+    def test_contingency_detects_dependence(self):
+        """Test a sticky transition table is flagged"""
+        self.assertGreater(contingency_test([[50, 50], [50, 50]])['p_value'], 0.99)
+        self.assertLess(contingency_test([[90, 10], [10, 90]])['p_value'], 1e-6)
+    
+    def test_validate_fairness_seeded(self):
+        """Test a seeded audit passes and repeats"""
+        report = validate_fairness(52 * 2000, seed=4, workers=1, chunk_decks=700)
+        self.assertTrue(report['passed'], report['tests'])
+        self.assertEqual(report['decks'], 2000)
+        self.assertEqual(report['tests']['card_positions']['df'], 52 * 51)
+        again = validate_fairness(52 * 2000, seed=4, workers=1, chunk_decks=700)
+        self.assertEqual(report['tests'], again['tests'])
+
+class TestSweep(unittest.TestCase):
+    """Test the configuration sweep"""
+    
+    def test_exact_and_simulated_cells(self):
+        """Test plain rules are solved exactly and setback rules are simulated"""
+        rows = run_sweep([6], [3.0, 4.0], [1], ['standard', 'setback'], races=400, seed=2, workers=1)
+        self.assertEqual(len(rows), 4)
+        exact = rows[0]
+        self.assertEqual((exact['method'], exact['odds'], exact['races']), ('exact', 3.0, 0))
+        self.assertAlmostEqual(exact['rtp'], 0.75)
+        self.assertAlmostEqual(exact['house_edge'], 0.25)
+        self.assertAlmostEqual(exact['variance'], 0.25 * 0.75 * 9)
+        self.assertAlmostEqual(rows[1]['rtp'], 1.0)
+        simulated = rows[2]
+        self.assertEqual((simulated['method'], simulated['races']), ('simulated', 400))
+        self.assertAlmostEqual(simulated['p_spades'], simulate_races(400, 2, 6, rules=RULE_SETS['setback'])['wins'][0] / 400)
+    
+    def test_cached_cells_are_reused(self):
+        """Test a repeated sweep reads every shoe from the cache"""
+        cache = ResultCache()
+        first = run_sweep([5], [3.0], [1], ['setback'], races=200, workers=1, cache=cache)
+        with patch('horse_racing_poker.simulate_races') as simulate:
+            self.assertEqual(run_sweep([5], [3.5, 3.0], [1], ['setback'], races=200, workers=1, cache=cache)[1], first[0])
+            simulate.assert_not_called()
+        self.assertEqual(cache.hits, 1)
+        with self.assertRaises(ValueError):
+            run_sweep([5], [3.0], [9], ['standard'])
+    
+    def test_sweep_command_output(self):
+        """Test the sweep command writes CSV or JSON by file extension"""
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path, json_path = os.path.join(directory, 'edge.csv'), os.path.join(directory, 'edge.json')
+            with patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+                main(['sweep', '--track-length', '4,5', '--odds', '3', '--workers', '1', '--output', csv_path])
+                main(['sweep', '--track-length', '4', '--rules', 'faces', '--workers', '1', '--output', json_path])
+            self.assertIn("2 cells", mock_stderr.getvalue())
+            with open(csv_path, encoding='utf-8') as table:
+                lines = table.read().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[0].startswith("track_length,odds,packs,rules,method"))
+            with open(json_path, encoding='utf-8') as table:
+                rows = json.load(table)
+            self.assertEqual((rows[0]['rules'], rows[0]['method']), ('faces', 'exact'))
 
 class TestPlayer(unittest.TestCase):
     """Test player functionality"""
@@ -511,6 +908,408 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(stats["total_profit"], 150)  # 200-50
         self.assertEqual(stats["win_rate"], 50.0)  # 1 win, 1 loss
 
+class TestDistributions(unittest.TestCase):
+    """Test streaming quantile sketches and per-game distributions"""
+    
+    def test_quantiles_within_relative_accuracy(self):
+        """Test quantiles of merged halves match the sorted data within 1%"""
+        rng = random.Random(4)
+        values = [rng.randint(-1000, 3000) for _ in range(20000)]
+        left, right = QuantileSketch(), QuantileSketch()
+        for value in values[:10000]:
+            left.add(value)
+        for value in values[10000:]:
+            right.add(value)
+        left.merge(right)
+        ordered = sorted(values)
+        for q in (0.0, 0.1, 0.5, 0.9, 1.0):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertAlmostEqual(left.quantile(q), exact, delta=abs(exact) * 0.02 + 1)
+        self.assertEqual(left.count, 20000)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        with self.assertRaises(ValueError):
+            left.merge(QuantileSketch(relative_accuracy=0.05))
+    
+    def test_memory_is_capped(self):
+        """Test bucket count stays at max_buckets and the upper tail stays accurate"""
+        sketch = QuantileSketch(max_buckets=20)
+        for value in range(1, 100001):
+            sketch.add(value)
+        self.assertLessEqual(len(sketch.positive), 20)
+        self.assertAlmostEqual(sketch.quantile(0.99), 99000, delta=2000)
+    
+    def test_streaks_and_sessions(self):
+        """Test losing streaks reset on a win, not on breaking even, and sessions close into their own sketch"""
+        distributions = GameDistributions()
+        for profit in (-100, -100, 200, -50, -50, -50, 0, -10):
+            distributions.record_game(profit)
+        distributions.end_session()
+        other = GameDistributions()
+        other.record_game(300)
+        other.record_race(25)
+        other.end_session()
+        distributions.merge(other)
+        summary = distributions.summary()
+        self.assertEqual(summary['longest_losing_streak'], 5)
+        self.assertEqual(summary['games'], 9)
+        self.assertEqual(summary['session_profit']['sessions'], 2)
+        self.assertAlmostEqual(summary['session_profit']['p10'], -160, delta=2)
+        self.assertEqual(summary['race_length']['median'], 25)
+    
+    def test_player_records_without_touching_statistics(self):
+        """Test settlement feeds the sketches and get_statistics keeps its shape"""
+        player = Player(1000)
+        self.assertEqual(player.get_statistics(),
+                         {"games_played": 0, "total_profit": 0, "win_rate": 0, "current_balance": 1000})
+        self.assertIsNone(player.get_distributions()['profit']['median'])
+        player.place_bet(Suit.HEARTS, 100)
+        player.calculate_winnings(Suit.SPADES, 3.0)
+        self.assertEqual(player.get_distributions()['profit']['median'], -100)
+        self.assertEqual(player.get_distributions()['longest_losing_streak'], 1)
+
+class TestGameHistory(unittest.TestCase):
+    """Test columnar game history"""
+    
+    def setUp(self):
+        """Record two games"""
+        self.history = GameHistory()
+        self.history.record({Suit.HEARTS: 100, Suit.SPADES: 50}, Suit.HEARTS, 300, 150, 1150)
+        self.history.record({Suit.CLUBS: 40}, Suit.DIAMONDS, 0, -40, 1110)
+    
+    def test_iteration_matches_dict_entries(self):
+        """Test iteration yields the same dicts the list history held"""
+        games = list(self.history)
+        self.assertEqual(len(games), 2)
+        self.assertEqual(games[0], {
+            'bets': {Suit.SPADES: 50, Suit.HEARTS: 100},
+            'winner': Suit.HEARTS,
+            'winnings': 300,
+            'net_profit': 150,
+            'balance_after': 1150
+        })
+        self.assertEqual(self.history[-1]['winner'], Suit.DIAMONDS)
+        with self.assertRaises(IndexError):
+            self.history[2]
+    
+    def test_aggregate_queries(self):
+        """Test aggregate queries over the columns"""
+        self.assertEqual(self.history.total_profit(), 110)
+        self.assertEqual(self.history.winning_games(), 1)
+        self.assertEqual(self.history.wins_by_horse()[Suit.DIAMONDS], 1)
+        self.assertEqual(self.history.bets_by_horse()[Suit.CLUBS], 40)
+        profit = self.history.profit_by_horse()
+        self.assertEqual(profit[Suit.HEARTS], 200)
+        self.assertEqual(profit[Suit.CLUBS], -40)
+    
+    def test_memory_per_game(self):
+        """Test each game costs a few dozen bytes"""
+        history = GameHistory()
+        for _ in range(10000):
+            history.record({Suit.HEARTS: 10}, Suit.SPADES, 0, -10, 990)
+        self.assertLess(history.memory_bytes() / len(history), 80)
+
+class TestSQLiteHistory(unittest.TestCase):
+    """Test SQLite-backed game history"""
+    
+    def setUp(self):
+        """Open a history database in a temporary directory"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'history.db')
+        self.history = SQLiteHistory(self.path, batch_size=2)
+    
+    def tearDown(self):
+        """Close the database"""
+        self.history.close()
+        self.tmpdir.cleanup()
+    
+    def test_player_statistics_from_summary(self):
+        """Test a player backed by SQLite reports the same statistics"""
+        player = Player(1000, self.history)
+        player.place_bet(Suit.HEARTS, 100)
+        player.calculate_winnings(Suit.HEARTS, 3.0)
+        player.clear_bets()
+        player.place_bet(Suit.SPADES, 50)
+        player.calculate_winnings(Suit.CLUBS, 3.0)
+        
+        stats = player.get_statistics()
+        self.assertEqual(stats["games_played"], 2)
+        self.assertEqual(stats["total_profit"], 150)
+        self.assertEqual(stats["win_rate"], 50.0)
+        self.assertEqual(list(player.game_history)[1]['winner'], Suit.CLUBS)
+    
+    def test_summaries_survive_reopen(self):
+        """Test summaries and rows are persisted and reloaded"""
+        self.history.record({Suit.HEARTS: 100}, Suit.HEARTS, 300, 200, 1200)
+        self.history.record({Suit.HEARTS: 100}, Suit.SPADES, 0, -100, 1100)
+        self.history.record({Suit.CLUBS: 10}, Suit.DIAMONDS, 0, -10, 1090)
+        self.history.close()
+        
+        self.history = SQLiteHistory(self.path)
+        self.assertEqual(len(self.history), 3)
+        self.assertEqual(self.history.total_profit(), 90)
+        self.assertEqual(self.history.longest_losing_streak(), 2)
+        self.assertEqual(self.history.profit_by_horse()[Suit.HEARTS], 100)
+        self.assertEqual(self.history[0]['bets'], {Suit.HEARTS: 100})
+    
+    def test_losing_streak_matches_distributions(self):
+        """Test both streak counters treat a break-even game as a loss"""
+        distributions = GameDistributions()
+        for net_profit in (200, -100, 0, -10, 50):
+            self.history.record({Suit.HEARTS: 100}, Suit.SPADES, 0, net_profit, 1000)
+            distributions.record_game(net_profit)
+        self.assertEqual(self.history.longest_losing_streak(), 3)
+        self.assertEqual(distributions.summary()['longest_losing_streak'], 3)
+        self.assertEqual(self.history.winning_games(), 2)
+    
+    def test_partial_batch_flushed_on_timer(self):
+        """Test a partial batch reaches the database without another record or close"""
+        history = SQLiteHistory(os.path.join(self.tmpdir.name, 'timed.db'), flush_interval=0.02)
+        history.record({Suit.HEARTS: 100}, Suit.HEARTS, 300, 200, 1200)
+        deadline = time.monotonic() + 5
+        while history._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        reader = SQLiteHistory(os.path.join(self.tmpdir.name, 'timed.db'))
+        self.assertEqual(len(reader), 1)
+        reader.close()
+        history.close()
+    
+    def test_results_between(self):
+        """Test querying games by timestamp range"""
+        self.history.record({Suit.HEARTS: 100}, Suit.HEARTS, 300, 200, 1200)
+        now = time.time()
+        self.assertEqual(len(self.history.results_between(now - 60, now + 60)), 1)
+        self.assertEqual(self.history.results_between(0, now - 60), [])
+    
+    def test_wal_mode(self):
+        """Test the database uses write-ahead logging"""
+        mode = self.history.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+class TestSessionStore(unittest.TestCase):
+    """Test crash-safe session snapshots and the bet journal"""
+    
+    def setUp(self):
+        """Create a session directory"""
+        lang.set_language('en')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = self.tmpdir.name
+    
+    def tearDown(self):
+        """Remove the session directory"""
+        self.tmpdir.cleanup()
+    
+    def _open(self):
+        """Open a store and restore fresh game objects from it"""
+        store = SessionStore(self.directory)
+        player, track, deck = Player(1000), Track(10), Deck()
+        store.restore(player, track, deck)
+        store.attach(player, track, deck)
+        return store, player, track, deck
+    
+    def test_restore_after_crash_mid_race(self):
+        """Test bets and deck order survive a crash without close()"""
+        store, player, track, deck = self._open()
+        deck.reset()
+        store.snapshot()
+        player.place_bet(Suit.HEARTS, 100)
+        player.place_bet(Suit.SPADES, 50)
+        order = [str(card) for card in deck.cards]
+        
+        _, restored, _, restored_deck = self._open()
+        self.assertEqual(restored.balance, 850)
+        self.assertEqual(restored.bets, {Suit.HEARTS: 100, Suit.SPADES: 50})
+        self.assertEqual([str(card) for card in restored_deck.cards], order)
+        self.assertTrue(SessionStore(self.directory).restore(Player(), Track(), Deck()))
+    
+    def test_settlement_closes_race(self):
+        """Test a settled race is not resumed after restart"""
+        store, player, _, _ = self._open()
+        player.place_bet(Suit.HEARTS, 100)
+        player.calculate_winnings(Suit.HEARTS, 3.0)
+        store.close()
+        
+        store, restored, _, _ = self._open()
+        self.assertFalse(store.race_open)
+        self.assertEqual(restored.balance, 1200)
+    
+    def test_snapshot_on_logged_operation_includes_it(self):
+        """Test a snapshot triggered by an operation's own record restores that operation"""
+        store = SessionStore(self.directory, snapshot_every=1)
+        player, track, deck = Player(1000), Track(10), Deck()
+        store.attach(player, track, deck)
+        player.place_bet(Suit.HEARTS, 100)
+        restored = Player(1000)
+        reopened = SessionStore(self.directory, snapshot_every=1)
+        reopened.restore(restored, Track(10), Deck())
+        self.assertEqual((restored.balance, restored.bets, reopened.race_open), (900, {Suit.HEARTS: 100}, True))
+        
+        player.calculate_winnings(Suit.HEARTS, 3.0)
+        restored = Player(1000)
+        reopened = SessionStore(self.directory, snapshot_every=1)
+        reopened.restore(restored, Track(10), Deck())
+        self.assertEqual((restored.balance, reopened.race_open), (1200, False))
+        store.close()
+    
+    def test_snapshot_truncates_journal(self):
+        """Test snapshots are atomic and cover the journal"""
+        store, player, _, _ = self._open()
+        player.place_bet(Suit.CLUBS, 10)
+        store.snapshot()
+        self.assertEqual(list(SessionJournal.read(store.journal.path)), [])
+        self.assertFalse(os.path.exists(store.snapshot_path + '.tmp'))
+        self.assertTrue(store.race_open)
+    
+    def test_restart_does_not_repeat_history(self):
+        """Test settled games are recorded once across a quit or a crash"""
+        config = GameConfig()
+        config.SESSION_DIR = self.directory
+        config.HISTORY_DB = os.path.join(self.directory, 'history.db')
+        game = HorseRacingGame(config, clock=VirtualClock())
+        game.player.place_bet(Suit.HEARTS, 100)
+        game.player.calculate_winnings(Suit.HEARTS, 3.0)
+        with patch('sys.stdout', new_callable=StringIO):
+            game.quit_game()
+        game.player.game_history.close()
+        
+        restarted = HorseRacingGame(config, clock=VirtualClock())
+        self.assertEqual(len(restarted.player.game_history), 1)
+        self.assertEqual(restarted.player.balance, 1200)
+        restarted.player.game_history.close()
+        restarted.session.close()
+        
+        store, player, _, _ = self._open()  # crash after settling, the journal is replayed
+        player.place_bet(Suit.CLUBS, 50)
+        player.calculate_winnings(Suit.CLUBS, 3.0)
+        _, restored, _, _ = self._open()
+        self.assertEqual(restored.balance, 1300)
+        self.assertEqual(len(restored.game_history), 0)
+    
+    def test_lone_record_synced_on_timer(self):
+        """Test the last record of a group is fsynced without waiting for another"""
+        journal = SessionJournal(os.path.join(self.directory, 'j'), group_interval=0.02)
+        with patch('horse_racing_poker.os.fsync') as fsync:
+            journal.append('bet', suit='HEARTS', amount=5)
+            deadline = time.monotonic() + 5
+            while journal._unsynced and time.monotonic() < deadline:
+                time.sleep(0.01)
+            fsync.assert_called_once()
+        journal.close()
+    
+    def test_torn_journal_line_ignored(self):
+        """Test a partially written last record is skipped"""
+        journal = SessionJournal(os.path.join(self.directory, 'j'))
+        journal.append('bet', suit='HEARTS', amount=5)
+        journal.file.write('{"seq": 2, "op"')
+        journal.close()
+        records = list(SessionJournal.read(journal.path))
+        self.assertEqual([record['seq'] for record in records], [1])
+
+class TestBetLedger(unittest.TestCase):
+    """Test concurrent bet placement"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        lang.set_language('en')
+    
+    def test_place_bets_all_or_nothing(self):
+        """Test a slip over the balance leaves the player untouched"""
+        player = Player(100)
+        success, _ = player.place_bets({Suit.HEARTS: 60, Suit.SPADES: 60})
+        self.assertFalse(success)
+        self.assertEqual(player.balance, 100)
+        self.assertEqual(player.bets, {})
+        
+        success, message = player.place_bets({Suit.HEARTS: 60, Suit.SPADES: 40})
+        self.assertTrue(success)
+        self.assertIn("♥ $60", message)
+        self.assertEqual(player.balance, 0)
+        self.assertEqual(player.total_bet, 100)
+    
+    def test_concurrent_bets_never_overdraw(self):
+        """Test 16 threads betting on one player keep balances exact"""
+        ledger = BetLedger()
+        player = ledger.open_account('shared', initial_balance=10000)
+        results = []
+        
+        def worker():
+            accepted = 0
+            for _ in range(500):
+                if ledger.place_bets('shared', {Suit.HEARTS: 1, Suit.CLUBS: 1})[0]:
+                    accepted += 1
+            results.append(accepted)
+        
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sum(results), 5000)
+        self.assertEqual(player.balance, 0)
+        self.assertEqual(player.total_bet, 10000)
+        self.assertEqual(player.bets[Suit.HEARTS], 5000)
+        self.assertEqual(ledger.total_balance(), 10000)
+    
+    def test_open_account_is_idempotent(self):
+        """Test opening the same account twice returns one player"""
+        ledger = BetLedger()
+        self.assertIs(ledger.open_account('a'), ledger.open_account('a', 5))
+
+class TestBatchSettlement(unittest.TestCase):
+    """Test vectorized settlement"""
+    
+    def setUp(self):
+        """Build random bets and winners"""
+        rng = random.Random(11)
+        self.count = 500
+        self.bets = [[rng.choice([0, 0, 7, 33, 101, 999]) for _ in range(self.count)] for _ in Suit]
+        self.winners = [rng.randrange(4) for _ in range(self.count)]
+        self.balances = [rng.randrange(10000) for _ in range(self.count)]
+    
+    def _expected(self, odds):
+        """Settle each pair through Player.calculate_winnings"""
+        results = ([], [], [])
+        for index in range(self.count):
+            player = Player(0)
+            player.bets = {suit: self.bets[code][index] for code, suit in enumerate(Suit)
+                           if self.bets[code][index]}
+            player.total_bet = sum(player.bets.values())
+            net_profit = player.calculate_winnings(list(Suit)[self.winners[index]], odds)
+            results[0].append(player.balance)
+            results[1].append(net_profit)
+            results[2].append(self.balances[index] + player.balance)
+        return results
+    
+    def _check(self, use_numpy):
+        """Compare a batch path against per-player settlement"""
+        for odds in (3.0, 2.7, 1.15):
+            winnings, net_profit, balances = settle_batch(
+                self.bets, self.winners, self.balances, odds, use_numpy=use_numpy)
+            expected = self._expected(odds)
+            self.assertEqual(list(map(int, winnings)), expected[0])
+            self.assertEqual(list(map(int, net_profit)), expected[1])
+            self.assertEqual(list(map(int, balances)), expected[2])
+    
+    def test_array_path_matches_calculate_winnings(self):
+        """Test the array fallback rounds exactly like int(amount * odds)"""
+        self._check(use_numpy=False)
+    
+    @unittest.skipUnless(np is not None, "NumPy not installed")
+    def test_numpy_path_matches_calculate_winnings(self):
+        """Test the NumPy path rounds exactly like int(amount * odds)"""
+        self._check(use_numpy=True)
+    
+    def test_settle_players_shared_race(self):
+        """Test settling a shared race updates every player"""
+        players = [Player(1000) for _ in range(3)]
+        players[0].place_bet(Suit.HEARTS, 100)
+        players[1].place_bet(Suit.SPADES, 100)
+        players[2].place_bets({Suit.HEARTS: 10, Suit.CLUBS: 10})
+        
+        self.assertEqual(settle_players(players, Suit.HEARTS, 3.0), [200, -100, 10])
+        self.assertEqual([player.balance for player in players], [1200, 900, 1010])
+        self.assertEqual(len(players[1].game_history), 1)
+
 class TestInputValidator(unittest.TestCase):
     """Test input validation functionality"""
     
@@ -616,6 +1415,111 @@ class TestGameConfig(unittest.TestCase):
         self.assertEqual(config.ANIMATION_DELAY, 1.0)
         self.assertTrue(config.CLEAR_SCREEN)
 
+class TestEventLoop(unittest.TestCase):
+    """Test event loop input and timers"""
+    
+    def setUp(self):
+        """Create a pipe standing in for the keyboard"""
+        read_fd, self.write_fd = os.pipe()
+        self.stream = os.fdopen(read_fd, 'r')
+    
+    def tearDown(self):
+        """Close the pipe"""
+        self.stream.close()
+        os.close(self.write_fd)
+    
+    def test_wait_times_out_without_input(self):
+        """Test waiting runs to the deadline when no key is pressed"""
+        loop = EventLoop(self.stream, interactive=True)
+        self.assertFalse(loop.wait(0.01))
+    
+    def test_keypress_skips_wait(self):
+        """Test a pending keypress cuts the wait short and is consumed"""
+        loop = EventLoop(self.stream, interactive=True)
+        os.write(self.write_fd, b' ')
+        self.assertTrue(loop.wait(30))
+        self.assertFalse(loop.wait(0.01))
+    
+    def test_timers_run_in_order(self):
+        """Test timers fire by deadline and cancelled timers never fire"""
+        loop = EventLoop(self.stream, interactive=True)
+        fired = []
+        loop.call_later(0.02, lambda: fired.append('late'))
+        loop.call_later(0.01, lambda: fired.append('early'))
+        cancelled = loop.call_later(0, lambda: fired.append('cancelled'))
+        loop.cancel(cancelled)
+        loop.wait(0.05)
+        self.assertEqual(fired, ['early', 'late'])
+    
+    def test_non_interactive_falls_back_to_input(self):
+        """Test piped or captured stdin uses plain input()"""
+        loop = EventLoop(self.stream, interactive=False)
+        self.assertIsNone(loop.selector)
+        with patch('builtins.input', return_value='3') as mock_input:
+            self.assertEqual(loop.read_line('> '), '3')
+        mock_input.assert_called_once_with('> ')
+    
+    def test_virtual_clock_skips_waits(self):
+        """Test waits and timers on a virtual clock return at once and are recorded"""
+        clock = VirtualClock()
+        for interactive in (False, True):
+            loop = EventLoop(self.stream, interactive=interactive, clock=clock)
+            fired = []
+            loop.call_later(5, lambda: fired.append(clock.now()))
+            started = time.monotonic()
+            self.assertFalse(loop.wait(3600))
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual(fired, [clock.now() - 3595])
+        self.assertEqual(clock.slept, 7200)
+        self.assertEqual(clock.sleeps, [5, 3595, 5, 3595])
+    
+    def test_scaled_clock(self):
+        """Test a scaled clock shortens real waits and speeds up its time"""
+        clock = ScaledClock(100)
+        loop = EventLoop(self.stream, interactive=True, clock=clock)
+        started, clock_started = time.monotonic(), clock.now()
+        self.assertFalse(loop.wait(2))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertGreaterEqual(clock.now() - clock_started, 2)
+        with self.assertRaises(ValueError):
+            ScaledClock(0)
+    
+    def test_game_uses_injected_clock(self):
+        """Test the constructor clock wins over GameConfig.CLOCK and reaches the I/O backend"""
+        config = GameConfig()
+        config.CLOCK = VirtualClock()
+        self.assertIs(HorseRacingGame(config).io.clock, config.CLOCK)
+        clock = VirtualClock()
+        game = HorseRacingGame(config, clock=clock)
+        self.assertIs(game.io.clock, clock)
+        game.io.wait(config.MESSAGE_DELAY)
+        self.assertEqual(clock.sleeps, [config.MESSAGE_DELAY])
+        self.assertIsInstance(HorseRacingGame().clock, RealClock)
+
+class TestFrameScheduler(unittest.TestCase):
+    """Test adaptive race frame pacing"""
+    
+    def test_frames_limited_to_budget(self):
+        """Test frames inside the budget window are dropped"""
+        scheduler = FrameScheduler(max_fps=10)
+        self.assertTrue(scheduler.is_due(0.0))
+        scheduler.record_render(0.0, 0.0)
+        self.assertFalse(scheduler.is_due(0.05))
+        self.assertTrue(scheduler.is_due(0.1))
+    
+    def test_slow_render_pushes_next_frame(self):
+        """Test a terminal slower than the budget gets fewer frames"""
+        scheduler = FrameScheduler(max_fps=30)
+        scheduler.record_render(0.0, 0.5)
+        self.assertFalse(scheduler.is_due(0.9))
+        self.assertTrue(scheduler.is_due(1.0))
+    
+    def test_unlimited_budget(self):
+        """Test zero fps disables the budget"""
+        scheduler = FrameScheduler(max_fps=0)
+        scheduler.record_render(0.0, 0.0)
+        self.assertTrue(scheduler.is_due(0.0))
+
 class TestHorseRacingGameIntegration(unittest.TestCase):
     """Test game integration functionality"""
     
@@ -624,6 +1528,7 @@ class TestHorseRacingGameIntegration(unittest.TestCase):
         self.config = GameConfig()
         self.config.ANIMATION_DELAY = 0  # Disable animation delay for testing
         self.config.CLEAR_SCREEN = False  # Don't clear screen during testing
+        self.config.CLOCK = VirtualClock()  # message delays cost nothing
         self.game = HorseRacingGame(self.config)
         lang.set_language('en')  # Use English for testing
     
@@ -663,6 +1568,124 @@ class TestHorseRacingGameIntegration(unittest.TestCase):
         self.assertEqual(self.game.player.bets[Suit.HEARTS], 100)
         self.assertEqual(self.game.player.balance, 900)
     
+    @patch('builtins.input', side_effect=['2', '100', '6', '', '5'])  # Bet, ask for suggestions, finish
+    def test_betting_phase_suggestions(self, mock_input):
+        """Test the suggest option leaves the slip untouched"""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            result = self.game.betting_phase()
+        
+        self.assertTrue(result)
+        self.assertIn("No bet has a positive expected value", mock_stdout.getvalue())
+        self.assertIn("Your slip: expected profit $-25.00", mock_stdout.getvalue())
+        self.assertEqual(self.game.player.bets, {Suit.HEARTS: 100})
+    
+    @patch('builtins.input', side_effect=[''])
+    def test_suggestions_use_configured_track(self, mock_input):
+        """Test the slip EV uses the configured track, where no horse can finish 14 steps"""
+        self.config.TRACK_LENGTH = 14
+        game = HorseRacingGame(self.config)
+        game.player.place_bet(Suit.HEARTS, 100)
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            game.show_suggestions()
+        self.assertIn("Your slip: expected profit $-100.00", mock_stdout.getvalue())
+    
+    def test_games_settle_with_cut_card(self):
+        """Test every game settles when races outlast a cut-card shoe"""
+        self.config.CUT_CARD = 10
+        game = HorseRacingGame(self.config, ScriptedIO([''] * 200))
+        game.deck.rng = random.Random(1)
+        for played in range(1, 13):
+            game.deck.reset()
+            game.track.reset()
+            game.player.clear_bets()
+            game.player.place_bet(Suit.HEARTS, 10)
+            game.racing_phase()
+            game.settlement_phase()
+            self.assertEqual(len(game.player.game_history), played)
+    
+    def test_final_frame_rendered_when_deck_runs_out(self):
+        """Test an instant race that empties the shoe still draws the final positions"""
+        self.config.TRACK_LENGTH = 14
+        game = HorseRacingGame(self.config, ScriptedIO(['i', '']))
+        game.deck.reset()
+        events = []
+        game.bus.subscribe('card_drawn', lambda suit, card: events.append('card'))
+        game.bus.subscribe('frame_rendered', lambda seconds: events.append('frame'))
+        with patch.object(game, 'render_race_frame', wraps=game.render_race_frame) as render:
+            game.racing_phase()
+        self.assertEqual(events.count('card'), 52)
+        self.assertEqual(events[-1], 'frame')
+        self.assertLess(events.count('frame'), 52)  # frames in between were dropped
+        self.assertTrue(all(horse.position == 13 for horse in game.track.horses.values()))
+        self.assertEqual(render.call_count, events.count('frame'))
+    
+    def test_race_without_winner_refunds(self):
+        """Test a race no horse can finish returns the stake"""
+        self.config.TRACK_LENGTH = 14
+        game = HorseRacingGame(self.config, ScriptedIO([''] * 5))
+        game.deck.reset()
+        game.player.place_bet(Suit.HEARTS, 100)
+        game.racing_phase()
+        game.settlement_phase()
+        self.assertEqual(game.player.balance, 1000)
+        self.assertEqual(game.player.bets, {})
+        self.assertEqual(len(game.player.game_history), 0)
+    
+    def test_setback_suggestions_stay_responsive(self):
+        """Test the suggest option under setback rules answers within its wait bound"""
+        self.config.RULE_SET = 'setback'
+        self.config.DECK_PACKS = 4
+        game = HorseRacingGame(self.config, ScriptedIO(['', '']))
+        game.SUGGEST_WAIT = 0.05
+        game.start_odds_task()
+        started = time.perf_counter()
+        game.show_suggestions()  # the estimate takes longer than the wait, so only a note
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(game.io.lines_written, 1)
+        self.assertIsNotNone(game.odds_task.wait(10))
+        game.stop_odds_task()
+        
+        started = time.perf_counter()
+        game.show_suggestions()  # no background task: exact solver capped, then estimated
+        self.assertLess(time.perf_counter() - started, 5)
+        game.quit_game()
+    
+    def test_background_odds_announced_over_prompt(self):
+        """Test the odds timer prints fair odds once the background task is done"""
+        game = HorseRacingGame(self.config, ConsoleIO(StringIO(), interactive=False))
+        game.ODDS_POLL = 0
+        game.start_odds_task()
+        self.assertEqual(game.odds_task.wait(10), suggest_bets(1000, self.config))
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            game.io._run_due_timers()
+        self.assertIn("Fair odds: ♠ 4.00x (-0.25)", mock_stdout.getvalue())
+        game.stop_odds_task()
+        self.assertIsNone(game.odds_task)
+        self.assertIsNone(game.io._next_timeout())
+    
+    @patch('builtins.input', side_effect=['0'])  # Leave while the odds are still being worked out
+    def test_leaving_betting_cancels_odds(self, mock_input):
+        """Test a slow background computation is cancelled and its result dropped"""
+        release = threading.Event()
+        
+        def slow_suggestion(balance, config):
+            release.wait(10)
+            return {'horses': {}, 'slip': {}}
+        
+        tasks = []
+        start = self.game.start_odds_task
+        with patch('horse_racing_poker.suggest_bets', side_effect=slow_suggestion), \
+                patch.object(self.game, 'start_odds_task',
+                             side_effect=lambda: (start(), tasks.append(self.game.odds_task))), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.assertFalse(self.game.betting_phase())
+            task, = tasks
+            release.set()
+            self.assertIsNone(task.wait(10))
+        self.assertIn("Working out fair odds in the background", mock_stdout.getvalue())
+        self.assertTrue(task.cancelled)
+        self.assertIsNone(self.game.odds_task)
+    
     @patch('builtins.input', side_effect=['0'])  # Return to main menu
     def test_betting_phase_cancel(self, mock_input):
         """Test canceling betting"""
@@ -690,6 +1713,554 @@ class TestHorseRacingGameIntegration(unittest.TestCase):
         output = mock_stdout.getvalue()
         self.assertIn("cancelled and amount refunded", output)
 
+    @patch('builtins.input', side_effect=['', ''])  # Start race, view results
+    def test_racing_phase_runs_to_winner(self, mock_input):
+        """Test racing phase draws cards until a horse finishes"""
+        self.game.deck.reset()
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.game.racing_phase()
+        
+        self.assertIsNotNone(self.game.track.get_winner())
+        self.assertIn("Winner", mock_stdout.getvalue())
+
+    @patch('builtins.input', side_effect=['i', ''])  # Instant playback, view results
+    def test_racing_phase_instant_drops_frames(self, mock_input):
+        """Test instant playback still shows the final track"""
+        self.game.deck.reset()
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.game.racing_phase()
+        
+        output = mock_stdout.getvalue()
+        self.assertLessEqual(output.count("Track Status"), 2)
+        self.assertIn("🏆", output)
+    
+    @patch('builtins.input', side_effect=['i', ''])  # Instant playback, view results
+    def test_racing_phase_emits_events(self, mock_input):
+        """Test plugins see every move and the winner without touching the phase"""
+        moves, winners = [], []
+        self.game.bus.subscribe('horse_moved', lambda suit, position: moves.append((suit, position)))
+        self.game.bus.subscribe('winner_declared', lambda suit: winners.append(suit))
+        self.game.deck.reset()
+        with patch('sys.stdout', new_callable=StringIO):
+            self.game.racing_phase()
+        
+        winner = self.game.track.get_winner()
+        self.assertEqual(winners, [winner.suit])
+        self.assertEqual(moves[-1], (winner.suit, self.game.track.length))
+        self.assertEqual(len(moves), 52 - self.game.deck.remaining_count())
+    
+    def test_racing_phase_variant_rules(self):
+        """Test a setback rule set still runs to a winner"""
+        config = GameConfig()
+        config.CLEAR_SCREEN = False
+        config.RULE_SET = 'setback'
+        game = HorseRacingGame(config, ScriptedIO(['i', '', '']))
+        game.deck.reset()
+        game.racing_phase()
+        self.assertIsNotNone(game.track.get_winner())
+        output = []
+        game.io.write = lambda text="": output.append(text)
+        game.show_rules()
+        self.assertIn("7. Variant rules (setback): 7 sets the others back 1", output)
+    
+    def test_parse_playback_speed(self):
+        """Test race start shortcuts map to playback speeds"""
+        self.assertEqual(self.game.parse_playback_speed(''), 1.0)
+        self.assertEqual(self.game.parse_playback_speed('f'), 4.0)
+        self.assertEqual(self.game.parse_playback_speed('I'), 0.0)
+
+class TestLoadTesting(unittest.TestCase):
+    """Test the load testing harness"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        lang.set_language('en')
+    
+    def test_histogram_percentiles(self):
+        """Test percentiles land within one bucket of the samples"""
+        histogram = LatencyHistogram()
+        for millis in range(1, 101):
+            histogram.record(millis / 1000)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertAlmostEqual(summary['p50'], 0.050, delta=0.007)
+        self.assertAlmostEqual(summary['p99'], 0.099, delta=0.012)
+        self.assertEqual(summary['max'], 0.1)
+        
+        other = LatencyHistogram()
+        other.record(1.0)
+        histogram.merge(other)
+        self.assertEqual(histogram.count, 101)
+        self.assertEqual(histogram.percentile(1.0), 1.0)
+    
+    def test_scripted_io_plays_full_game(self):
+        """Test a game driven through the injected I/O backend"""
+        config = GameConfig()
+        config.CLEAR_SCREEN = False
+        io = ScriptedIO(['2', '100', '5', 'i', '', ''])
+        game = HorseRacingGame(config, io)
+        game.play_single_game()
+        
+        self.assertEqual(len(game.player.game_history), 1)
+        self.assertGreater(io.lines_written, 0)
+        with self.assertRaises(EOFError):
+            io.read_line()
+    
+    def test_script_sessions_are_reproducible(self):
+        """Test scripted sessions from a file replay the full flow with a seed"""
+        script = StringIO("# English, one game, stats, quit\n1\n1\n2\n100\n5\ni\n\n\n3\n\n4\n")
+        answers = ScriptedIO.read_script(script)
+        self.assertEqual(answers, ['1', '1', '2', '100', '5', 'i', '', '', '3', '', '4'])
+        sink = StringIO()
+        report = play_script(answers, sessions=20, seed=7, sink=sink)
+        self.assertEqual(report['sessions'], 20)
+        self.assertEqual(report['games'], 20)
+        self.assertEqual(play_script(answers, sessions=20, seed=7)['final_balances'], report['final_balances'])
+        self.assertTrue(set(report['final_balances']) <= {900, 1200})
+        transcript = sink.getvalue()
+        self.assertEqual(transcript.count("Thanks for playing! Goodbye!"), 20)
+        self.assertIn("Enter bet amount: $100", transcript)
+        self.assertIn("Longest Losing Streak: ", transcript)
+        distributions = report['distributions']
+        self.assertEqual(distributions['session_profit']['sessions'], 20)
+        self.assertTrue(10 <= distributions['race_length']['median'] <= 52)
+    
+    def test_script_command(self):
+        """Test the script command reads a file and writes the transcript"""
+        with tempfile.TemporaryDirectory() as directory:
+            path, output = os.path.join(directory, 'session.txt'), os.path.join(directory, 'out.txt')
+            with open(path, 'w', encoding='utf-8') as script:
+                script.write("1\n3\n\n")  # no quit, the script just ends
+            with patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+                main(['script', path, '--sessions', '3', '--output', output])
+            self.assertIn("3 sessions, 0 games", mock_stderr.getvalue())
+            with open(output, encoding='utf-8') as transcript:
+                self.assertEqual(transcript.read().count("=== Game Statistics ==="), 3)
+    
+    def test_load_report(self):
+        """Test a small load run reports every action"""
+        report = LoadTester(players=20, games_per_player=2, concurrency=4).run()
+        self.assertEqual(report['latency']['game']['count'], 40)
+        self.assertEqual(report['latency']['settlement']['count'], 40)
+        self.assertGreater(report['games_per_second'], 0)
+        self.assertTrue(report['rss_samples'])
+        self.assertEqual(len(compare_load_reports(report, report)), 6)
+    
+    def test_soak_passes_without_leaks(self):
+        """Test a short soak stays within the per-game growth limit"""
+        report = SoakTester(games=400, warmup=100, sample_every=100).run()
+        self.assertTrue(report['passed'], report['growth_bytes_per_game'])
+        self.assertEqual(report['games'], 400)
+        self.assertEqual(report['samples'][-1]['history_games'], 400)
+        self.assertLessEqual(max(sample['used_cards'] for sample in report['samples']), 52)
+        self.assertEqual(report['top_allocations'], [])
+    
+    def test_soak_reports_leak_sites(self):
+        """Test an injected leak fails the soak and is located"""
+        leaked = []
+        clear_bets = Player.clear_bets
+        
+        def leaky_clear_bets(player):
+            leaked.append(bytearray(4096))
+            clear_bets(player)
+        
+        with patch.object(Player, 'clear_bets', leaky_clear_bets):
+            report = SoakTester(games=150, warmup=50, sample_every=50).run()
+        self.assertFalse(report['passed'])
+        self.assertGreater(report['growth_bytes_per_game'], 4096)
+        self.assertIn('test_horse_racing.py', report['top_allocations'][0])
+
+class TestHTTPAPI(unittest.TestCase):
+    """Test the HTTP/JSON simulation API"""
+    
+    def setUp(self):
+        """Start a server on a free localhost port"""
+        self.api = SimulationAPI(cache_size=2, executor=ThreadPoolExecutor(2))
+        self.server = create_api_server('127.0.0.1', 0, self.api)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        self.thread.start()
+        self.conn = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1])
+    
+    def tearDown(self):
+        """Stop the server"""
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.api.close()
+    
+    def _get(self, path):
+        """GET over the shared keep-alive connection"""
+        self.conn.request('GET', path)
+        response = self.conn.getresponse()
+        return response.status, json.loads(response.read())
+    
+    def test_keep_alive_and_cache(self):
+        """Test equivalent queries share one cached response on one connection"""
+        status, first = self._get('/simulate?races=50&seed=1&track_length=8')
+        self.assertEqual(status, 200)
+        status, second = self._get('/simulate?track_length=08&seed=1&races=50')
+        self.assertEqual(second, first)
+        self.assertEqual(self.api.cache.hits, 1)
+    
+    def test_odds_and_race(self):
+        """Test the odds and race endpoints"""
+        status, odds = self._get('/odds?positions=0,0,0,0&remaining=13,13,13,13')
+        self.assertEqual(status, 200)
+        self.assertAlmostEqual(odds['horses']['SPADES']['fair_odds'], 4.0)
+        status, race = self._get('/race?seed=5')
+        self.assertEqual(status, 200)
+        self.assertIn(race['winner'], [suit.name for suit in Suit])
+        status, shoe = self._get('/simulate?races=20&seed=2&packs=4&lanes=8&track_length=30')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(shoe['wins']), 8)
+    
+    def test_bad_requests(self):
+        """Test invalid parameters and paths"""
+        self.assertEqual(self._get('/simulate?races=abc')[0], 400)
+        self.assertEqual(self._get('/odds?positions=1,2')[0], 400)
+        started = time.perf_counter()
+        status, body = self._get('/odds?remaining=5000,5000,5000,5000')
+        self.assertEqual(status, 400)
+        self.assertIn("from 0 to 13", body['error'])
+        self.assertEqual(self._get('/odds?positions=11,0,0,0&track_length=10')[0], 400)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(self._get('/simulate?track_length=30')[0], 400)
+        self.assertEqual(self._get('/nope')[0], 404)
+    
+    def test_lru_eviction(self):
+        """Test the cache keeps only the most recently used entries"""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+class TestMetrics(unittest.TestCase):
+    """Test the metrics registry and its exporters"""
+    
+    def setUp(self):
+        lang.set_language('en')
+        self.registry = MetricsRegistry()
+    
+    def test_finished_threads_are_folded(self):
+        """Test shards of ended threads are merged away without losing counts"""
+        def work():
+            self.registry.inc('bets_placed_total')
+            self.registry.observe('race_length_cards', 12)
+        for _ in range(50):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(self.registry._shards), 0)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot['bets_placed_total'], 50)
+        self.assertEqual(snapshot['race_length_cards']['count'], 50)
+    
+    def test_sessions_feed_metrics(self):
+        """Test game events become counters, histograms and session gauges"""
+        answers = ['1', '1', '2', '100', '5', 'i', '', '', '1', '1', '5000', '1', '50', '5', 'i', '', '', '4']
+        play_script(answers, sessions=3, seed=2, metrics=self.registry)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot['races_started_total'], 6)
+        self.assertEqual(snapshot['races_finished_total'], 6)
+        self.assertEqual(snapshot['bets_placed_total'], 6)
+        self.assertEqual(snapshot['bets_rejected_total'], 3)
+        self.assertEqual(snapshot['bet_amount_total'], 450)
+        self.assertEqual(snapshot['payouts_total'] % 3, 0)
+        self.assertEqual(snapshot['race_length_cards']['count'], 6)
+        self.assertEqual(snapshot['phase_seconds']['phase=racing']['count'], 6)
+        self.assertGreater(snapshot['frame_render_seconds']['count'], 0)
+        self.assertEqual(snapshot['active_sessions'], 0)
+        
+        config = GameConfig()
+        config.METRICS = self.registry
+        game = HorseRacingGame(config, ScriptedIO([]))
+        self.assertEqual(self.registry.snapshot()['player_balance_total'], 1000)
+        game.quit_game()
+        self.assertEqual(self.registry.snapshot()['active_sessions'], 0)
+    
+    def test_threads_update_without_losing_counts(self):
+        """Test per-thread shards add up exactly"""
+        def work():
+            for _ in range(10000):
+                self.registry.inc('bets_placed_total')
+                self.registry.observe('race_length_cards', 30)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot['bets_placed_total'], 40000)
+        self.assertEqual(snapshot['race_length_cards']['buckets']['30'], 40000)
+        self.assertEqual(snapshot['race_length_cards']['sum'], 1200000)
+    
+    def test_prometheus_endpoint_and_json_dump(self):
+        """Test the HTTP exposition format and the periodic JSON file"""
+        self.registry.inc('payouts_total', 300)
+        self.registry.observe('phase_seconds', 0.002, phase='racing')
+        server = create_metrics_server(self.registry, port=0)
+        threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+            conn.request('GET', '/metrics')
+            response = conn.getresponse()
+            text = response.read().decode()
+            self.assertTrue(response.getheader('Content-Type').startswith('text/plain'))
+            conn.request('GET', '/nope')
+            self.assertEqual(conn.getresponse().status, 404)
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("# TYPE payouts_total counter\npayouts_total 300\n", text)
+        self.assertIn('phase_seconds_bucket{phase="racing",le="0.001"} 0\n', text)
+        self.assertIn('phase_seconds_bucket{phase="racing",le="0.005"} 1\n', text)
+        self.assertIn('phase_seconds_count{phase="racing"} 1\n', text)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.json')
+            dumper = MetricsDumper(self.registry, path, interval=0.01).start()
+            time.sleep(0.05)
+            self.assertTrue(os.path.exists(path))
+            self.registry.inc('payouts_total', 30)
+            dumper.close()
+            with open(path, encoding='utf-8') as dump:
+                self.assertEqual(json.load(dump)['payouts_total'], 330)
+
+class TestResultCache(unittest.TestCase):
+    """Test the two-tier content-addressed result cache"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.temp_dir.name
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_repeated_simulation_is_cached(self):
+        """Test a repeated seeded run is served from memory, then from disk after a restart"""
+        cache = ResultCache(self.directory)
+        first = cache.simulate(200, seed=5)
+        self.assertEqual(first, simulate_races(200, 5))
+        with patch('horse_racing_poker.simulate_races') as simulate:
+            self.assertEqual(cache.simulate(200, seed=5), first)
+            self.assertEqual(ResultCache(self.directory).simulate(200, seed=5), first)
+            simulate.assert_not_called()
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+    
+    def test_key_covers_config_and_rules(self):
+        """Test the key changes with seed, races and movement rules but not rule names"""
+        cache = ResultCache()
+        
+        class FacesConfig(GameConfig):
+            RULE_SET = 'faces'
+        
+        class RenamedConfig(GameConfig):
+            RULE_SET = RuleSet('renamed')
+        
+        keys = {cache.simulation_key(100, 1), cache.simulation_key(100, 2),
+                cache.simulation_key(101, 1), cache.simulation_key(100, 1, FacesConfig)}
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(cache.simulation_key(100, 1, RenamedConfig), cache.simulation_key(100, 1))
+        self.assertEqual(ResultCache().simulation_key(100, 1), cache.simulation_key(100, 1))
+    
+    def test_engine_version_invalidates(self):
+        """Test entries written by another engine version are ignored and removed"""
+        old = ResultCache(self.directory)
+        old.put(old.key('old'), {'value': 1})
+        bumped = ResultCache(self.directory, engine_version=2)
+        self.assertIsNone(bumped.get(old.key('old')))
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertNotEqual(bumped.key('simulate', 1), ResultCache().key('simulate', 1))
+    
+    def test_scan_leaves_other_files(self):
+        """Test opening a shared directory removes only the cache's own stale files"""
+        stale = ResultCache(self.directory, engine_version=2)
+        stale.put(stale.key('old'), {'value': 1})
+        leftover = f"v1-{stale.key('new')}.json.7.tmp"
+        for name in ('validate_report.json', 'venv.tmp', 'v1-notes.json', leftover):
+            with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as other:
+                other.write("{}")
+        ResultCache(self.directory)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['v1-notes.json', 'validate_report.json', 'venv.tmp'])
+        with self.assertRaises(ValueError):
+            ResultCache(self.directory).put('notes', {})
+    
+    def test_disk_size_eviction(self):
+        """Test the least recently used files go once the directory exceeds max_bytes"""
+        cache = ResultCache(self.directory, max_items=1, max_bytes=100)
+        for name in 'abc':
+            cache.put(cache.key(name), {'payload': name * 30})
+        self.assertLessEqual(cache.disk_bytes, 100)
+        self.assertIsNone(cache.get(cache.key('a')))
+        self.assertEqual(cache.get(cache.key('c')), {'payload': 'c' * 30})
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+    
+    def test_api_results_survive_restart(self):
+        """Test a seeded /simulate response is reloaded from disk by a new API"""
+        query = {'races': ['50'], 'seed': ['9']}
+        api = SimulationAPI(cache_size=2, executor=ThreadPoolExecutor(1), cache_dir=self.directory)
+        status, body = api.handle('/simulate', query)
+        api.close()
+        restarted = SimulationAPI(cache_size=2, executor=MagicMock(), cache_dir=self.directory)
+        self.assertEqual(restarted.handle('/simulate', query), (status, body))
+        restarted.executor.submit.assert_not_called()
+
+class TestDistributedSimulation(unittest.TestCase):
+    """Test the coordinator and workers on localhost"""
+    
+    def _run(self, workers, **options):
+        """Run a 5000 race simulation with worker threads, return the result"""
+        coordinator = SimulationCoordinator(5000, seed=3, chunk_races=700, **options)
+        threads = [threading.Thread(target=run_simulation_worker, args=coordinator.address, daemon=True)
+                   for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        result = coordinator.run(timeout=60)
+        for thread in threads:
+            thread.join(10)
+        return result
+    
+    def test_result_independent_of_worker_count(self):
+        """Test one and three workers merge to the same local result"""
+        single, several = self._run(1), self._run(3)
+        expected = merge_simulations([simulate_races(min(700, 5000 - start), chunk_seed(3, index))
+                                      for index, start in enumerate(range(0, 5000, 700))])
+        for name in ('races', 'wins', 'no_winner', 'race_lengths'):
+            self.assertEqual(single[name], expected[name])
+            self.assertEqual(several[name], expected[name])
+        self.assertEqual(single['chunks'], 8)
+        self.assertEqual(several['workers'], 3)
+    
+    def test_dead_worker_chunk_is_retried(self):
+        """Test a chunk taken by a worker that dies is run again"""
+        coordinator = SimulationCoordinator(1000, seed=1, chunk_races=500, rules=RULE_SETS['faces'])
+        server = threading.Thread(target=lambda: results.append(coordinator.run(timeout=60)), daemon=True)
+        results = []
+        server.start()
+        with socket.create_connection(coordinator.address) as sock, sock.makefile('rwb') as stream:
+            stream.write(b'{"type":"ready"}\n')
+            stream.flush()
+            self.assertEqual(json.loads(stream.readline())['type'], 'chunk')
+        self.assertEqual(run_simulation_worker(*coordinator.address), 2)
+        server.join(30)
+        self.assertEqual(results[0]['retries'], 1)
+        self.assertEqual(results[0]['races'], 1000)
+        self.assertEqual(results[0]['wins'], merge_simulations(
+            [simulate_races(500, chunk_seed(1, index), rules=RULE_SETS['faces']) for index in range(2)])['wins'])
+
+    def test_garbled_result_is_retried(self):
+        """Test a result without counters requeues its chunk instead of raising"""
+        coordinator = SimulationCoordinator(1000, seed=1, chunk_races=500)
+        server = threading.Thread(target=lambda: results.append(coordinator.run(timeout=60)), daemon=True)
+        results = []
+        with patch('sys.stderr', new_callable=StringIO) as mock_stderr:
+            server.start()
+            with socket.create_connection(coordinator.address) as sock, sock.makefile('rwb') as stream:
+                stream.write(b'{"type":"ready"}\n')
+                stream.flush()
+                chunk = json.loads(stream.readline())
+                stream.write(json.dumps({'type': 'result', 'index': chunk['index']}).encode() + b'\n')
+                stream.flush()
+                self.assertEqual(stream.readline(), b'')  # the coordinator hung up
+            self.assertEqual(run_simulation_worker(*coordinator.address), 2)
+            server.join(30)
+        self.assertNotIn("Traceback", mock_stderr.getvalue())
+        self.assertEqual((results[0]['retries'], results[0]['races'], results[0]['workers']), (1, 1000, 2))
+    
+    def test_mismatched_result_is_rejected(self):
+        """Test a result for another chunk gets an error and requeues the leased chunk"""
+        coordinator = SimulationCoordinator(1000, seed=1, chunk_races=500)
+        server = threading.Thread(target=lambda: results.append(coordinator.run(timeout=60)), daemon=True)
+        results = []
+        server.start()
+        with socket.create_connection(coordinator.address) as sock, sock.makefile('rwb') as stream:
+            stream.write(b'{"type":"ready"}\n')
+            stream.flush()
+            chunk = json.loads(stream.readline())
+            stream.write(json.dumps({'type': 'result', 'index': chunk['index'] + 1, 'result': {}}).encode() + b'\n')
+            stream.flush()
+            self.assertEqual(json.loads(stream.readline())['type'], 'error')
+            self.assertEqual(stream.readline(), b'')
+        self.assertEqual(run_simulation_worker(*coordinator.address), 2)
+        server.join(30)
+        self.assertEqual((results[0]['retries'], results[0]['races'], results[0]['workers']), (1, 1000, 2))
+        self.assertEqual(results[0]['wins'], merge_simulations(
+            [simulate_races(500, chunk_seed(1, index)) for index in range(2)])['wins'])
+
+class TestRaceBroadcaster(unittest.TestCase):
+    """Test spectator frame fan-out"""
+    
+    def setUp(self):
+        """Start a broadcaster on a free port"""
+        self.broadcaster = RaceBroadcaster()
+        self.broadcaster.start()
+        self.clients = []
+    
+    def tearDown(self):
+        """Close spectators and the broadcaster"""
+        for client in self.clients:
+            client.close()
+        self.broadcaster.close()
+    
+    def _connect(self):
+        """Connect a spectator and wait until it is registered"""
+        client = socket.create_connection(self.broadcaster.address, timeout=5)
+        self.clients.append(client)
+        deadline = time.monotonic() + 5
+        while len(self.broadcaster.spectators) < len(self.clients) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return client
+    
+    def _read_until(self, client, marker):
+        """Read from a spectator socket until marker arrives"""
+        received = b''
+        while marker not in received:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            received += chunk
+        return received
+    
+    def test_every_spectator_gets_frame(self):
+        """Test one published frame reaches all spectators"""
+        clients = [self._connect() for _ in range(3)]
+        self.broadcaster.publish("Track Status\nframe-1")
+        for client in clients:
+            self.assertIn(b'frame-1', self._read_until(client, b'frame-1'))
+    
+    def test_slow_spectator_is_coalesced(self):
+        """Test a spectator that never reads only holds one shared frame"""
+        slow = self._connect()
+        fast = self._connect()
+        payload = 'x' * 1_000_000
+        for number in range(30):
+            self.broadcaster.publish(f"{payload}\nframe-{number}-end")
+        self.assertIn(b'frame-29-end', self._read_until(fast, b'frame-29-end'))
+        
+        for spectator in list(self.broadcaster.spectators.values()):
+            pending = spectator.pending
+            self.assertTrue(pending is None or len(pending) <= len(payload) + 100)
+        self.assertGreater(self.broadcaster.frames_dropped, 0)
+    
+    def test_game_publishes_race_frames(self):
+        """Test the racing phase feeds the broadcaster"""
+        lang.set_language('en')
+        config = GameConfig()
+        config.CLEAR_SCREEN = False
+        config.ANIMATION_DELAY = 0
+        game = HorseRacingGame(config, ScriptedIO(['i', '']))
+        game.broadcaster = self.broadcaster
+        client = self._connect()
+        game.deck.reset()
+        game.racing_phase()
+        self.assertGreaterEqual(self.broadcaster.frames_published, 10)
+        self.assertIn(b'Track Status', self._read_until(client, b'Track Status'))
+
 class TestErrorHandling(unittest.TestCase):
     """Test error handling"""
     
@@ -701,7 +2272,7 @@ class TestErrorHandling(unittest.TestCase):
         """Test Ctrl+C interrupt handling"""
         config = GameConfig()
         config.CLEAR_SCREEN = False
-        game = HorseRacingGame(config)
+        game = HorseRacingGame(config, clock=VirtualClock())
         
         with patch('builtins.input', side_effect=['1', KeyboardInterrupt]):  # Choose English, then interrupt
             with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
@@ -715,9 +2286,12 @@ def run_tests():
     """Run all tests"""
     # Create test suite
     test_classes = [
-        TestLanguage, TestCard, TestDeck, TestHorse, TestTrack, TestPlayer,
-        TestInputValidator, TestGameDisplay, TestGameConfig,
-        TestHorseRacingGameIntegration, TestErrorHandling
+        TestLanguage, TestCard, TestDeck, TestHorse, TestTrack, TestEventBus, TestSimulationEngine,
+        TestRuleSets, TestBetOptimizer, TestFairnessValidation, TestSweep, TestPlayer, TestDistributions,
+        TestGameHistory, TestSQLiteHistory, TestSessionStore, TestBetLedger, TestBatchSettlement,
+        TestInputValidator, TestGameDisplay, TestGameConfig, TestEventLoop, TestFrameScheduler,
+        TestHorseRacingGameIntegration, TestLoadTesting, TestHTTPAPI, TestMetrics, TestResultCache,
+        TestDistributedSimulation, TestRaceBroadcaster, TestErrorHandling
     ]
     
     suite = unittest.TestSuite()